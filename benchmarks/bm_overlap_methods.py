@@ -171,6 +171,44 @@ def timings(group_icov, group_mean, group_icov_det,
                 numpy_time / (end - newswignpmultistart)
         ))
 
+def compare_lnoverlap_methods(group_cov, group_mean, star_covs, star_means,
+                              batch_size, noverlaps=10000):
+    """
+        A/B comparison of the two methods available to get_lnoverlaps
+        for factorising (B+A): the generic gsl LU decomposition and the
+        hand specialised 6x6 Cholesky decomposition.
+    """
+    method_names = {
+        overlap.LNOVERLAP_GSL_LU:'GSL LU',
+        overlap.LNOVERLAP_CHOLESKY:'6x6 Cholesky',
+    }
+    orig_method = overlap.get_lnoverlap_method()
+
+    method_times = {}
+    method_results = {}
+    for method, name in method_names.items():
+        overlap.set_lnoverlap_method(method)
+        start = timer()
+        for i in range(int(noverlaps/batch_size)):
+            result = overlap.get_lnoverlaps(group_cov, group_mean,
+                                            star_covs, star_means, batch_size)
+        end = timer()
+        method_times[method] = end - start
+        method_results[method] = result
+        print("{}: {} s".format(name, end - start))
+        print("  -> {} microsec per overlap".\
+                format((end - start)/noverlaps*1e6))
+
+    overlap.set_lnoverlap_method(orig_method)
+
+    assert np.allclose(method_results[overlap.LNOVERLAP_GSL_LU],
+                       method_results[overlap.LNOVERLAP_CHOLESKY],
+                       rtol=1e-10)
+    print('Cholesky speed up over GSL LU is {}'.format(
+            method_times[overlap.LNOVERLAP_GSL_LU] /
+            method_times[overlap.LNOVERLAP_CHOLESKY]
+    ))
+
 # ------------- MAIN PROGRAM -----------------------
 if __name__ == '__main__':
 
@@ -262,5 +300,10 @@ if __name__ == '__main__':
         group_icov, group_mean, group_icov_det, star_icovs,
         star_means, star_icov_dets, batch_size, noverlaps)
 
+    print("Comparing lnoverlap methods")
+    compare_lnoverlap_methods(
+        np.linalg.inv(group_icov), group_mean, np.linalg.inv(star_icovs),
+        star_means, batch_size, noverlaps)
+
     print("___ swig module passsing all unit_tests ___")
 
@@ -39,6 +39,22 @@ except ImportError:
     plt_avail = False
 
 
+class _VectorisedLnprobPool(object):
+    """
+    Stands in for the pool of an emcee.EnsembleSampler, such that the
+    positions of every walker are scored with a single call to
+    likelihood.lnprob_func_batch, rather than one call to
+    likelihood.lnprob_func per walker (as `vectorize=True` does in
+    emcee 3).
+    """
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+    def map(self, func, positions):
+        return likelihood.lnprob_func_batch(np.array(list(positions)),
+                                            **self.kwargs)
+
+
 def calc_med_and_span(chain, perc=34, intern_to_extern=False,
                       Component=SphereComponent):
     """
@@ -280,7 +296,8 @@ def fit_comp(data, memb_probs=None, init_pos=None, init_pars=None,
              pool=None, convergence_tol=0.25, plot_dir='', save_dir='',
              sampling_steps=None, max_iter=None, trace_orbit_func=None,
              store_burnin_chains=False, nthreads=1, 
-             optimisation_method='emcee', nprocess_ncomp=False):
+             optimisation_method='emcee', nprocess_ncomp=False,
+             vectorise_lnprob=False):
     """Fits a single 6D gaussian to a weighted set (by membership
     probabilities) of stellar phase-space positions.
 
@@ -364,6 +381,12 @@ def fit_comp(data, memb_probs=None, init_pos=None, init_pars=None,
         many times with different initial positions. The result is the 
         one with the best likelihood. These optimisations are computed
         in parallel if nprocess_ncomp equals True.
+    vectorise_lnprob: bool {False}
+        Score all emcee walkers together with
+        likelihood.lnprob_func_batch, which projects every walker's
+        component and calculates all overlaps in a handful of array
+        operations. Takes the place of `pool`, with `nthreads` instead
+        splitting the overlaps across threads.
         
     Returns
     -------
@@ -387,6 +410,10 @@ def fit_comp(data, memb_probs=None, init_pos=None, init_pars=None,
             os.mkdir(plot_dir)
     npars = len(Component.PARAMETER_FORMAT)
     nwalkers = 2*npars
+
+    # Memberships are fixed for this fit, so extract the contributing
+    # stars once, rather than on every lnprob call
+    active_stars = likelihood.ActiveStarSet(data, memb_probs)
     
     #########################################
     ### OPTIMISE WITH EMCEE #################
@@ -404,9 +431,19 @@ def fit_comp(data, memb_probs=None, init_pos=None, init_pars=None,
         # on mash. Maybe MZ will have better luck :P
         # os.system("taskset -p 0xff %d >> /dev/null" % os.getpid())
         
+        if vectorise_lnprob:
+            if pool is not None:
+                logging.info('Vectorised lnprob replaces the provided pool')
+            pool = _VectorisedLnprobPool(
+                    data=active_stars, memb_probs=memb_probs,
+                    trace_orbit_func=trace_orbit_func, Component=Component,
+                    nthreads=nthreads,
+            )
+
         sampler = emcee.EnsembleSampler(
                 nwalkers, npars, likelihood.lnprob_func,
-                args=[data, memb_probs, trace_orbit_func, optimisation_method],
+                args=[active_stars, memb_probs, trace_orbit_func,
+                      optimisation_method],
                 pool=pool,
                 threads=nthreads,
         )
@@ -546,7 +583,7 @@ def fit_comp(data, memb_probs=None, init_pos=None, init_pars=None,
             return_dict = manager.dict()
 
             def worker(pos, return_dict):
-                result = scipy.optimize.minimize(likelihood.lnprob_func, pos, args=[data, memb_probs, trace_orbit_func, optimisation_method], tol=0.01, method=optimisation_method)
+                result = scipy.optimize.minimize(likelihood.lnprob_func, pos, args=[active_stars, memb_probs, trace_orbit_func, optimisation_method], tol=0.01, method=optimisation_method)
                 return_dict[result.fun] = result
             #TODO: tol: is this value optimal?
 
@@ -572,7 +609,7 @@ def fit_comp(data, memb_probs=None, init_pos=None, init_pars=None,
             logging.info('Running %i fits'%(len(init_pos)))
             for pos in init_pos:
                 logging.info(' init age: %5.2f'%pos[-1])
-                result = scipy.optimize.minimize(likelihood.lnprob_func, pos, args=[data, memb_probs, trace_orbit_func, optimisation_method], tol=0.01, method=optimisation_method)
+                result = scipy.optimize.minimize(likelihood.lnprob_func, pos, args=[active_stars, memb_probs, trace_orbit_func, optimisation_method], tol=0.01, method=optimisation_method)
                 return_dict[result.fun] = result
                 logging.info('         res: %5.2f | %5.3f'%(result.x[-1], -result.fun))
 
@@ -45,6 +45,7 @@ except:
     ImportError
 
 
+import inspect
 import numpy as np
 from scipy.stats.mstats import gmean
 from astropy.table import Table
@@ -58,6 +59,21 @@ from .transform import transform_covmatrix
 #~ from chronostar.compfitter import approx_currentday_distribution
 #~ from . import compfitter
 
+
+def _accepts_single_age(trace_orbit_func):
+    """
+    Whether `trace_orbit_func` takes a `single_age` keyword, and hence can
+    trace to many times in one call. Custom functions need only match
+    trace_orbit_func(xyzuvw_start, times).
+    """
+    try:
+        params = inspect.signature(trace_orbit_func).parameters.values()
+    except (TypeError, ValueError):
+        return False
+    return any(param.name == 'single_age'
+               or param.kind == inspect.Parameter.VAR_KEYWORD
+               for param in params)
+
 # Including plotting capabilities
 
 class AbstractComponent(object):
@@ -517,12 +533,25 @@ class AbstractComponent(object):
         transformation that takes the initial mean to the current day mean.
         This is the most expensive aspect of Chronostar, so we first make
         sure the covariance matrix hasn't already been projected.
+
+        If `trace_orbit_func` has a `propagate_with_jacobian` attribute
+        (e.g. traceorbit.trace_epicyclic_orbit), the current day mean and
+        the Jacobian are taken from a single call to it.
         """
         if self._covmatrix_now is None:
-            self._covmatrix_now = transform.transform_covmatrix(
-                    self._covmatrix, trans_func=self.trace_orbit_func,
-                    loc=self._mean, args=(self._age,),
-            )
+            propagate = getattr(self.trace_orbit_func,
+                                'propagate_with_jacobian', None)
+            if propagate is not None:
+                mean_now, jac = propagate(self._mean, times=self._age)
+                if self._mean_now is None:
+                    self._mean_now = mean_now
+                self._covmatrix_now = np.dot(jac,
+                                             np.dot(self._covmatrix, jac.T))
+            else:
+                self._covmatrix_now = transform.transform_covmatrix(
+                        self._covmatrix, trans_func=self.trace_orbit_func,
+                        loc=self._mean, args=(self._age,),
+                )
         return self._covmatrix_now
 
 
@@ -572,7 +601,84 @@ class AbstractComponent(object):
             The phase-space covariance matrix of current-day Gaussian
             distribution of Component
         """
-        return self.get_mean_now(), self.get_covmatrix_now()
+        # Covariance matrix first, so that propagators which provide the
+        # Jacobian also provide the mean
+        covmatrix_now = self.get_covmatrix_now()
+        return self.get_mean_now(), covmatrix_now
+
+    @classmethod
+    def get_batch_attributes(cls, emcee_pars):
+        """
+        Build the three key attributes of many components at once, as
+        arrays, from parameters in emcee parametrisation.
+
+        This implementation builds a Component per parameter set.
+        Implementations whose attributes are simple functions of their
+        parameters should override it with array operations.
+
+        Parameters
+        ----------
+        emcee_pars: [ncomps, npars] float array_like
+
+        Returns
+        -------
+        means: [ncomps, 6] float array
+        covmatrices: [ncomps, 6, 6] float array
+        ages: [ncomps] float array
+        """
+        comps = [cls(emcee_pars=pars) for pars in emcee_pars]
+        return (np.array([comp.get_mean() for comp in comps]),
+                np.array([comp.get_covmatrix() for comp in comps]),
+                np.array([comp.get_age() for comp in comps]))
+
+    @staticmethod
+    def get_currentday_projections(means, covmatrices, ages,
+                                   trace_orbit_func=None):
+        """
+        Calculate the current day projection of many components at once,
+        as given by their attributes.
+
+        If `trace_orbit_func` has a `propagate_many_with_jacobians`
+        attribute (e.g. traceorbit.trace_cartesian_orbit), taking arrays of
+        start points and ages and returning the traced points along with
+        their Jacobians, every component is projected in that one call.
+        Otherwise components are projected one at a time, as in
+        get_currentday_projection.
+
+        Parameters
+        ----------
+        means: [ncomps, 6] float array
+        covmatrices: [ncomps, 6, 6] float array
+        ages: [ncomps] float array
+        trace_orbit_func: function {trace_cartesian_orbit}
+
+        Returns
+        -------
+        means_now: [ncomps, 6] float array
+        covmatrices_now: [ncomps, 6, 6] float array
+        """
+        if trace_orbit_func is None:
+            trace_orbit_func = trace_cartesian_orbit
+        propagate_many = getattr(trace_orbit_func,
+                                 'propagate_many_with_jacobians', None)
+        propagate = getattr(trace_orbit_func, 'propagate_with_jacobian',
+                            None)
+        if propagate_many is not None:
+            means_now, jacs = propagate_many(means, ages)
+        elif propagate is not None:
+            means_now, jacs = zip(*[propagate(mean, times=age)
+                                    for mean, age in zip(means, ages)])
+        else:
+            means_now = [trace_orbit_func(mean, times=age)
+                         for mean, age in zip(means, ages)]
+            jacs = [transform.calc_jacobian(trace_orbit_func, mean,
+                                            args=(age,))
+                    for mean, age in zip(means, ages)]
+        means_now = np.array(means_now).reshape(-1, 6)
+        jacs = np.array(jacs).reshape(-1, 6, 6)
+        covmatrices_now = np.einsum('nij,njk,nlk->nil',
+                                    jacs, covmatrices, jacs)
+        return means_now, covmatrices_now
 
 
     def split_group_ages(self, ages):
@@ -605,12 +711,20 @@ class AbstractComponent(object):
         2020-11-14 Tim Crundall
         Code copy pasted from split_group_age, and generalised
         """
+        # Give new components identical initial covmatrix, and initial
+        # means chosen to yield identical mean_now, tracing back to every
+        # age in one call if trace_orbit_func supports it
+        mean_now = self.get_mean_now()
+        if _accepts_single_age(self.trace_orbit_func):
+            new_means = self.trace_orbit_func(
+                    mean_now, times=-np.array(ages, dtype=float),
+                    single_age=False,
+            )
+        else:
+            new_means = [self.trace_orbit_func(mean_now, times=-age)
+                         for age in ages]
         comps = []
-        for new_age in ages:
-            # Give new component identical initial covmatrix, and a initial
-            # mean chosen to yield identical mean_now
-            new_mean = self.trace_orbit_func(self.get_mean_now(),
-                                             times=-new_age)
+        for new_age, new_mean in zip(ages, new_means):
             new_comp = self.__class__(attributes={'mean':new_mean,
                                                   'covmatrix':self._covmatrix,
                                                   'age':new_age})
@@ -1527,6 +1641,22 @@ class SphereComponent(AbstractComponent):
             self._pars[7] = dv
             self.set_sphere_stds()
 
+    @classmethod
+    def get_batch_attributes(cls, emcee_pars):
+        """
+        Build the attributes of many components at once, see
+        AbstractComponent.get_batch_attributes
+        """
+        emcee_pars = np.atleast_2d(emcee_pars)
+        ncomps = len(emcee_pars)
+        dx = np.exp(emcee_pars[:,6])
+        dv = np.exp(emcee_pars[:,7])
+        covmatrices = np.zeros((ncomps, 6, 6))
+        covmatrices[:,[0,1,2],[0,1,2]] = (dx**2)[:,np.newaxis]
+        covmatrices[:,[3,4,5],[3,4,5]] = (dv**2)[:,np.newaxis]
+        return (np.array(emcee_pars[:,:6]), covmatrices,
+                np.array(emcee_pars[:,-1]))
+
 
 class EllipComponent(AbstractComponent):
     PARAMETER_FORMAT = ['pos', 'pos', 'pos', 'vel', 'vel', 'vel',
@@ -175,6 +175,13 @@ def calc_gc2eq_matrix(a_deg=192.8595, d_deg=27.1283, th_deg=122.9319):
     return np.linalg.inv(calc_eq2gc_matrix(a_deg, d_deg, th_deg))
 
 
+# Transformations are fixed at J2000, so only build them once
+EQ2GC_MATRIX = calc_eq2gc_matrix()
+GC2EQ_MATRIX = calc_gc2eq_matrix()
+
+K = 4.74057 #(km/s) / (1AU/yr)
+
+
 def convert_angles2cartesian(theta_deg, phi_deg, radius=1.0):
     """
     theta   : angle (as astropy degrees) about the north pole (longitude, RA)
@@ -231,8 +238,7 @@ def convert_equatorial2galactic(theta_deg, phi_deg):
 
     cart_eq = convert_angles2cartesian(theta_deg, phi_deg)
     # logging.debug("Cartesian eq coords: {}".format(cart_eq))
-    eq_to_gc = calc_eq2gc_matrix()
-    cart_gc = np.dot(eq_to_gc, cart_eq)
+    cart_gc = np.dot(EQ2GC_MATRIX, cart_eq)
     # logging.debug("Cartesian gc coords: {}".format(cart_gc))
     pos_gc_deg = convert_cartesian2angles(*cart_gc)
     return pos_gc_deg
@@ -262,8 +268,7 @@ def convert_galactic2equatorial(theta_deg, phi_deg, value=True):
 
     cart_gc = convert_angles2cartesian(theta_deg, phi_deg)
     # logging.debug("Cartesian eq coords: {}".format(cart_gc))
-    gc_to_eq = calc_gc2eq_matrix()
-    cart_eq = np.dot(gc_to_eq, cart_gc)
+    cart_eq = np.dot(GC2EQ_MATRIX, cart_gc)
     # logging.debug("Cartesian gc coords: {}".format(cart_eq))
     pos_eq_deg = convert_cartesian2angles(*cart_eq)
     return pos_eq_deg
@@ -274,21 +279,60 @@ def calc_pm_coord_matrix(a_deg, d_deg):
     Generate a coordinate matrix for calculating proper motions
 
     This is matrix `A` in Johnson & Soderblom (1987)
+
+    Parameters
+    ----------
+    a_deg : float -or- [n] float array (deg)
+        right ascension(s) in equatorial coordinates
+    d_deg : float -or- [n] float array (deg)
+        declination(s) in equatorial coordinates
+
+    Returns
+    -------
+    res : [3x3] array -or- [n,3,3] array
+        One matrix per provided position
     """
-    a_rad = a_deg*np.pi/180.
-    d_rad = d_deg*np.pi/180.
+    a_rad = np.asarray(a_deg)*np.pi/180.
+    d_rad = np.asarray(d_deg)*np.pi/180.
+    cos_a, sin_a = np.cos(a_rad), np.sin(a_rad)
+    cos_d, sin_d = np.cos(d_rad), np.sin(d_rad)
 
-    first_t = np.array([
-        [ np.cos(d_rad),  0, -np.sin(d_rad)],
-        [         0, -1,          0],
-        [-np.sin(d_rad),  0, -np.cos(d_rad)]
-    ])
-    second_t = np.array([
-        [np.cos(a_rad),  np.sin(a_rad), 0],
-        [np.sin(a_rad), -np.cos(a_rad), 0],
-        [        0,         0, -1],
-    ])
-    return np.dot(second_t, first_t)
+    # Entries of `second_t . first_t` written out explicitly so that
+    # arrays of positions yield a stack of matrices
+    res = np.zeros(a_rad.shape + (3, 3))
+    res[..., 0, 0] = cos_a * cos_d
+    res[..., 0, 1] = -sin_a
+    res[..., 0, 2] = -cos_a * sin_d
+    res[..., 1, 0] = sin_a * cos_d
+    res[..., 1, 1] = cos_a
+    res[..., 1, 2] = -sin_a * sin_d
+    res[..., 2, 0] = sin_d
+    res[..., 2, 2] = cos_d
+    return res
+
+
+def calc_sky2space_matrices(a_deg, d_deg):
+    """
+    Generate the matrices taking (rv, tangential velocities) to heliocentric
+    (U, V, W)
+
+    This is matrix `B` in Johnson & Soderblom (1987). Since `B` is a
+    product of rotations its inverse is simply its transpose.
+
+    Parameters
+    ----------
+    a_deg : [n] float array (deg)
+        right ascensions in equatorial coordinates
+    d_deg : [n] float array (deg)
+        declinations in equatorial coordinates
+
+    Returns
+    -------
+    res : [n,3,3] array
+    """
+    pm_coord_matrices = calc_pm_coord_matrix(np.atleast_1d(a_deg),
+                                             np.atleast_1d(d_deg))
+    return np.einsum('ij,njk->nik', EQ2GC_MATRIX, pm_coord_matrices)
 
 
 def convert_pm2heliospacevelocity(a_deg, d_deg, pi, mu_a, mu_d, rv):
@@ -306,33 +350,19 @@ def convert_pm2heliospacevelocity(a_deg, d_deg, pi, mu_a, mu_d, rv):
 
     Returns
     -------
-    UVW : [3] array
-    """
-    # Not obvious to TC how to handle vector input, since
-    # matrices must be generated and combined. So we check for vector input,
-    # and perform in loop
-    try:
-        len(a_deg)
-    except TypeError:
-        a_deg, d_deg, pi, mu_a, mu_d, rv = [a_deg], [d_deg], [pi], [mu_a], [mu_d], [rv]
-
-    space_vels = []
-    for a, d, p, ma, md, r in zip(a_deg, d_deg, pi, mu_a, mu_d, rv):
-        B = np.dot(
-            calc_eq2gc_matrix(),
-            calc_pm_coord_matrix(a, d),
-        )
-        K = 4.74057 #(km/s) / (1AU/yr)
-        astr_vels = np.array([
-            r,
-            K * ma / p,
-            K * md / p,
-        ])
-        space_vels.append(np.dot(B, astr_vels))
-
-    space_vels = np.squeeze(np.array(space_vels))
-
-    return space_vels.T
+    UVW : [3] array -or- [3,n] array
+    """
+    a_deg, d_deg, pi, mu_a, mu_d, rv = [np.atleast_1d(val) for val in
+                                        (a_deg, d_deg, pi, mu_a, mu_d, rv)]
+    astr_vels = np.array([
+        rv,
+        K * mu_a / pi,
+        K * mu_d / pi,
+    ]).T
+    space_vels = np.einsum('nij,nj->ni',
+                           calc_sky2space_matrices(a_deg, d_deg), astr_vels)
+
+    return np.squeeze(space_vels).T
 
 
 def convert_heliospacevelocity2pm(a_deg, d_deg, pi, u, v, w):
@@ -353,31 +383,19 @@ def convert_heliospacevelocity2pm(a_deg, d_deg, pi, u, v, w):
     mu_d : (as/yr) proper motion in declination
     rv : (km/s) line of sight velocity
     """
-    # assert isinstance(a_deg, (int, float, np.float32, np.float64))
-    # logging.debug("Parallax is {} as which is a distance of {} pc".format(
-    #     pi, 1./pi
-    # ))
-    a_deg, d_deg, pi, us, vs, ws = [np.atleast_1d(val) for val in
-                                   (a_deg, d_deg, pi, u, v, w)]
-
-    res = []
-    for a, d, p, u, v, w in zip(a_deg, d_deg, pi, us, vs, ws):
-        space_vels = np.array([u,v,w])
+    a_deg, d_deg, pi, u, v, w = [np.atleast_1d(val) for val in
+                                 (a_deg, d_deg, pi, u, v, w)]
+    space_vels = np.array([u, v, w]).T
 
-        B_inv = np.linalg.inv(np.dot(
-            calc_eq2gc_matrix(),
-            calc_pm_coord_matrix(a, d)
-        ))
-        sky_vels = np.dot(B_inv, space_vels) # now in km/s
-        K = 4.74057 #(km/s) / (AU/yr)
-        rv = sky_vels[0]
-        mu_a = p * sky_vels[1] / K
-        mu_d = p * sky_vels[2] / K
-        res.append([mu_a, mu_d, rv])
+    # B is orthogonal, so applying its transpose inverts it
+    sky_vels = np.einsum('nji,nj->ni',
+                         calc_sky2space_matrices(a_deg, d_deg), space_vels)
+    rv = sky_vels[:,0]
+    mu_a = pi * sky_vels[:,1] / K
+    mu_d = pi * sky_vels[:,2] / K
+    res = np.array([mu_a, mu_d, rv]).T
 
-    res = np.squeeze(np.array(res))
-
-    return res.T
+    return np.squeeze(res).T
 
 
 def convert_helioxyzuvw2astrometry(xyzuvw_helio):
@@ -533,27 +551,120 @@ def convert_many_astrometry2lsrxyzuvw(astr_arr, mas=True):
     Take a point straight from a catalogue, return it as XYZUVW
 
     This function takes astrometry in conventional units, and converts them
-    into internal units for convenience.
+    into internal units for convenience. All stars are converted in one
+    set of array operations.
 
     Parameters
     ----------
-    a : (deg) right ascention
-    d : (deg) declination
-    pi : (mas) parallax
-    mu_a : (mas/yr) proper motion in right ascension
-    mu_d : (mas/yr) proper motion in declination
-    rv : (km/s) line of sight velocity
+    astr_arr : [n,6] float array
+        a : (deg) right ascention
+        d : (deg) declination
+        pi : (mas) parallax
+        mu_a : (mas/yr) proper motion in right ascension
+        mu_d : (mas/yr) proper motion in declination
+        rv : (km/s) line of sight velocity
 
     mas : Boolean {True}
         set if input parallax and proper motions are in mas
+
+    Returns
+    -------
+    xyzuvws : [n,6] float array
+        (pc, pc, pc, km/s, km/s, km/s)
     """
     logging.info("converting to LSRXYZUVW")
-    xyzuvws = np.zeros(astr_arr.shape)
-    for i, astr in enumerate(astr_arr):
-        if (i % 1000 == 0):
-            logging.info("{} of {} done".format(i, xyzuvws.shape[0]))
-        xyzuvws[i] = convert_astrometry2lsrxyzuvw(astr, mas=mas)
-    return xyzuvws
+    astr_arr = np.array(np.atleast_2d(astr_arr), dtype=float)
+    # convert to as for internal use
+    if mas:
+        astr_arr[:,2:5] *= 1e-3
+    a_deg, d_deg, pi, mu_a, mu_d, rv = astr_arr.T
+
+    l_deg, b_deg = convert_equatorial2galactic(a_deg, d_deg)
+    xyz = convert_angles2cartesian(l_deg, b_deg, radius=1./pi).T
+    uvw = np.einsum('nij,nj->ni',
+                    calc_sky2space_matrices(a_deg, d_deg),
+                    np.array([rv, K * mu_a / pi, K * mu_d / pi]).T)
+
+    return convert_helio2lsr(np.hstack((xyz, uvw)))
+
+
+def calc_many_astrometry2lsrxyzuvw_jacobians(astr_arr, mas=True):
+    """
+    Calculate the Jacobians of `convert_astrometry2lsrxyzuvw` in closed form
+
+    Positions are `xyz = G . e(a,d) / pi` and velocities are
+    `uvw = G . A(a,d) . [rv, K mu_a / pi, K mu_d / pi]`, where `G` is the
+    equatorial to Galactic rotation, `e` the equatorial unit vector and
+    `A` the proper motion coordinate matrix of Johnson & Soderblom (1987).
+    These are differentiated directly, replacing the 12 transformation
+    calls per star needed by finite differences. The offset to the LSR
+    is constant and so does not contribute.
+
+    Parameters
+    ----------
+    astr_arr : [n,6] float array
+        Astrometry in the same units as `convert_many_astrometry2lsrxyzuvw`
+    mas : Boolean {True}
+        set if input parallax and proper motions are in mas
+
+    Returns
+    -------
+    jacs : [n,6,6] float array
+        The Jacobian of each star's transformation, with rows in XYZUVW and
+        columns in the order of the input astrometry
+    """
+    astr_arr = np.array(np.atleast_2d(astr_arr), dtype=float)
+    if mas:
+        astr_arr[:,2:5] *= 1e-3
+    a_deg, d_deg, pi, mu_a, mu_d, rv = astr_arr.T
+    nstars = len(astr_arr)
+    deg2rad = np.pi/180.
+
+    a_rad = a_deg*deg2rad
+    d_rad = d_deg*deg2rad
+    cos_a, sin_a = np.cos(a_rad), np.sin(a_rad)
+    cos_d, sin_d = np.cos(d_rad), np.sin(d_rad)
+
+    # The pm coordinate matrix has columns e, (de/da)/cos(d) and de/dd,
+    # from which its derivatives with respect to a and d follow
+    pm_coord_matrices = calc_pm_coord_matrix(a_deg, d_deg)
+    dpm_da = np.zeros((nstars, 3, 3))
+    dpm_da[:,:,0] = cos_d[:,np.newaxis] * pm_coord_matrices[:,:,1]
+    dpm_da[:,:,1] = np.array([-cos_a, -sin_a, np.zeros(nstars)]).T
+    dpm_da[:,:,2] = -sin_d[:,np.newaxis] * pm_coord_matrices[:,:,1]
+    dpm_dd = np.zeros((nstars, 3, 3))
+    dpm_dd[:,:,0] = pm_coord_matrices[:,:,2]
+    dpm_dd[:,:,2] = -pm_coord_matrices[:,:,0]
+
+    dist = 1./pi
+    sky_vels = np.array([rv, K * mu_a * dist, K * mu_d * dist]).T
+    sky2space = np.einsum('ij,njk->nik', EQ2GC_MATRIX, pm_coord_matrices)
+
+    jacs = np.zeros((nstars, 6, 6))
+
+    # Position derivatives
+    jacs[:,:3,0] = deg2rad * dist[:,np.newaxis] * np.einsum(
+            'ij,nj->ni', EQ2GC_MATRIX, dpm_da[:,:,0])
+    jacs[:,:3,1] = deg2rad * dist[:,np.newaxis] * np.einsum(
+            'ij,nj->ni', EQ2GC_MATRIX, dpm_dd[:,:,0])
+    jacs[:,:3,2] = -dist[:,np.newaxis]**2 * sky2space[:,:,0]
+
+    # Velocity derivatives
+    jacs[:,3:,0] = deg2rad * np.einsum('ij,njk,nk->ni',
+                                       EQ2GC_MATRIX, dpm_da, sky_vels)
+    jacs[:,3:,1] = deg2rad * np.einsum('ij,njk,nk->ni',
+                                       EQ2GC_MATRIX, dpm_dd, sky_vels)
+    jacs[:,3:,2] = -dist[:,np.newaxis] * np.einsum(
+            'nij,nj->ni', sky2space[:,:,1:], sky_vels[:,1:])
+    jacs[:,3:,3] = K * dist[:,np.newaxis] * sky2space[:,:,1]
+    jacs[:,3:,4] = K * dist[:,np.newaxis] * sky2space[:,:,2]
+    jacs[:,3:,5] = sky2space[:,:,0]
+
+    # Derivatives are with respect to as, rescale for input in mas
+    if mas:
+        jacs[:,:,2:5] *= 1e-3
+
+    return jacs
 
 
 def convert_lsrxyzuvw2astrometry(xyzuvw_lsr):
@@ -588,24 +699,43 @@ def convert_lsrxyzuvw2astrometry(xyzuvw_lsr):
 
 def convert_many_lsrxyzuvw2astrometry(xyzuvw_lsrs):
     """
-    Takes as input heliocentric XYZUVW values, returns astrometry
+    Takes as input LSR XYZUVW values, returns astrometry
+
+    All stars are converted in one set of array operations.
 
     Parameters
     ----------
-    xyzuvw_lsr : (pc, pc, pc, km/s, km/s, km/s) array
-        The position and velocity of a star in a right handed cartesian system
+    xyzuvw_lsrs : [n,6] (pc, pc, pc, km/s, km/s, km/s) array
+        The position and velocity of stars in a right handed cartesian system
         corotating with and centred on the local standard of rest
 
     Returns
     -------
-    a : (deg) right ascention
-    d : (deg) declination
-    pi : (mas) parallax
-    mu_a : (mas/yr) proper motion in right ascension
-    mu_d : (mas/yr) proper motion in declination
-    rv : (km/s) line of sight velocity
+    astros : [n,6] float array
+        a : (deg) right ascention
+        d : (deg) declination
+        pi : (mas) parallax
+        mu_a : (mas/yr) proper motion in right ascension
+        mu_d : (mas/yr) proper motion in declination
+        rv : (km/s) line of sight velocity
     """
-    astros = np.zeros(xyzuvw_lsrs.shape)
-    for i, xyzuvw_lsr in enumerate(xyzuvw_lsrs):
-        astros[i] = convert_lsrxyzuvw2astrometry(xyzuvw_lsr)
-    return astros
+    xyzuvw_helios = convert_lsr2helio(np.atleast_2d(xyzuvw_lsrs))
+    x, y, z, u, v, w = np.copy(xyzuvw_helios.T)
+
+    l_deg, b_deg, dist = convert_cartesian2angles(x, y, z, return_dist=True)
+    a_deg, d_deg = convert_galactic2equatorial(l_deg, b_deg)
+    pi = 1./dist
+    # B is orthogonal, so applying its transpose inverts it
+    sky_vels = np.einsum('nji,nj->ni',
+                         calc_sky2space_matrices(a_deg, d_deg),
+                         np.array([u, v, w]).T)
+
+    # Finally converts angles to mas for external use
+    return np.array([
+        a_deg,
+        d_deg,
+        1e3 * pi,
+        1e3 * pi * sky_vels[:,1] / K,
+        1e3 * pi * sky_vels[:,2] / K,
+        sky_vels[:,0],
+    ]).T
@@ -6,7 +6,15 @@ from __future__ import print_function, division, unicode_literals
 
 from astropy.table import Table
 from datetime import datetime
+import hashlib
 import logging
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where concurrent additions to a
+    # BackgroundOverlapStore are not protected
+    fcntl = None
+from multiprocessing import Pool
 import numpy as np
 import os.path
 
@@ -46,6 +54,27 @@ DEFAULT_PARS = {
     'bg_ref_table':'',
     'bg_main_colnames':None,
     'bg_col_name':'background_log_overlap',
+    # If set, background overlaps are calculated from a mixture of this many
+    # Gaussians compressed from bg_ref_table, rather than from every
+    # reference star. See expectmax.compress_background
+    'bg_mixture_ncomps':None,
+    # Where the compressed mixture is stored, and loaded from if it exists
+    'bg_mixture_file':None,
+    # Number of stars for which the mixture is validated against the exact
+    # background overlaps
+    'bg_mixture_nvalidate':100,
+    # Background overlaps are calculated in chunks of this many stars,
+    # split across this many processes (or an MPI pool)
+    'bg_chunk_size':10000,
+    'bg_nprocesses':1,
+    'bg_use_mpi':False,
+    # If set, each finished chunk is stored in this directory, such that
+    # an interrupted calculation resumes from the finished chunks
+    'bg_checkpoint_dir':None,
+    # If set, background overlaps are looked up in (and added to) a store
+    # in this directory, indexed by the column `bg_store_id_colname`
+    'bg_store_dir':None,
+    'bg_store_id_colname':'source_id',
     'par_log_file':'data_pars.log',
 
     'overwrite_datafile':False,
@@ -160,6 +189,298 @@ def get_region(ref_table, assoc_name=None,
     return box_lower_bound, box_upper_bound
 
 
+# The background reference (either reference star means or a compressed
+# mixture) shared by all chunks calculated by a worker process
+_BG_REF = None
+
+
+def _init_bg_worker(bg_ref):
+    global _BG_REF
+    _BG_REF = bg_ref
+
+
+def _calc_bg_overlaps_chunk(task):
+    """
+    Calculate the background overlaps of one chunk of stars. Packaged
+    as a module level function of a single argument for use with pools.
+    """
+    chunk_ix, star_means, star_covs, bg_ref = task
+    if bg_ref is None:
+        bg_ref = _BG_REF
+    if isinstance(bg_ref, dict):
+        ln_bg_ols = expectmax.get_background_overlaps_with_mixture(
+                bg_mixture=bg_ref, star_means=star_means, star_covs=star_covs,
+        )
+    else:
+        ln_bg_ols = expectmax.get_background_overlaps_with_covariances(
+                background_means=bg_ref, star_means=star_means,
+                star_covs=star_covs,
+        )
+    return chunk_ix, np.array(ln_bg_ols)
+
+
+def calc_background_overlaps(bg_ref, star_means, star_covs,
+                             chunk_size=10000, nprocesses=1, pool=None,
+                             checkpoint_dir=None):
+    """
+    Calculate the background overlaps of stars in chunks, optionally in
+    parallel, checkpointing each chunk as it finishes.
+
+    If `checkpoint_dir` is provided, each finished chunk is stored there
+    as a .npy file. Calling again with the same stars, background
+    reference and `chunk_size` (e.g. after a crash) only calculates chunks
+    that are not yet stored.
+
+    Parameters
+    ----------
+    bg_ref: [nbgstars,6] float array -or- dict
+        Either the phase-space positions of the background reference
+        stars (see expectmax.get_background_overlaps_with_covariances),
+        or a mixture compressed from them (see
+        expectmax.compress_background)
+    star_means: [nstars,6] float array
+    star_covs: [nstars,6,6] float array
+    chunk_size: int {10000}
+        Number of stars in each chunk
+    nprocesses: int {1}
+        Number of processes across which chunks are spread, if no `pool`
+        is provided
+    pool: Pool-like object {None}
+        An object with a `map` method (e.g. an MPI pool executor) across
+        which chunks are spread. The background reference is sent with
+        every chunk.
+    checkpoint_dir: str {None}
+        Directory in which finished chunks are stored
+
+    Returns
+    -------
+    ln_bg_ols: [nstars] float array
+        Background log overlaps of stars, in the same order as `star_means`
+    """
+    nstars = len(star_means)
+    nchunks = max(int(np.ceil(nstars / float(chunk_size))), 1)
+    chunk_ixs = np.array_split(np.arange(nstars), nchunks)
+
+    chunk_results = {}
+    if checkpoint_dir is not None:
+        if not os.path.isdir(checkpoint_dir):
+            os.makedirs(checkpoint_dir)
+        # Identify the stars, background reference and chunking, so that
+        # stored chunks are never merged into the wrong stars
+        run_hash = hashlib.sha1()
+        for arr in (star_means, star_covs):
+            run_hash.update(np.ascontiguousarray(arr, dtype=np.float64).data)
+        run_hash.update(str((nstars, chunk_size)).encode())
+        run_hash.update(BackgroundOverlapStore.get_ref_key(bg_ref).encode())
+        manifest_file = os.path.join(checkpoint_dir, 'bg_ols_manifest.txt')
+        if os.path.isfile(manifest_file):
+            with open(manifest_file) as fp:
+                if fp.read().strip() != run_hash.hexdigest():
+                    raise UserWarning('Checkpoints in {} are from different '
+                                      'stars, background reference or chunk '
+                                      'size. Remove them, or choose another '
+                                      '`bg_checkpoint_dir`'.format(
+                            checkpoint_dir))
+        else:
+            with open(manifest_file, 'w') as fp:
+                fp.write(run_hash.hexdigest())
+
+        chunk_files = [os.path.join(checkpoint_dir,
+                                    'bg_ols_chunk_{:05d}.npy'.format(i))
+                       for i in range(nchunks)]
+        for i, chunk_file in enumerate(chunk_files):
+            if os.path.isfile(chunk_file):
+                chunk_results[i] = np.load(chunk_file)
+        logging.info('Resuming background overlaps with {} of {} chunks '
+                     'finished'.format(len(chunk_results), nchunks))
+
+    todo = [i for i in range(nchunks) if i not in chunk_results]
+    own_pool = None
+    try:
+        if pool is not None:
+            tasks = [(i, star_means[chunk_ixs[i]], star_covs[chunk_ixs[i]],
+                      bg_ref)
+                     for i in todo]
+            results = pool.map(_calc_bg_overlaps_chunk, tasks)
+        else:
+            tasks = [(i, star_means[chunk_ixs[i]], star_covs[chunk_ixs[i]],
+                      None)
+                     for i in todo]
+            if nprocesses > 1 and len(todo) > 1:
+                own_pool = Pool(nprocesses, initializer=_init_bg_worker,
+                                initargs=(bg_ref,))
+                results = own_pool.imap_unordered(_calc_bg_overlaps_chunk,
+                                                  tasks)
+            else:
+                _init_bg_worker(bg_ref)
+                results = map(_calc_bg_overlaps_chunk, tasks)
+
+        # Store chunks as they finish. Chunks are written to a temporary
+        # file first, such that an interruption never leaves a partial chunk
+        for i, chunk_result in results:
+            chunk_results[i] = chunk_result
+            if checkpoint_dir is not None:
+                tmp_file = chunk_files[i] + '.tmp.npy'
+                np.save(tmp_file, chunk_result)
+                os.rename(tmp_file, chunk_files[i])
+            logging.info('Finished background overlaps of chunk {} of '
+                         '{}'.format(i+1, nchunks))
+    except BaseException:
+        # Don't wait on chunks whose results would be discarded
+        if own_pool is not None:
+            own_pool.terminate()
+        raise
+    finally:
+        if own_pool is not None:
+            own_pool.close()
+            own_pool.join()
+        if pool is None:
+            _init_bg_worker(None)
+
+    return np.concatenate([chunk_results[i] for i in range(nchunks)])
+
+
+class BackgroundOverlapStore(object):
+    """
+    An on-disk store of background log overlaps, indexed by (Gaia)
+    source_id, such that each star's background overlap need only ever be
+    calculated once.
+
+    Overlaps depend on the background reference (and its kernel
+    bandwidth), so each reference has its own file in `store_dir`, named
+    by a hash of the reference. The file holds a [2, n] int64 array: the
+    sorted source_ids, and the bits of the corresponding (float64) log
+    overlaps. Keeping the source_ids contiguous means the file can be
+    memory mapped and binary searched, so looking up stars is O(log n)
+    per star without reading the whole store.
+
+    Additions are merged with the file as it is at the time of writing,
+    and written to a temporary file which then replaces the original, so
+    the store is never left partially written. An exclusive lock on a
+    neighbouring .lock file is held while merging, so that processes
+    sharing a store never lose each other's additions.
+
+    Attributes
+    ----------
+    store_file: str
+        the file holding the overlaps for this background reference
+    """
+    def __init__(self, store_dir, bg_ref):
+        """
+        Parameters
+        ----------
+        store_dir: str
+            Directory holding the stores of every background reference
+        bg_ref: [nbgstars,6] float array -or- dict
+            The background reference, see calc_background_overlaps
+        """
+        if not os.path.isdir(store_dir):
+            os.makedirs(store_dir)
+        self.store_file = os.path.join(
+                store_dir, 'bg_ols_{}.npy'.format(self.get_ref_key(bg_ref))
+        )
+
+    @staticmethod
+    def get_ref_key(bg_ref):
+        """
+        Hash the background reference, and the kernel bandwidth or mixture
+        derived from it
+        """
+        ref_hash = hashlib.sha1()
+        if isinstance(bg_ref, dict):
+            ref_hash.update(b'mixture')
+            arrs = [bg_ref[key] for key in ('amps', 'means', 'covs')]
+        else:
+            ref_hash.update(b'exact')
+            arrs = [bg_ref, expectmax.get_background_bandwidth_cov(bg_ref)]
+        for arr in arrs:
+            arr = np.ascontiguousarray(arr, dtype=np.float64)
+            ref_hash.update(str(arr.shape).encode())
+            ref_hash.update(arr.data)
+        return ref_hash.hexdigest()
+
+    def load(self, mmap_mode='r'):
+        """
+        Returns
+        -------
+        source_ids: [n] int array
+            the sorted source_ids of stored stars
+        bg_lnols: [n] float array
+            the corresponding background log overlaps
+        """
+        if not os.path.isfile(self.store_file):
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        stored = np.load(self.store_file, mmap_mode=mmap_mode)
+        return stored[0], stored[1].view(np.float64)
+
+    def __len__(self):
+        return len(self.load()[0])
+
+    def lookup(self, source_ids):
+        """
+        Retrieve the stored background log overlaps of stars
+
+        Parameters
+        ----------
+        source_ids: [nstars] int array
+
+        Returns
+        -------
+        bg_lnols: [nstars] float array
+            Stored background log overlaps, with NaN for missing stars
+        found: [nstars] bool array
+            Which stars have stored background log overlaps
+        """
+        source_ids = np.asarray(source_ids, dtype=np.int64)
+        stored_ids, stored_lnols = self.load()
+        bg_lnols = np.full(len(source_ids), np.nan)
+        if len(stored_ids) == 0:
+            return bg_lnols, np.zeros(len(source_ids), dtype=bool)
+
+        ixs = np.searchsorted(stored_ids, source_ids)
+        ixs = np.minimum(ixs, len(stored_ids) - 1)
+        found = stored_ids[ixs] == source_ids
+        bg_lnols[found] = stored_lnols[ixs[found]]
+        return bg_lnols, found
+
+    def add(self, source_ids, bg_lnols):
+        """
+        Store the background log overlaps of stars, replacing any
+        previously stored values for the same stars
+        """
+        source_ids = np.asarray(source_ids, dtype=np.int64)
+        bg_lnols = np.asarray(bg_lnols, dtype=np.float64)
+        with open(self.store_file + '.lock', 'w') as lock_fp:
+            if fcntl is not None:
+                fcntl.flock(lock_fp, fcntl.LOCK_EX)
+            try:
+                self._merge(source_ids, bg_lnols)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_fp, fcntl.LOCK_UN)
+
+    def _merge(self, source_ids, bg_lnols):
+        """
+        Merge additions into the store as it is on disk. Only to be called
+        while holding the store's lock, see `add`
+        """
+        stored_ids, stored_lnols = self.load(mmap_mode=None)
+        keep = ~np.in1d(stored_ids, source_ids)
+
+        # Where source_ids are repeated, the last addition is kept
+        merged_ids = np.concatenate((stored_ids[keep], source_ids))
+        merged_lnols = np.concatenate((stored_lnols[keep], bg_lnols))
+        _, last_ixs = np.unique(merged_ids[::-1], return_index=True)
+        ixs = len(merged_ids) - 1 - last_ixs
+
+        merged = np.empty((2, len(ixs)), dtype=np.int64)
+        merged[0] = merged_ids[ixs]
+        merged[1] = merged_lnols[ixs].view(np.int64)
+        tmp_file = self.store_file + '.tmp.npy'
+        np.save(tmp_file, merged)
+        os.rename(tmp_file, self.store_file)
+
+
 def prepare_data(custom_pars):
     """
     Entry point for complete data preparation.
@@ -189,7 +510,6 @@ def prepare_data(custom_pars):
 
     Notes
     -----
-    TODO: update background overlaps to allow for multiprocessing
     TODO: test functionality of overlap calculations
     TODO: Implement initialising synethetic datasets?
     TODO: Implement various input checks
@@ -351,13 +671,67 @@ def prepare_data(custom_pars):
                 corr_colnames=data_pars['cart_corr_colnames'],
         )
 
-        #TODO: A parallelised version of this exists, incorporate it?
-        #TODO: Check database for precomputed bgoverlaps
-        ln_bg_ols = expectmax.get_background_overlaps_with_covariances(
-                background_means=bg_star_means,
-                star_means=input_data_dict['means'],
-                star_covs=input_data_dict['covs'],
-        )
+        if data_pars['bg_mixture_ncomps'] is not None:
+            if data_pars['bg_mixture_file'] is not None and \
+                    os.path.isfile(data_pars['bg_mixture_file']):
+                bg_mixture = expectmax.load_background_mixture(
+                        data_pars['bg_mixture_file']
+                )
+            else:
+                bg_mixture = expectmax.compress_background(
+                        background_means=bg_star_means,
+                        ncomps=data_pars['bg_mixture_ncomps'],
+                        filename=data_pars['bg_mixture_file'],
+                )
+            bg_ref = bg_mixture
+            if data_pars['bg_mixture_nvalidate']:
+                # Logs the errors of the mixture's overlaps
+                expectmax.validate_background_mixture(
+                        bg_mixture=bg_mixture,
+                        background_means=bg_star_means,
+                        star_means=input_data_dict['means'],
+                        star_covs=input_data_dict['covs'],
+                        nvalidate=data_pars['bg_mixture_nvalidate'],
+                )
+        else:
+            #TODO: Check database for precomputed bgoverlaps
+            bg_ref = bg_star_means
+
+        # Only calculate overlaps of stars missing from the store
+        nstars = len(input_data_dict['means'])
+        if data_pars['bg_store_dir'] is not None:
+            bg_store = BackgroundOverlapStore(data_pars['bg_store_dir'],
+                                              bg_ref)
+            source_ids = np.array(data_table[data_pars['bg_store_id_colname']])
+            ln_bg_ols, found = bg_store.lookup(source_ids)
+            logging.info('Found {} of {} background overlaps in {}'.format(
+                    np.sum(found), nstars, bg_store.store_file))
+        else:
+            ln_bg_ols = np.full(nstars, np.nan)
+            found = np.zeros(nstars, dtype=bool)
+
+        if not np.all(found):
+            if data_pars['bg_use_mpi']:
+                # mpi4py is only required if using MPI
+                from mpi4py.futures import MPIPoolExecutor
+                pool = MPIPoolExecutor()
+            else:
+                pool = None
+            try:
+                ln_bg_ols[~found] = calc_background_overlaps(
+                        bg_ref=bg_ref,
+                        star_means=input_data_dict['means'][~found],
+                        star_covs=input_data_dict['covs'][~found],
+                        chunk_size=data_pars['bg_chunk_size'],
+                        nprocesses=data_pars['bg_nprocesses'],
+                        pool=pool,
+                        checkpoint_dir=data_pars['bg_checkpoint_dir'],
+                )
+            finally:
+                if pool is not None:
+                    pool.shutdown()
+            if data_pars['bg_store_dir'] is not None:
+                bg_store.add(source_ids[~found], ln_bg_ols[~found])
 
         tabletool.insert_column(table=data_table,
                                 col_data=ln_bg_ols,
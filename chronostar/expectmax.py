@@ -16,6 +16,13 @@ import itertools
 import logging
 import numpy as np
 import multiprocessing
+try:
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from concurrent.futures.process import BrokenProcessPool
+except ImportError:
+    # python 2 lacks concurrent.futures, but also lacks the shared memory
+    # that ComponentPool relies on
+    pass
 
 # python3 throws FileNotFoundError that is essentially the same as IOError
 try:
@@ -35,6 +42,8 @@ elif ((_SCIPY_VERSION[0] == 1 and _SCIPY_VERSION[1] >= 3) or
 else:
     from scipy.misc import logsumexp
 from scipy import stats
+from scipy.cluster.vq import kmeans2, vq
+from scipy.spatial import cKDTree
 
 import os
 
@@ -49,17 +58,22 @@ except ImportError:
 from .component import SphereComponent
 from . import likelihood
 from . import compfitter
+from . import sharedmem
 from . import tabletool
 try:
     print('Using C implementation in expectmax')
     from ._overlap import get_lnoverlaps
 except:
-    print("WARNING: Couldn't import C implementation, using slow pythonic overlap instead")
-    logging.info("WARNING: Couldn't import C implementation, using slow pythonic overlap instead")
-    from .likelihood import slow_get_lnoverlaps as get_lnoverlaps
+    print("WARNING: Couldn't import C implementation, using vectorised pythonic overlap instead")
+    logging.info("WARNING: Couldn't import C implementation, using vectorised pythonic overlap instead")
+    from .likelihood import batch_get_lnoverlaps as get_lnoverlaps
 
 #from functools import partial
 
+# Log overlap assigned to star-component pairs skipped by overlap culling.
+# Finite, so that multiplying by a (zero) membership yields zero
+CULLED_LNOL = -1e10
+
 def log_message(msg, symbol='.', surround=False):
     """Little formatting helper"""
     res = '{}{:^40}{}'.format(5*symbol, msg, 5*symbol)
@@ -81,7 +95,174 @@ def get_best_permutation(memb_probs, true_memb_probs):
     return best_perm
 
 
-def get_kernel_densities(background_means, star_means, amp_scale=1.0):
+def build_ball_tree(points, leaf_size=32):
+    """
+    Recursively split `points` in half along their widest dimension,
+    recording the centre, radius and size of every node.
+
+    Parameters
+    ----------
+    points: [npoints, dim] float array
+    leaf_size: int {32}
+        Nodes with no more than this many points are not split further
+
+    Returns
+    -------
+    tree: dict
+        'points': [npoints, dim] float array
+            `points`, reordered such that each node's points are contiguous
+        'indices': [npoints] int array
+            the index in `points` of each of the reordered points
+        'starts', 'ends': [nnodes] int arrays
+            the slice of 'points' belonging to each node
+        'centres': [nnodes, dim] float array
+            the mean of each node's points
+        'radii': [nnodes] float array
+            the largest separation of a node's points from its centre
+        'children': [nnodes, 2] int array
+            the indices of each node's children, or -1 for leaves
+    """
+    points = np.array(points, dtype=np.float64)
+    indices = np.arange(len(points))
+    starts, ends, children = [0], [len(points)], [[-1, -1]]
+    stack = [0]
+    while stack:
+        node = stack.pop()
+        start, end = starts[node], ends[node]
+        if end - start <= leaf_size:
+            continue
+        node_points = points[start:end]
+        split_dim = np.argmax(np.ptp(node_points, axis=0))
+        mid = (end - start) // 2
+        order = np.argpartition(node_points[:,split_dim], mid)
+        points[start:end] = node_points[order]
+        indices[start:end] = indices[start:end][order]
+        for child_start, child_end in [(start, start+mid), (start+mid, end)]:
+            children[node][child_start != start] = len(starts)
+            stack.append(len(starts))
+            starts.append(child_start)
+            ends.append(child_end)
+            children.append([-1, -1])
+
+    starts, ends = np.array(starts), np.array(ends)
+    centres = np.zeros((len(starts), points.shape[1]))
+    radii = np.zeros(len(starts))
+    for node, (start, end) in enumerate(zip(starts, ends)):
+        centres[node] = np.mean(points[start:end], axis=0)
+        radii[node] = np.sqrt(np.max(
+                np.sum((points[start:end] - centres[node])**2, axis=1)
+        ))
+    return {
+        'points':points,
+        'indices':indices,
+        'starts':starts,
+        'ends':ends,
+        'centres':centres,
+        'radii':radii,
+        'children':np.array(children),
+    }
+
+
+def get_tree_kernel_log_sums(tree, points, rtol, block_size=256,
+                             max_pairs=2**18):
+    """
+    Approximate the log of the sum of unit Gaussian kernels, centred on
+    each point in `tree`, evaluated at each of `points`, to within a
+    relative error of `rtol`.
+
+    Points are grouped into spatially compact blocks. For each block, the
+    leaves of the tree are visited in order of their nearest possible
+    separation from the block, and their kernels summed exactly, a batch
+    of at most `max_pairs` kernels at a time. Once the most that all
+    unvisited leaves could contribute is within `rtol` of the sum so far,
+    for every point in the block, the remaining leaves are skipped. Hence
+    the sums are underestimated by at most `rtol` times the true sum, and
+    memory is bounded by `max_pairs` regardless of the size of the tree.
+
+    Parameters
+    ----------
+    tree: dict
+        The output of build_ball_tree, in coordinates where kernels have
+        unit covariance
+    points: [npoints, dim] float array
+        Where to evaluate the kernel sum, in the same coordinates
+    rtol: float
+        Relative error tolerance of each sum
+    block_size: int {256}
+        Largest number of points whose leaves are visited together
+    max_pairs: int {2**18}
+        Largest number of kernels evaluated at once
+
+    Returns
+    -------
+    ln_sums: [npoints] float array
+        The log of sum_i exp(-|x - tree_i|^2 / 2) for each point x
+    """
+    tree_points = tree['points']
+    tree_sq_norms = np.sum(tree_points**2, axis=1)
+    leaves = np.where(tree['children'][:,0] < 0)[0]
+    leaf_starts = tree['starts'][leaves]
+    leaf_sizes = tree['ends'][leaves] - leaf_starts
+
+    # All kernels are expressed relative to the nearest kernel to avoid
+    # underflow, so each sum is at least 1
+    min_sq_dists = cKDTree(tree_points).query(points)[0]**2
+
+    blocks = build_ball_tree(points, leaf_size=block_size)
+    block_nodes = np.where(blocks['children'][:,0] < 0)[0]
+
+    ln_sums = np.zeros(len(points))
+    for block in block_nodes:
+        ixs = blocks['indices'][blocks['starts'][block]:blocks['ends'][block]]
+        block_points = points[ixs]
+        block_min_sq_dists = min_sq_dists[ixs]
+        block_offsets = 0.5 * (np.sum(block_points**2, axis=1)
+                               - block_min_sq_dists)
+
+        dists = np.sqrt(np.sum((tree['centres'][leaves]
+                                - blocks['centres'][block])**2, axis=1))
+        near = np.maximum(dists - tree['radii'][leaves]
+                          - blocks['radii'][block], 0.)
+        order = np.argsort(near)
+        # The log of the most that the leaves from order[k:] could
+        # contribute to any point's sum (before rescaling by the nearest
+        # kernel)
+        ln_rest = np.logaddexp.accumulate(
+                (np.log(leaf_sizes[order]) - 0.5 * near[order]**2)[::-1]
+        )[::-1]
+        ln_rest = np.append(ln_rest, -np.inf)
+
+        sums = np.zeros(len(ixs))
+        batch_sizes = np.cumsum(leaf_sizes[order])
+        k = 0
+        while k < len(leaves):
+            # Take as many leaves as fit in max_pairs, but at least one
+            kend = max(np.searchsorted(batch_sizes,
+                                       batch_sizes[k] - leaf_sizes[order[k]]
+                                       + max_pairs // len(ixs),
+                                       side='right'),
+                       k+1)
+            batch = order[k:kend]
+            tree_ixs = np.concatenate([
+                np.arange(start, start+size)
+                for start, size in zip(leaf_starts[batch], leaf_sizes[batch])
+            ])
+            # -(|x - y|^2 - min_sq_dist) / 2, evaluated in place
+            ln_kernels = np.dot(block_points, tree_points[tree_ixs].T)
+            ln_kernels -= 0.5 * tree_sq_norms[tree_ixs]
+            ln_kernels -= block_offsets[:,np.newaxis]
+            sums += np.sum(np.exp(ln_kernels, out=ln_kernels), axis=1)
+            k = kend
+            if np.all(ln_rest[k] + 0.5 * block_min_sq_dists
+                      <= np.log(rtol * sums)):
+                break
+
+        ln_sums[ixs] = np.log(sums) - 0.5 * block_min_sq_dists
+    return ln_sums
+
+
+def get_kernel_densities(background_means, star_means, amp_scale=1.0,
+                         rtol=None):
     """
     Build a PDF from `data`, then evaluate said pdf at `points`
 
@@ -105,6 +286,12 @@ def get_kernel_densities(background_means, star_means, amp_scale=1.0):
         One can optionally weight the background density so as to make over-densities
         more or less prominent. For e.g., amp_scale of 0.1 will make background
         overlaps an order of magnitude lower.
+    rtol: float {None}
+        If set, densities are summed in blocks of background stars, in
+        order of proximity, until each is within this relative error
+        (e.g. 1e-3), see get_tree_kernel_log_sums. This is faster than
+        the exact (default) evaluation, with a fixed memory overhead,
+        and skips background stars too distant to matter.
 
     Returns
     -------
@@ -116,12 +303,26 @@ def get_kernel_densities(background_means, star_means, amp_scale=1.0):
         background_means = np.load(background_means)
     nstars = amp_scale * background_means.shape[0]
 
-    kernel = stats.gaussian_kde(background_means.T)
     star_means = np.copy(star_means)
     star_means[:, 2] *= -1
     star_means[:, 5] *= -1
 
-    bg_lnols = np.log(nstars)+kernel.logpdf(star_means.T)
+    if rtol is None:
+        kernel = stats.gaussian_kde(background_means.T)
+        bg_lnols = np.log(nstars)+kernel.logpdf(star_means.T)
+        return bg_lnols
+
+    # Same kernel bandwidth as gaussian_kde (Scott's rule), in whitened
+    # coordinates where each kernel has unit covariance
+    bandwidth_cov = get_background_bandwidth_cov(background_means)
+    chol = np.linalg.cholesky(bandwidth_cov)
+    tree = build_ball_tree(np.linalg.solve(chol, background_means.T).T,
+                           leaf_size=256)
+    ln_sums = get_tree_kernel_log_sums(
+            tree, np.linalg.solve(chol, star_means.T).T, rtol=rtol,
+    )
+    ln_norm = 0.5 * np.linalg.slogdet(2 * np.pi * bandwidth_cov)[1]
+    bg_lnols = np.log(amp_scale) + ln_sums - ln_norm
     return bg_lnols
 
 
@@ -174,10 +375,8 @@ def get_background_overlaps_with_covariances(background_means, star_means,
     star_means[:, 5] *= -1
 
     # Background covs with bandwidth using Scott's rule
-    d = 6.0 # number of dimensions
     nstars = background_means.shape[0]
-    bandwidth = nstars**(-1.0 / (d + 4.0))
-    background_cov = np.cov(background_means.T) * bandwidth ** 2
+    background_cov = get_background_bandwidth_cov(background_means)
     background_covs = np.array(nstars * [background_cov]) # same cov for every star
 
     # shapes of the c_get_lnoverlaps input must be: (6, 6), (6,), (120, 6, 6), (120, 6)
@@ -216,6 +415,226 @@ def get_background_overlaps_with_covariances(background_means, star_means,
     return bg_lnols
 
 
+def get_background_bandwidth_cov(background_means):
+    """
+    The covariance matrix of each reference star's kernel, with a
+    bandwidth set by Scott's rule, as used for background overlaps.
+
+    Parameters
+    ----------
+    background_means: [nstars,6] float array_like
+        Phase-space positions of the background reference stars
+
+    Returns
+    -------
+    bandwidth_cov: [6,6] float array
+    """
+    d = 6.0 # number of dimensions
+    nstars = background_means.shape[0]
+    bandwidth = nstars**(-1.0 / (d + 4.0))
+    return np.cov(background_means.T) * bandwidth ** 2
+
+
+def compress_background(background_means, ncomps=1000, nfit=100000,
+                        seed=0, filename=None):
+    """
+    Compress the kernel density of the background reference stars into a
+    mixture of `ncomps` Gaussians.
+
+    The kernel density estimate used by
+    get_background_overlaps_with_covariances is itself a mixture with one
+    Gaussian (of covariance `bandwidth_cov`) per reference star. Here
+    reference stars are grouped by k-means clustering, and each cluster's
+    kernels are replaced by a single Gaussian with the same total amplitude,
+    mean and covariance (the cluster's scatter plus `bandwidth_cov`).
+    The compression is done once, after which background overlaps cost
+    `ncomps` rather than `nstars` overlap integrals per star.
+
+    Parameters
+    ----------
+    background_means: [nstars,6] float array_like
+        Phase-space positions of some star set that greatly envelops points
+        in question. See get_background_overlaps_with_covariances
+    ncomps: int {1000}
+        Number of Gaussians in the compressed mixture. More components
+        yield a more faithful, but slower, mixture.
+    nfit: int {100000}
+        Cluster centres are found from a random subset of this many
+        reference stars, after which every reference star is assigned
+        to its nearest centre.
+    seed: int {0}
+        Seed for the random subset and initial cluster centres
+    filename: str {None}
+        If provided, the mixture is stored here (as a .npz file), to be
+        retrieved with load_background_mixture
+
+    Returns
+    -------
+    bg_mixture: dict
+        'amps': [ncomps] float array
+            the number of reference stars described by each Gaussian
+        'means': [ncomps,6] float array
+        'covs': [ncomps,6,6] float array
+        'bandwidth_cov': [6,6] float array
+            the covariance of the kernel of each reference star
+    """
+    if type(background_means) is str:
+        background_means = np.load(background_means)
+    background_means = np.asarray(background_means, dtype=np.float64)
+    nstars, dim = background_means.shape
+    ncomps = min(ncomps, nstars)
+    bandwidth_cov = get_background_bandwidth_cov(background_means)
+
+    # Cluster in coordinates whitened by the kernel, such that positions
+    # and velocities are comparable
+    white_means = np.linalg.solve(np.linalg.cholesky(bandwidth_cov),
+                                  background_means.T).T
+    rand = np.random.RandomState(seed)
+    if nstars > nfit:
+        fit_means = white_means[rand.choice(nstars, nfit, replace=False)]
+    else:
+        fit_means = white_means
+    init_centres = fit_means[rand.choice(len(fit_means), ncomps,
+                                         replace=False)]
+    centres, _ = kmeans2(fit_means, init_centres, minit='matrix',
+                         missing='warn')
+    labels, _ = vq(white_means, centres)
+
+    # Moments of each cluster, dropping any that are empty
+    amps = np.bincount(labels, minlength=ncomps).astype(np.float64)
+    keep = amps > 0
+    sums = np.zeros((ncomps, dim))
+    sq_sums = np.zeros((ncomps, dim, dim))
+    for i in range(dim):
+        sums[:,i] = np.bincount(labels, weights=background_means[:,i],
+                                minlength=ncomps)
+        for j in range(i+1):
+            sq_sums[:,i,j] = sq_sums[:,j,i] = np.bincount(
+                    labels,
+                    weights=background_means[:,i]*background_means[:,j],
+                    minlength=ncomps,
+            )
+    amps, sums, sq_sums = amps[keep], sums[keep], sq_sums[keep]
+    means = sums / amps[:,np.newaxis]
+    scatter = sq_sums / amps[:,np.newaxis,np.newaxis] \
+              - np.einsum('ki,kj->kij', means, means)
+    covs = scatter + bandwidth_cov
+
+    bg_mixture = {
+        'amps':amps,
+        'means':means,
+        'covs':covs,
+        'bandwidth_cov':bandwidth_cov,
+    }
+    if filename is not None:
+        np.savez(filename, **bg_mixture)
+    return bg_mixture
+
+
+def load_background_mixture(filename):
+    """
+    Load a background mixture stored by compress_background
+    """
+    with np.load(filename) as stored:
+        return {key:stored[key] for key in stored.files}
+
+
+def get_background_overlaps_with_mixture(bg_mixture, star_means, star_covs):
+    """
+    Determine background overlaps from a compressed mixture of the
+    background reference stars.
+
+    Each star's background log overlap is the log of the amplitude weighted
+    sum of its (analytic) overlaps with every Gaussian of the mixture.
+    As in get_background_overlaps_with_covariances, the vertical values
+    (Z and W) of stars are inverted.
+
+    Parameters
+    ----------
+    bg_mixture: dict -or- str
+        The output of compress_background, or the file it was stored in
+    star_means: [npoints,6] float array_like
+        Phase-space positions of stellar data that we are fitting components to
+    star_covs: [npoints,6,6] float array_like
+        Phase-space covariances of stellar data that we are fitting components to
+
+    Returns
+    -------
+    bg_lnols: [npoints] float array
+        Background log overlaps of stars with background probability density
+        function.
+    """
+    if type(bg_mixture) is str:
+        bg_mixture = load_background_mixture(bg_mixture)
+
+    # Inverting the vertical values
+    star_means = np.array(star_means, dtype=np.float64)
+    star_means[:, 2] *= -1
+    star_means[:, 5] *= -1
+    star_covs = np.ascontiguousarray(star_covs, dtype=np.float64)
+    nstars = len(star_means)
+
+    # Accumulate the sum in linear space one mixture component at a time
+    bg_lnols = np.full(nstars, -np.inf)
+    for amp, mean, cov in zip(bg_mixture['amps'], bg_mixture['means'],
+                              bg_mixture['covs']):
+        bg_lnols = np.logaddexp(bg_lnols,
+                                np.log(amp) + get_lnoverlaps(cov, mean,
+                                                             star_covs,
+                                                             star_means,
+                                                             nstars))
+    return bg_lnols
+
+
+def validate_background_mixture(bg_mixture, background_means, star_means,
+                                star_covs, nvalidate=100, seed=0):
+    """
+    Compare background overlaps from a compressed mixture against the exact
+    overlaps with every reference star, for a random subset of stars.
+
+    Parameters
+    ----------
+    bg_mixture: dict -or- str
+        See get_background_overlaps_with_mixture
+    background_means: [nstars,6] float array_like
+        The reference stars from which `bg_mixture` was compressed
+    star_means: [npoints,6] float array_like
+    star_covs: [npoints,6,6] float array_like
+    nvalidate: int {100}
+        Size of the random subset of stars on which to validate
+    seed: int {0}
+        Seed for the random subset
+
+    Returns
+    -------
+    report: dict
+        'nvalidate': the number of stars validated against
+        'max_abs_err', 'median_abs_err', 'rms_err', 'mean_err': the
+        statistics of the (mixture - exact) background log overlaps
+    """
+    nstars = len(star_means)
+    nvalidate = min(nvalidate, nstars)
+    subset = np.random.RandomState(seed).choice(nstars, nvalidate,
+                                                replace=False)
+    exact_lnols = np.array(get_background_overlaps_with_covariances(
+            background_means, star_means[subset], star_covs[subset],
+    ))
+    mixture_lnols = get_background_overlaps_with_mixture(
+            bg_mixture, star_means[subset], star_covs[subset],
+    )
+    errs = mixture_lnols - exact_lnols
+    report = {
+        'nvalidate':nvalidate,
+        'max_abs_err':np.max(np.abs(errs)),
+        'median_abs_err':np.median(np.abs(errs)),
+        'rms_err':np.sqrt(np.mean(errs**2)),
+        'mean_err':np.mean(errs),
+    }
+    logging.info('Background mixture validation (ln overlap errors): '
+                 '{}'.format(report))
+    return report
+
+
 def check_convergence(old_best_comps, new_chains, perc=40):
     """Check if the last maximisation step yielded is consistent to new fit
 
@@ -260,31 +679,70 @@ def check_convergence(old_best_comps, new_chains, perc=40):
     return np.all(each_converged)
 
 
-def calc_membership_probs(star_lnols):
-    """Calculate probabilities of membership for a single star from overlaps
+def calc_membership_probs(star_lnols, inplace=False):
+    """Calculate probabilities of membership from overlaps
+
+    Works on a single star, or on every star at once. Each row of overlaps
+    is normalised in log space (with logsumexp) before exponentiating,
+    so the calculation is stable even for very negative log overlaps.
 
     Parameters
     ----------
-    star_lnols : [ncomps] array
-        The log of the overlap of a star with each group
+    star_lnols : [ncomps] -or- [nstars, ncomps] array
+        The log of the overlap of a star (or each star) with each group
+    inplace : bool {False}
+        If True, `star_lnols` (which must then be a float array) is
+        overwritten with the membership probabilities, avoiding the
+        allocation of a second [nstars, ncomps] array
 
     Returns
     -------
-    star_memb_probs : [ncomps] array
-        The probability of membership to each group, normalised to sum to 1
+    star_memb_probs : [ncomps] -or- [nstars, ncomps] array
+        The probability of membership to each group, normalised such that
+        each row sums to 1
     """
-    ncomps = star_lnols.shape[0]
-    star_memb_probs = np.zeros(ncomps)
+    star_lnols = np.asarray(star_lnols, dtype=float)
+    with np.errstate(invalid='ignore'):
+        ln_norms = logsumexp(star_lnols, axis=-1)[..., np.newaxis]
+        if inplace:
+            star_memb_probs = star_lnols
+            np.subtract(star_lnols, ln_norms, out=star_memb_probs)
+        else:
+            star_memb_probs = star_lnols - ln_norms
+    return np.exp(star_memb_probs, out=star_memb_probs)
 
-    for i in range(ncomps):
-        star_memb_probs[i] = 1. / np.sum(np.exp(star_lnols - star_lnols[i]))
 
-    return star_memb_probs
+def fill_raw_lnoverlaps(raw_lnols, todo_mask, data, comps, nthreads=1):
+    """
+    Calculate (unweighted) log overlaps for the flagged star-component
+    pairs, storing them in `raw_lnols`
+
+    Parameters
+    ----------
+    raw_lnols: [nstars, ncomps] float array
+        Updated in place with the log overlaps of flagged pairs
+    todo_mask: [nstars, ncomps] bool array
+        Flags which star-component pairs to calculate
+    data: dict
+        See get_all_lnoverlaps
+    comps: [ncomps] Component list
+        See get_all_lnoverlaps
+    nthreads: int {1}
+        Number of threads across which the overlap calculation is split
+    """
+    for i, comp in enumerate(comps):
+        star_mask = todo_mask[:,i]
+        if np.any(star_mask):
+            raw_lnols[star_mask, i] = likelihood.get_lnoverlaps(
+                    comp, data, star_mask=star_mask, nthreads=nthreads
+            )
 
 
 def get_all_lnoverlaps(data, comps, old_memb_probs=None,
                        inc_posterior=False, amp_prior=None,
-                       use_box_background=False):
+                       use_box_background=False, nthreads=1,
+                       overlap_cull_tol=None, overlap_cache=None,
+                       lnol_cache=None):
     """
     Get the log overlap integrals of each star with each component
 
@@ -315,12 +773,37 @@ def get_all_lnoverlaps(data, comps, old_memb_probs=None,
     amp_prior: int {None}
         If set, forces the combined ampltude of Gaussian components to be
         at least equal to `amp_prior`
+    nthreads: int {1}
+        Number of threads across which the overlap calculation is split
+    overlap_cull_tol: float {None}
+        If set (and a background is in use), star-component pairs whose
+        cheap upper bound on (weighted) overlap is negligible compared to
+        the star's background overlap are not computed, and are instead
+        set to CULLED_LNOL. Pairs are only culled if doing so changes
+        every membership probability by less than `overlap_cull_tol`.
+    overlap_cache: dict {None}
+        If provided, the unweighted log overlaps of each star with each
+        component are stored here on the first call, and reused in
+        subsequent calls. Only pass the same dict to calls with the same
+        `data` and `comps` (e.g. when iterating the weights in
+        `expectation`).
+    lnol_cache: likelihood.OverlapCache {None}
+        If provided, each component's log overlaps are looked up here
+        before being calculated, and stored here once calculated. Unlike
+        `overlap_cache`, may be shared between calls with any components.
 
     Returns
     -------
     lnols: [nstars, ncomps (+1)] float array
         The log overlaps of each star with each component, optionally
         with the log background overlaps appended as the final column
+
+    Notes
+    -----
+    The culling guarantee follows from bounding the total overlap mass
+    of the culled components of each star by `overlap_cull_tol` times its
+    background overlap, which itself is no larger than the denominator of
+    every membership probability of that star.
     """
     # Tidy input, infer some values
     if not isinstance(data, dict):
@@ -358,13 +841,6 @@ def get_all_lnoverlaps(data, comps, old_memb_probs=None,
         if weights.sum() < amp_prior:
             weights *= amp_prior / weights.sum()
 
-    # For each component, get log overlap with each star, scaled by
-    # amplitude (weight) of each component's PDF
-    for i, comp in enumerate(comps):
-        lnols[:, i] = \
-            np.log(weights[i]) + \
-            likelihood.get_lnoverlaps(comp, data)
-
     # insert one time calculated background overlaps
     if using_bg:
         lnols[:,-1] = data['bg_lnols']
@@ -374,6 +850,72 @@ def get_all_lnoverlaps(data, comps, old_memb_probs=None,
         star_volume = np.product(np.ptp(data['means'], axis=0))
         lnols[:,-1] = np.log(nbg_stars/star_volume)
 
+    with np.errstate(divide='ignore'):
+        ln_weights = np.log(weights)
+    culling = overlap_cull_tol is not None and n_memb_cols > ncomps
+    if culling:
+        ln_cull_tol = np.log(overlap_cull_tol / ncomps)
+
+    # The raw (unweighted) overlaps depend only on comps and data, so
+    # are calculated once per cache, no matter how the weights change
+    if overlap_cache is None:
+        overlap_cache = {}
+    if 'raw_lnols' not in overlap_cache:
+        raw_lnols = np.zeros((nstars, ncomps))
+        # Components whose overlaps have already been calculated need
+        # neither culling nor calculating
+        todo_comps = np.ones(ncomps, dtype=bool)
+        if lnol_cache is not None:
+            for i, comp in enumerate(comps):
+                cached_lnols = lnol_cache.lookup(comp, data)
+                if cached_lnols is not None:
+                    raw_lnols[:,i] = cached_lnols
+                    todo_comps[i] = False
+
+        if culling:
+            # Only compute the pairs that could contribute more than
+            # overlap_cull_tol/ncomps of the star's background overlap
+            ln_ubs = likelihood.get_lnoverlap_upper_bounds(comps, data)
+            culled = ln_weights + ln_ubs < lnols[:,-1:] + ln_cull_tol
+            culled[:, ~todo_comps] = False
+            fill_raw_lnoverlaps(raw_lnols, ~culled & todo_comps, data, comps,
+                                nthreads=nthreads)
+            logging.info('Culled {} of {} star-component overlaps'.format(
+                    np.sum(culled), culled.size
+            ))
+            complete_comps = todo_comps & ~np.any(culled, axis=0)
+        else:
+            ln_ubs = None
+            culled = None
+            if np.any(todo_comps):
+                raw_lnols[:, todo_comps] = likelihood.get_lnoverlaps_many_comps(
+                        [comp for comp, todo in zip(comps, todo_comps) if todo],
+                        data, nthreads=nthreads
+                )
+            complete_comps = todo_comps
+
+        if lnol_cache is not None:
+            for i in np.where(complete_comps)[0]:
+                lnol_cache.store(comps[i], data, raw_lnols[:,i])
+        overlap_cache.update({'raw_lnols':raw_lnols, 'culled':culled,
+                              'ln_ubs':ln_ubs})
+    elif culling and overlap_cache['culled'] is not None:
+        # Weights and background may have changed since pairs were culled,
+        # so calculate any pair which no longer satisfies the criterion
+        culled = overlap_cache['culled']
+        uncull = culled & ~(ln_weights + overlap_cache['ln_ubs']
+                            < lnols[:,-1:] + ln_cull_tol)
+        if np.any(uncull):
+            fill_raw_lnoverlaps(overlap_cache['raw_lnols'], uncull, data,
+                                comps, nthreads=nthreads)
+            culled &= ~uncull
+
+    # Scale each component's log overlaps by the amplitude (weight) of
+    # each component's PDF
+    lnols[:, :ncomps] = ln_weights + overlap_cache['raw_lnols']
+    if overlap_cache['culled'] is not None:
+        lnols[:, :ncomps][overlap_cache['culled']] = CULLED_LNOL
+
     return lnols
 
 
@@ -419,7 +961,9 @@ def calc_bic(data, ncomps, lnlike, memb_probs=None, Component=SphereComponent):
 
 def expectation(data, comps, old_memb_probs=None,
                 inc_posterior=False, amp_prior=None,
-                use_box_background=False):
+                use_box_background=False, nthreads=1,
+                overlap_cull_tol=None, overlap_cache=None,
+                lnol_cache=None):
     """Calculate membership probabilities given fits to each group
 
     Parameters
@@ -437,6 +981,17 @@ def expectation(data, comps, old_memb_probs=None,
     amp_prior: float {None}
         If set, forces the combined ampltude of Gaussian components to be
         at least equal to `amp_prior`
+    nthreads: int {1}
+        Number of threads across which the overlap calculation is split
+    overlap_cull_tol: float {None}
+        Tolerance on membership probabilities within which negligible
+        overlaps may be skipped. See get_all_lnoverlaps
+    overlap_cache: dict {None}
+        Stores the unweighted log overlaps between `data` and `comps`.
+        See get_all_lnoverlaps
+    lnol_cache: likelihood.OverlapCache {None}
+        Stores the log overlaps of individual components, shared across
+        calls. See get_all_lnoverlaps
 
     Returns
     -------
@@ -461,6 +1016,11 @@ def expectation(data, comps, old_memb_probs=None,
     # TODO: implement interation till convergence
     memberships_converged = False
 
+    # Only the weights change between iterations, so the (expensive)
+    # overlaps of stars with each component are only calculated once
+    if overlap_cache is None:
+        overlap_cache = {}
+
     # if no memb_probs provided, assume perfectly equal membership
     iter_cnt = 0
     old_bic = np.inf
@@ -475,12 +1035,14 @@ def expectation(data, comps, old_memb_probs=None,
                                    inc_posterior=inc_posterior,
                                    amp_prior=amp_prior,
                                    use_box_background=use_box_background,
+                                   nthreads=nthreads,
+                                   overlap_cull_tol=overlap_cull_tol,
+                                   overlap_cache=overlap_cache,
+                                   lnol_cache=lnol_cache,
                                    )
 
         # Calculate membership probabilities, tidying up 'nan's as required
-        memb_probs = np.zeros((nstars, n_memb_cols))
-        for i in range(nstars):
-            memb_probs[i] = calc_membership_probs(lnols[i])
+        memb_probs = calc_membership_probs(lnols)
         if np.isnan(memb_probs).any():
             log_message('AT LEAST ONE MEMBERSHIP IS "NAN"', symbol='!')
             memb_probs[np.where(np.isnan(memb_probs))] = 0.
@@ -511,7 +1073,8 @@ def expectation(data, comps, old_memb_probs=None,
 def get_overall_lnlikelihood(data, comps, return_memb_probs=False,
                              old_memb_probs=None,
                              inc_posterior=False,
-                             use_box_background=False):
+                             use_box_background=False, nthreads=1,
+                             overlap_cull_tol=None, lnol_cache=None):
     """
     Get overall likelihood for a proposed model.
 
@@ -526,23 +1089,40 @@ def get_overall_lnlikelihood(data, comps, return_memb_probs=False,
         See fit_many_comps
     return_memb_probs: bool {False}
         Along with log likelihood, return membership probabilites
+    nthreads: int {1}
+        Number of threads across which the overlap calculation is split
+    overlap_cull_tol: float {None}
+        Tolerance on membership probabilities within which negligible
+        overlaps may be skipped. See get_all_lnoverlaps
+    lnol_cache: likelihood.OverlapCache {None}
+        Stores the log overlaps of individual components, shared across
+        calls. See get_all_lnoverlaps
 
     Returns
     -------
     overall_lnlikelihood: float
     """
     # logging.info('here00')
+    overlap_cache = {}
     memb_probs = expectation(data, comps,
                              old_memb_probs=old_memb_probs,
                              inc_posterior=inc_posterior,
-                             use_box_background=use_box_background)
+                             use_box_background=use_box_background,
+                             nthreads=nthreads,
+                             overlap_cull_tol=overlap_cull_tol,
+                             overlap_cache=overlap_cache,
+                             lnol_cache=lnol_cache)
     
     # logging.info('here0')
     
     all_ln_ols = get_all_lnoverlaps(data, comps,
                                     old_memb_probs=memb_probs,
                                     inc_posterior=inc_posterior,
-                                    use_box_background=use_box_background)
+                                    use_box_background=use_box_background,
+                                    nthreads=nthreads,
+                                    overlap_cull_tol=overlap_cull_tol,
+                                    overlap_cache=overlap_cache,
+                                    lnol_cache=lnol_cache)
 
     # multiplies each log overlap by the star's membership probability
     # (In linear space, takes the star's overlap to the power of its
@@ -566,6 +1146,7 @@ def maximise_one_comp(data, memb_probs, i, idir, all_init_pars=None, all_init_po
                 nthreads=1, 
                 optimisation_method=None,
                 nprocess_ncomp=False,
+                vectorise_lnprob=False,
                 ):
 
     """
@@ -627,6 +1208,9 @@ def maximise_one_comp(data, memb_probs, i, idir, all_init_pars=None, all_init_po
         many times with different initial positions. The result is the 
         one with the best likelihood. These optimisations are computed
         in parallel if nprocess_ncomp equals True.
+    vectorise_lnprob: bool {False}
+        Score all emcee walkers with one batched lnprob call per step.
+        See compfitter.fit_comp
         
     Returns
     -------
@@ -667,6 +1251,7 @@ def maximise_one_comp(data, memb_probs, i, idir, all_init_pars=None, all_init_po
             nthreads=nthreads, 
             optimisation_method=optimisation_method,
             nprocess_ncomp=nprocess_ncomp,
+            vectorise_lnprob=vectorise_lnprob,
     )
     logging.info("Finished fit")
     logging.info("Best comp pars:\n{}".format(
@@ -692,6 +1277,195 @@ def maximise_one_comp(data, memb_probs, i, idir, all_init_pars=None, all_init_po
     return best_comp, chain, lnprob, final_pos
     
 
+def allocate_shared_results(ncomps, burnin_steps, all_init_pos,
+                            Component=SphereComponent,
+                            optimisation_method='emcee'):
+    """
+    Preallocate shared memory into which each component's maximisation
+    is written by `maximise_one_comp_shared`
+
+    Parameters
+    ----------
+    ncomps: int
+        Number of components being fitted
+    burnin_steps: int
+        The number of steps for each burnin loop, and hence the length
+        of each returned chain
+    all_init_pos: [ncomps, nwalkers, npars] float array_like
+        The initial positions of emcee walkers, (elements may be None)
+    Component: Implementation of AbstractComponent {Sphere Component}
+        The class used to convert raw parametrisation of a model to
+        actual model attributes.
+    optimisation_method: str {'emcee'}
+        See maximisation
+
+    Returns
+    -------
+    shared_results: sharedmem.SharedArrays
+        With arrays 'best_pars' [ncomps, npars], 'chains', 'lnprobs'
+        and 'done' [ncomps] flagging which components were fitted
+    """
+    npars = len(Component.PARAMETER_FORMAT)
+    nwalkers = 2*npars
+    for init_pos in all_init_pos:
+        if init_pos is not None:
+            nwalkers = len(init_pos)
+
+    shared_results = sharedmem.SharedArrays()
+    shared_results.allocate('best_pars', (ncomps, npars))
+    if optimisation_method == 'emcee':
+        shared_results.allocate('chains',
+                                (ncomps, nwalkers, burnin_steps, npars))
+        shared_results.allocate('lnprobs', (ncomps, nwalkers, burnin_steps))
+    else:
+        shared_results.allocate('chains', (ncomps, npars))
+        shared_results.allocate('lnprobs', (ncomps,))
+    shared_results.allocate('done', (ncomps,), dtype=bool)
+    return shared_results
+
+
+def maximise_one_comp_shared(i, data_specs, other_data, results_specs,
+                             kwargs):
+    """
+    Run `maximise_one_comp` in a worker process, reading star data from,
+    and writing results to, shared memory.
+
+    Parameters
+    ----------
+    i: int
+        Perform optimisation for the i-th component of the model.
+    data_specs: dict
+        `specs` of the shared star data, which also holds 'memb_probs'
+    other_data: dict
+        Any entries of the data dictionary that aren't arrays
+    results_specs: dict
+        `specs` of the arrays from `allocate_shared_results`
+    kwargs: dict
+        Remaining keyword arguments for `maximise_one_comp`
+    """
+    shared_data = sharedmem.SharedArrays.attach(data_specs)
+    shared_results = sharedmem.SharedArrays.attach(results_specs)
+    try:
+        data = dict(other_data)
+        data.update(shared_data.arrays)
+        memb_probs = data.pop('memb_probs')
+
+        best_comp, chain, lnprob, _ = maximise_one_comp(
+                data, memb_probs, i, **kwargs
+        )
+        shared_results['best_pars'][i] = best_comp.get_emcee_pars()
+        shared_results['chains'][i] = chain
+        shared_results['lnprobs'][i] = lnprob
+        shared_results['done'][i] = True
+    finally:
+        # Views onto shared memory must go before it can be closed
+        data = memb_probs = None
+        shared_data.close()
+        shared_results.close()
+
+
+# Set in each ComponentPool worker on start up
+_pool_trace_orbit_func = None
+
+
+def _init_component_pool_worker(trace_orbit_func):
+    global _pool_trace_orbit_func
+    _pool_trace_orbit_func = trace_orbit_func
+
+
+def _maximise_one_comp_pooled(i, data_specs, other_data, results_specs,
+                              kwargs):
+    """Run `maximise_one_comp_shared` in a ComponentPool worker"""
+    if 'trace_orbit_func' not in kwargs:
+        kwargs = dict(kwargs, trace_orbit_func=_pool_trace_orbit_func)
+    maximise_one_comp_shared(i, data_specs, other_data, results_specs,
+                             kwargs)
+
+
+class ComponentPool(object):
+    """
+    A pool of worker processes that maximise components, kept alive
+    across EM iterations (and across EM fits), such that processes are
+    only started (and modules imported) once.
+
+    Each M-step queues one task per component. Tasks are scheduled
+    dynamically: a worker picks up the next queued component as soon as
+    it is done with its last, and the components with the most expected
+    members (the slowest to fit) are queued first.
+
+    Workers are started on first use, and persist until `shutdown`.
+    Data are read from, and results written to, shared memory (see
+    `maximisation`), so only small arguments are sent with each task.
+
+    Parameters
+    ----------
+    nworkers: int
+        Number of worker processes
+    trace_orbit_func: function {None}
+        The trace orbit function of the fit. This is handed to workers
+        once, on start up, rather than with every task (so e.g. the tables
+        of an orbit emulator aren't repeatedly pickled).
+    """
+    def __init__(self, nworkers, trace_orbit_func=None):
+        self.nworkers = nworkers
+        self.trace_orbit_func = trace_orbit_func
+        self._executor = None
+
+    def run(self, comp_ixs, memb_probs, data_specs, other_data,
+            results_specs, kwargs):
+        """
+        Maximise each of `comp_ixs` with `maximise_one_comp_shared`,
+        returning once all have finished.
+
+        A component whose task fails is logged and left without its
+        'done' flag set. See maximisation for a description of the
+        remaining arguments.
+        """
+        # Pool objects can't be passed between processes
+        kwargs = dict(kwargs, pool=None)
+        if kwargs.get('trace_orbit_func') is self.trace_orbit_func:
+            del kwargs['trace_orbit_func']
+
+        if self._executor is None:
+            logging.info('Starting {} component workers'.format(self.nworkers))
+            self._executor = ProcessPoolExecutor(
+                    max_workers=self.nworkers,
+                    initializer=_init_component_pool_worker,
+                    initargs=(self.trace_orbit_func,),
+            )
+
+        comp_ixs = sorted(comp_ixs, key=lambda i: -np.sum(memb_probs[:, i]))
+        futures = {}
+        for i in comp_ixs:
+            future = self._executor.submit(
+                    _maximise_one_comp_pooled, i, data_specs, other_data,
+                    results_specs, kwargs,
+            )
+            futures[future] = i
+
+        broken = False
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except BrokenProcessPool:
+                logging.info('Component pool broke while maximising '
+                             'component {}'.format(futures[future]))
+                broken = True
+            except Exception as e:
+                logging.info('Maximising component {} failed: {}'.format(
+                        futures[future], e))
+
+        # Start afresh on next use
+        if broken:
+            self.shutdown()
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
 def maximisation(data, ncomps, memb_probs, burnin_steps, idir,
                  all_init_pars, all_init_pos=None, plot_it=False, pool=None,
                  convergence_tol=0.25, ignore_dead_comps=False,
@@ -701,7 +1475,8 @@ def maximisation(data, ncomps, memb_probs, burnin_steps, idir,
                  unstable_comps=None,
                  ignore_stable_comps=False,
                  nthreads=1, optimisation_method=None,
-                 nprocess_ncomp=False,
+                 nprocess_ncomp=False, vectorise_lnprob=False,
+                 comp_pool=None,
                  ):
     """
     Performs the 'maximisation' step of the EM algorithm
@@ -754,8 +1529,16 @@ def maximisation(data, ncomps, memb_probs, burnin_steps, idir,
         the Nelder-Mead method. Note that in case of the gradient descent,
         no chain is returned and meds and spans cannot be determined.
     nprocess_ncomp: bool {False}
-        How many processes to use in the maximisation of ncomps with
-        python's multiprocessing library in case Nelder-Mead is used.
+        Maximise each component in its own process. Star data and
+        memberships are published once into shared memory, to which the
+        processes attach without copying, and results are returned
+        through preallocated shared arrays. See sharedmem
+    vectorise_lnprob: bool {False}
+        Score all emcee walkers with one batched lnprob call per step.
+        See compfitter.fit_comp
+    comp_pool: ComponentPool {None}
+        Long-lived worker processes to maximise components with, in place
+        of starting one process per component. Implies `nprocess_ncomp`
         
     Returns
     -------
@@ -796,70 +1579,108 @@ def maximisation(data, ncomps, memb_probs, burnin_steps, idir,
 
 
     ### MULTIPROCESSING
-    if nprocess_ncomp and ncomps>1:
-        logging.info("Maximising components with multiprocessing")
-        manager = multiprocessing.Manager()
-        return_dict = manager.dict()
+    multiprocess = (nprocess_ncomp or comp_pool is not None) and ncomps>1
+    if multiprocess and not sharedmem.shared_memory_avail:
+        logging.info("Shared memory requires python 3.8+, so maximising "
+                     "components in serial")
 
-        def worker(i, return_dict):
+    if multiprocess and sharedmem.shared_memory_avail:
+        logging.info("Maximising components with multiprocessing")
+        if not isinstance(data, dict):
+            data = tabletool.build_data_dict_from_table(data)
+
+        # Publish star data and memberships once. Workers attach to these
+        # without copying, and write their results into preallocated
+        # shared arrays.
+        shared_data = sharedmem.SharedArrays()
+        other_data = {}
+        for key, value in data.items():
+            if isinstance(value, np.ndarray):
+                shared_data.publish(key, value)
+            else:
+                other_data[key] = value
+        shared_data.publish('memb_probs', memb_probs)
+        shared_results = allocate_shared_results(
+                ncomps, burnin_steps, all_init_pos, Component,
+                optimisation_method,
+        )
 
-            best_comp, chain, lnprob, final_pos = maximise_one_comp(data,
-                memb_probs, i, all_init_pars=all_init_pars, 
-                all_init_pos=all_init_pos, idir=idir, 
-                ignore_stable_comps=ignore_stable_comps, 
+        kwargs = dict(
+                all_init_pars=all_init_pars,
+                all_init_pos=all_init_pos, idir=idir,
+                ignore_stable_comps=ignore_stable_comps,
                 ignore_dead_comps=ignore_dead_comps,
                 DEATH_THRESHOLD=DEATH_THRESHOLD, unstable_comps=unstable_comps,
                 burnin_steps=burnin_steps, plot_it=plot_it,
-                pool=pool, convergence_tol=0.25,
+                # A Pool's threads don't survive into worker processes,
+                # so emcee's pool.map would hang there
+                pool=None, convergence_tol=0.25,
                 Component=Component,
                 trace_orbit_func=trace_orbit_func,
                 store_burnin_chains=store_burnin_chains,
-                nthreads=nthreads, 
+                nthreads=nthreads,
                 optimisation_method=optimisation_method,
-                )
-
-            return_dict[i] = {'best_comp': best_comp, 'chain': chain, 'lnprob': lnprob, 'final_pos': final_pos}
+                vectorise_lnprob=vectorise_lnprob,
+        )
 
-        jobs = []
-        for i in range(ncomps):
-            # If component has too few stars, skip fit, and use previous best walker
-            if ignore_dead_comps and (np.sum(memb_probs[:, i]) < DEATH_THRESHOLD):
-                logging.info("Skipped component {} with nstars {}".format(
-                        i, np.sum(memb_probs[:, i])
-                ))
-            elif ignore_stable_comps and not unstable_comps[i]:
-                logging.info("Skipped stable component {}".format(i))
+        try:
+            comp_ixs = []
+            for i in range(ncomps):
+                # If component has too few stars, skip fit, and use previous best walker
+                if ignore_dead_comps and (np.sum(memb_probs[:, i]) < DEATH_THRESHOLD):
+                    logging.info("Skipped component {} with nstars {}".format(
+                            i, np.sum(memb_probs[:, i])
+                    ))
+                elif ignore_stable_comps and not unstable_comps[i]:
+                    logging.info("Skipped stable component {}".format(i))
+                else:
+                    comp_ixs.append(i)
+
+            if comp_pool is not None:
+                comp_pool.run(comp_ixs, memb_probs, shared_data.specs,
+                              other_data, shared_results.specs, kwargs)
             else:
-                process = multiprocessing.Process(target=worker, args=(i, return_dict))
-                jobs.append(process)
+                jobs = []
+                for i in comp_ixs:
+                    process = multiprocessing.Process(
+                            target=maximise_one_comp_shared,
+                            args=(i, shared_data.specs, other_data,
+                                  shared_results.specs, kwargs),
+                    )
+                    jobs.append(process)
 
-        # Start the threads (i.e. calculate the random number lists)
-        for j in jobs:
-            j.start()
+                # Start the processes
+                for j in jobs:
+                    j.start()
 
-        # Ensure all of the threads have finished
-        for j in jobs:
-            j.join()
+                # Ensure all of the processes have finished
+                for j in jobs:
+                    j.join()
 
-        keys = return_dict.keys()
-        keys = sorted(keys)
-        
-        for i in keys:
-            v = return_dict[i]
-            best_comp = v['best_comp']
-            chain = v['chain']
-            lnprob = v['lnprob']
-            final_pos = v['final_pos']
+            # Components whose worker failed are left out, as though skipped
+            for i in np.where(shared_results['done'])[0]:
+                best_comp = Component(
+                        emcee_pars=shared_results['best_pars'][i].copy()
+                )
+                chain = shared_results['chains'][i].copy()
+                lnprob = shared_results['lnprobs'][i].copy()
+                if optimisation_method == 'emcee':
+                    final_pos = chain[:, -1, :]
+                else:
+                    final_pos = chain
 
-            new_comps.append(best_comp)
-            all_samples.append(chain)
-            all_lnprob.append(lnprob)
+                new_comps.append(best_comp)
+                all_samples.append(chain)
+                all_lnprob.append(lnprob)
 
-        # Keep track of the components that weren't ignored
-            success_mask.append(i)
+                # Keep track of the components that weren't ignored
+                success_mask.append(i)
 
-        # record the final position of the walkers for each comp
-            all_final_pos[i] = final_pos
+                # record the final position of the walkers for each comp
+                all_final_pos[i] = final_pos
+        finally:
+            shared_data.close()
+            shared_results.close()
 
     else:
         logging.info("Maximising components in a for loop")
@@ -886,6 +1707,7 @@ def maximisation(data, ncomps, memb_probs, burnin_steps, idir,
                     store_burnin_chains=store_burnin_chains,
                     nthreads=nthreads, 
                     optimisation_method=optimisation_method,
+                    vectorise_lnprob=vectorise_lnprob,
                     )
 
                 new_comps.append(best_comp)
@@ -907,7 +1729,8 @@ def maximisation(data, ncomps, memb_probs, burnin_steps, idir,
            all_final_pos, success_mask
 
 
-def check_stability(data, best_comps, memb_probs, use_box_background=False):
+def check_stability(data, best_comps, memb_probs, use_box_background=False,
+                    lnol_cache=None):
     """
     Checks if run has encountered problems
 
@@ -923,6 +1746,9 @@ def check_stability(data, best_comps, memb_probs, use_box_background=False):
         recent run
     memb_probs: [nstars, ncomps] float array
         The membership array from the most recent run
+    lnol_cache: likelihood.OverlapCache {None}
+        Stores the log overlaps of individual components, shared across
+        calls. See get_all_lnoverlaps
 
     Returns
     -------
@@ -939,7 +1765,8 @@ def check_stability(data, best_comps, memb_probs, use_box_background=False):
         logging.info("ERROR: A component has less than 2 members")
         return False
     if not np.isfinite(get_overall_lnlikelihood(data, best_comps,
-                                                use_box_background=use_box_background)):
+                                                use_box_background=use_box_background,
+                                                lnol_cache=lnol_cache)):
         logging.info("ERROR: Posterior is not finite")
         return False
     if not np.isfinite(memb_probs).all():
@@ -990,6 +1817,47 @@ def check_comps_stability(z, unstable_flags_old, ref_counts, using_bg, thresh=0.
     return unstable_flags, ref_counts
 
 
+def store_em_checkpoint(idir, all_init_pos, all_med_and_spans, bic):
+    """
+    Store what, beyond the memberships and best components, is needed to
+    resume an EM fit from iteration `idir` as if it were never stopped:
+    the final walker positions and med_and_spans of each component, and
+    the BIC of the iteration. Walker positions and med_and_spans are only
+    stored if every component has them (i.e. when fitting with emcee).
+    """
+    if all(pos is not None for pos in all_init_pos):
+        np.save(idir + 'init_pos.npy', np.array(all_init_pos))
+    if all(ms is not None for ms in all_med_and_spans):
+        np.save(idir + 'med_and_spans.npy', np.array(all_med_and_spans))
+    np.save(idir + 'bic.npy', bic)
+
+
+def load_em_checkpoint(idir, ncomps):
+    """
+    Load what `store_em_checkpoint` stored for iteration `idir`.
+
+    Returns
+    -------
+    checkpoint: tuple or None
+        (all_init_pos, all_med_and_spans, bic), where components without
+        walker positions or med_and_spans have None. None if no
+        checkpoint was stored (e.g. by older versions of Chronostar).
+    """
+    try:
+        bic = float(np.load(idir + 'bic.npy'))
+    except IOError:
+        return None
+    try:
+        all_init_pos = list(np.load(idir + 'init_pos.npy'))
+    except IOError:
+        all_init_pos = ncomps * [None]
+    try:
+        all_med_and_spans = list(np.load(idir + 'med_and_spans.npy'))
+    except IOError:
+        all_med_and_spans = ncomps * [None]
+    return all_init_pos, all_med_and_spans, bic
+
+
 def fit_many_comps(data, ncomps, rdir='', pool=None, init_memb_probs=None,
                    init_comps=None, inc_posterior=False, burnin=1000,
                    sampling_steps=5000, ignore_dead_comps=False,
@@ -1000,7 +1868,8 @@ def fit_many_comps(data, ncomps, rdir='', pool=None, init_memb_probs=None,
                    ignore_stable_comps=False, max_em_iterations=100,
                    record_len=30, bic_conv_tol=0.1, min_em_iterations=30,
                    nthreads=1, optimisation_method=None, 
-                   nprocess_ncomp = False,
+                   nprocess_ncomp = False, overlap_cull_tol=None,
+                   lnol_cache=None, vectorise_lnprob=False, comp_pool=None,
                    **kwargs):
     """
 
@@ -1079,6 +1948,23 @@ def fit_many_comps(data, ncomps, rdir='', pool=None, init_memb_probs=None,
     nprocess_ncomp: bool {False}
         How many processes to use in the maximisation of ncomps with
         python's multiprocessing library in case Nelder-Mead is used.
+    vectorise_lnprob: bool {False}
+        Score all emcee walkers with one batched lnprob call per step.
+        See compfitter.fit_comp
+    comp_pool: ComponentPool {None}
+        Long-lived worker processes, reused by every M-step, to maximise
+        components with. See maximisation
+    nthreads: int {1}
+        Number of processes used by emcee (if no `pool` is provided) and
+        number of threads across which E-step overlaps are split
+    overlap_cull_tol: float {None}
+        Tolerance on membership probabilities within which negligible
+        overlaps may be skipped in the E-step. See get_all_lnoverlaps
+    lnol_cache: likelihood.OverlapCache {None}
+        Stores the log overlaps of individual components, such that they
+        are calculated once and shared between the E-step, likelihood
+        scoring and stability checks. If None, a cache is created for the
+        duration of this fit.
         
 
     Return
@@ -1111,6 +1997,9 @@ def fit_many_comps(data, ncomps, rdir='', pool=None, init_memb_probs=None,
 
     use_bg_column = use_background or use_box_background
 
+    if lnol_cache is None:
+        lnol_cache = likelihood.OverlapCache()
+
     # filenames
     init_comp_filename = 'init_comps.npy'
 
@@ -1233,27 +2122,42 @@ def fit_many_comps(data, ncomps, rdir='', pool=None, init_memb_probs=None,
 
             all_init_pars = [old_comp.get_emcee_pars()
                              for old_comp in old_comps]
-            # logging.info('old_overall_lnlike')
-            old_overall_lnlike, old_memb_probs = \
-                    get_overall_lnlikelihood(data, old_comps,
-                                             inc_posterior=False,
-                                             return_memb_probs=True,
-                                             use_box_background=use_box_background)
+            checkpoint = load_em_checkpoint(idir, ncomps)
+            if checkpoint is not None:
+                # Pick up exactly where the iteration left off
+                all_init_pos, checkpoint_med_and_spans, bic = checkpoint
+                if any(ms is not None for ms in checkpoint_med_and_spans):
+                    all_med_and_spans = checkpoint_med_and_spans
+                old_memb_probs = memb_probs_old
+            else:
+                # logging.info('old_overall_lnlike')
+                old_overall_lnlike, old_memb_probs = \
+                        get_overall_lnlikelihood(data, old_comps,
+                                                 inc_posterior=False,
+                                                 return_memb_probs=True,
+                                                 use_box_background=use_box_background,
+                                                 nthreads=nthreads,
+                                                 overlap_cull_tol=overlap_cull_tol,
+                                                 lnol_cache=lnol_cache)
+                bic = calc_bic(data, len(old_comps),
+                               lnlike=old_overall_lnlike,
+                               memb_probs=old_memb_probs)
             ref_counts = np.sum(old_memb_probs, axis=0)
 
             # logging.info('append')
             list_prev_comps.append(old_comps)
             list_prev_memberships.append(old_memb_probs)
-            list_all_init_pos.append(all_init_pos)
-            list_all_med_and_spans.append(all_med_and_spans)
-            list_prev_bics.append(calc_bic(data, len(old_comps),
-                                           lnlike=old_overall_lnlike,
-                                           memb_probs=old_memb_probs))
+            list_all_init_pos.append(list(all_init_pos))
+            list_all_med_and_spans.append(list(all_med_and_spans))
+            list_prev_bics.append(bic)
 
             all_bics.append(list_prev_bics[-1])
 
             iter_count += 1
-            found_prev_iters = True
+            # Without a checkpoint, the next M-step reuses the memberships
+            # of this iteration. With one, the next E-step is done as usual
+            found_prev_iters = checkpoint is None
+            skip_first_e_step = False
 
         except IOError:
             logging.info("Managed to find {} previous iterations".format(
@@ -1301,7 +2205,10 @@ def fit_many_comps(data, ncomps, rdir='', pool=None, init_memb_probs=None,
         else:
             memb_probs_new = expectation(data, old_comps, memb_probs_old,
                                          inc_posterior=inc_posterior,
-                                         use_box_background=use_box_background)
+                                         use_box_background=use_box_background,
+                                         nthreads=nthreads,
+                                         overlap_cull_tol=overlap_cull_tol,
+                                         lnol_cache=lnol_cache)
         logging.info("Membership distribution:\n{}".format(
             memb_probs_new.sum(axis=0)
         ))
@@ -1323,6 +2230,8 @@ def fit_many_comps(data, ncomps, rdir='', pool=None, init_memb_probs=None,
                          nthreads=nthreads, 
                          optimisation_method=optimisation_method,
                          nprocess_ncomp=nprocess_ncomp,
+                         vectorise_lnprob=vectorise_lnprob,
+                         comp_pool=comp_pool,
                          )
 
         for i in range(ncomps):
@@ -1353,11 +2262,17 @@ def fit_many_comps(data, ncomps, rdir='', pool=None, init_memb_probs=None,
         overall_lnlike = get_overall_lnlikelihood(data, new_comps,
                                                   old_memb_probs=memb_probs_new,
                                                   inc_posterior=False,
-                                                  use_box_background=use_box_background)
+                                                  use_box_background=use_box_background,
+                                                  nthreads=nthreads,
+                                                  overlap_cull_tol=overlap_cull_tol,
+                                                  lnol_cache=lnol_cache)
         overall_lnposterior = get_overall_lnlikelihood(data, new_comps,
                                                        old_memb_probs=memb_probs_new,
                                                        inc_posterior=True,
-                                                       use_box_background=use_box_background)
+                                                       use_box_background=use_box_background,
+                                                       nthreads=nthreads,
+                                                       overlap_cull_tol=overlap_cull_tol,
+                                                       lnol_cache=lnol_cache)
         bic = calc_bic(data, ncomps, overall_lnlike,
                        memb_probs=memb_probs_new,
                        Component=Component)
@@ -1374,11 +2289,12 @@ def fit_many_comps(data, ncomps, rdir='', pool=None, init_memb_probs=None,
 
         list_prev_comps.append(new_comps)
         list_prev_memberships.append(memb_probs_new)
-        list_all_init_pos.append(all_init_pos)
-        list_all_med_and_spans.append(all_med_and_spans)
+        list_all_init_pos.append(list(all_init_pos))
+        list_all_med_and_spans.append(list(all_med_and_spans))
         list_prev_bics.append(bic)
 
         all_bics.append(bic)
+        store_em_checkpoint(idir, all_init_pos, all_med_and_spans, bic)
 
         if len(list_prev_bics) < min_em_iterations:
             all_converged = False
@@ -1410,7 +2326,10 @@ def fit_many_comps(data, ncomps, rdir='', pool=None, init_memb_probs=None,
         if (iter_count % 5 == 0 and ignore_stable_comps):
             memb_probs_new = expectation(data, new_comps, memb_probs_new,
                                          inc_posterior=inc_posterior,
-                                         use_box_background=use_box_background)
+                                         use_box_background=use_box_background,
+                                         nthreads=nthreads,
+                                         overlap_cull_tol=overlap_cull_tol,
+                                         lnol_cache=lnol_cache)
             log_message('Orig ref_counts {}'.format(ref_counts))
 
             unstable_comps, ref_counts = check_comps_stability(memb_probs_new,
@@ -1425,7 +2344,8 @@ def fit_many_comps(data, ncomps, rdir='', pool=None, init_memb_probs=None,
         # Check stablity, but only affect run after sufficient iterations to
         # settle
         temp_stable_state = check_stability(data, new_comps, memb_probs_new,
-                                            use_box_background=use_box_background)
+                                            use_box_background=use_box_background,
+                                            lnol_cache=lnol_cache)
         logging.info('Stability: {}'.format(temp_stable_state))
         if iter_count > 10:
             stable_state = temp_stable_state
@@ -1496,11 +2416,15 @@ def fit_many_comps(data, ncomps, rdir='', pool=None, init_memb_probs=None,
 
     overall_lnlike = get_overall_lnlikelihood(
             data, final_best_comps, inc_posterior=False,
-            use_box_background=use_box_background,
+            use_box_background=use_box_background, nthreads=nthreads,
+            overlap_cull_tol=overlap_cull_tol,
+            lnol_cache=lnol_cache,
     )
     overall_lnposterior = get_overall_lnlikelihood(
             data, final_best_comps, inc_posterior=True,
-            use_box_background=use_box_background,
+            use_box_background=use_box_background, nthreads=nthreads,
+            overlap_cull_tol=overlap_cull_tol,
+            lnol_cache=lnol_cache,
     )
     bic = calc_bic(data, ncomps, overall_lnlike,
                    memb_probs=final_memb_probs, Component=Component)
@@ -1513,6 +2437,7 @@ def fit_many_comps(data, ncomps, rdir='', pool=None, init_memb_probs=None,
                                                       bic))
 
     logging.info("FINISHED SAVING")
+    logging.info("Overlap cache usage: {}".format(lnol_cache.get_stats()))
     logging.info("Best fits:\n{}".format(
         [fc.get_pars() for fc in final_best_comps]
     ))
@@ -28,7 +28,11 @@ given the model of M, we take the product of the model evaluated at each
 data point:
 P(D|M) = P(x_1|M) * P(x_2|M) * .. * P(x_N|M) = \prod_i^N P(x_i|M)
 """
+from collections import OrderedDict
+import hashlib
 import numpy as np
+from scipy.stats.mstats import gmean
+import weakref
 
 from chronostar.component import SphereComponent
 #~ from chronostar import component
@@ -40,6 +44,17 @@ try:
 except ImportError:
     print("C IMPLEMENTATION OF GET_OVERLAP NOT IMPORTED")
     USE_C_IMPLEMENTATION = False
+# Builds of _overlap predating the multi-component and threaded kernels
+# lack these entry points
+USE_C_MULTI_IMPLEMENTATION = USE_C_IMPLEMENTATION
+try:
+    from ._overlap import get_lnoverlaps_multi as c_get_lnoverlaps_multi
+    from ._overlap import get_lnoverlaps_threaded as c_get_lnoverlaps_threaded
+except ImportError:
+    USE_C_MULTI_IMPLEMENTATION = False
+
+# Maximum allowed component age [Myr]
+MAX_AGE = 500
 
 def slow_get_lnoverlaps(g_cov, g_mn, st_covs, st_mns, dummy=None):
     """
@@ -79,6 +94,139 @@ def slow_get_lnoverlaps(g_cov, g_mn, st_covs, st_mns, dummy=None):
     return np.array(lnols)
 
 
+def batch_get_lnoverlaps(g_cov, g_mn, st_covs, st_mns, dummy=None):
+    """
+    A vectorised numpy implementation of overlap integral calculation.
+    Used in place of the swigged _overlap module when it is unavailable.
+
+    Rather than looping over stars, the summed covariance matrices of all
+    stars are Cholesky factorised as a single [nstars,6,6] stack. The
+    log determinant is read off the diagonal of each factor, and the
+    Mahalanobis term is found by forward substitution, which is performed
+    over all stars at once, one row at a time.
+
+    Parameters
+    ---------
+    g_cov: ([6,6] float array)
+        Covariance matrix of the group
+    g_mn: ([6] float array)
+        mean of the group
+    st_covs: ([nstars, 6, 6] float array)
+        covariance matrices of the stars
+    st_mns: ([nstars, 6], float array)
+        means of the stars
+    dummy: {None}
+        a place holder parameter such that this function's signature
+        matches that of the c implementation, which requires an
+        explicit size of `nstars`.
+
+    Returns
+    -------
+    ln_ols: ([nstars] float array)
+        an array of the logarithm of the overlaps
+    """
+    st_covs = np.asarray(st_covs, dtype=np.float64)
+    st_mns = np.asarray(st_mns, dtype=np.float64)
+    dim = st_mns.shape[-1]
+    if len(st_mns) == 0:
+        return np.zeros(0)
+
+    try:
+        chol = np.linalg.cholesky(st_covs + g_cov)
+    except np.linalg.LinAlgError:
+        # At least one summed covariance matrix is not positive definite,
+        # so defer to the LU based approach, as the C implementation does
+        return slow_get_lnoverlaps(g_cov, g_mn, st_covs, st_mns)
+
+    ln_dets = 2 * np.sum(np.log(np.diagonal(chol, axis1=1, axis2=2)),
+                         axis=1)
+
+    # Solve chol . y = (st_mn - g_mn), such that y.y is the Mahalanobis term
+    diff = st_mns - g_mn
+    y = np.zeros(diff.shape)
+    for i in range(dim):
+        y[:,i] = (diff[:,i] - np.einsum('ij,ij->i', chol[:,i,:i], y[:,:i]))\
+                 / chol[:,i,i]
+    mahals = np.einsum('ij,ij->i', y, y)
+
+    return -0.5 * (dim * np.log(2*np.pi) + ln_dets + mahals)
+
+
+class ActiveStarSet(object):
+    """
+    The subset of stars that contribute to the likelihood of a single
+    component, prepared once per maximisation.
+
+    Membership probabilities are fixed for the duration of a component
+    fit, so the stars with non-negligible membership, and their weights,
+    can be extracted once into contiguous arrays. Passing this object in
+    place of the data dict to lnprob_func avoids masking and copying the
+    star data on every walker step.
+
+    Supports item access of 'means' and 'covs' so it can be used wherever
+    a data dict is expected by get_lnoverlaps.
+
+    Attributes
+    ----------
+    means: [nactive,6] float array
+        the central estimates of each active star in XYZUVW space
+    covs: [nactive,6,6] float array
+        the covariance of each active star in XYZUVW space
+    weights: [nactive] float array
+        the (possibly boosted) membership probability of each active star
+    memb_probs: [nstars] float array
+        the original membership probabilities of all stars, as required
+        by lnprior
+    star_mask: [nstars] bool array
+        which of the original stars are active
+    """
+    def __init__(self, data, memb_probs=None, memb_threshold=1e-5,
+                 minimum_exp_starcount=10.):
+        """
+        Parameters
+        ----------
+        data: dict
+            'means': [nstars,6] float array
+                the central estimates of each star in XYZUVW space
+            'covs': [nstars,6,6] float array
+                the covariance of each star in XYZUVW space
+        memb_probs: [nstars] float array {None}
+            array of weights [0.0 - 1.0] for each star, describing how likely
+            they are members of group to be fitted. If None, all stars
+            are taken to be members.
+        memb_threshold: float {1e-5}
+            stars with (boosted) membership below this are excluded
+        minimum_exp_starcount: float {10.}
+            weights are boosted such that they sum to at least this value,
+            see lnlike
+        """
+        if memb_probs is None:
+            memb_probs = np.ones(len(data['means']))
+        self.memb_probs = memb_probs
+
+        # Boost expect star count to some minimum threshold, as in lnlike
+        weights = np.copy(memb_probs)
+        exp_starcount = np.sum(weights)
+        if exp_starcount < minimum_exp_starcount:
+            weights *= minimum_exp_starcount / exp_starcount
+
+        self.star_mask = weights > memb_threshold
+        self.means = np.ascontiguousarray(data['means'][self.star_mask],
+                                          dtype=np.float64)
+        self.covs = np.ascontiguousarray(data['covs'][self.star_mask],
+                                         dtype=np.float64)
+        self.weights = np.ascontiguousarray(weights[self.star_mask],
+                                            dtype=np.float64)
+
+    def __getitem__(self, key):
+        if key not in ('means', 'covs', 'weights'):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __len__(self):
+        return len(self.weights)
+
+
 def calc_alpha(dx, dv, nstars):
     """
     Assuming we have identified 100% of star mass, and that average
@@ -144,8 +292,6 @@ def lnprior(comp, memb_probs):
     lnprior
         The logarithm of the prior on the model parameters
     """
-    # set maximum allowed age
-    MAX_AGE = 500
     covmatrix = comp.get_covmatrix()
     stds = np.linalg.eigvalsh(covmatrix)
     if np.min(comp.get_mean()) < -100000 or np.max(comp.get_mean()) > 100000:
@@ -166,7 +312,48 @@ def lnprior(comp, memb_probs):
 
     return ln_alpha_prior(comp, memb_probs, sig=1.0)
 
-def get_lnoverlaps(comp, data, star_mask=None):
+
+def lnprior_batch(means, covmatrices, ages, memb_probs):
+    """
+    Computes the prior of many components at once, as given by their
+    attributes. Equivalent to lnprior applied to each component.
+
+    Parameters
+    ----------
+    means: [ncomps, 6] float array
+    covmatrices: [ncomps, 6, 6] float array
+    ages: [ncomps] float array
+    memb_probs: [nstars] float array
+        array of weights [0.0 - 1.0] for each star, describing probabilty
+        of each star being a member of component beign fitted.
+
+    Returns
+    -------
+    lnpriors: [ncomps] float array
+        The logarithm of the prior on each component's parameters
+    """
+    stds = np.linalg.eigvalsh(covmatrices)
+    valid = (np.min(means, axis=1) >= -100000) \
+            & (np.max(means, axis=1) <= 100000) \
+            & (np.min(stds, axis=1) > 0.0) & (np.max(stds, axis=1) <= 1e+6) \
+            & (ages >= 0.0) & (ages <= MAX_AGE) \
+            & np.all(np.isclose(covmatrices, covmatrices.transpose(0,2,1)),
+                     axis=(1,2))
+    # For symmetric matrices, the positive eigenvalue check of lnprior is
+    # covered by the check on `stds`
+
+    lnpriors = np.full(len(means), -np.inf)
+    if np.any(valid):
+        dx = gmean(np.sqrt(np.linalg.eigvalsh(covmatrices[valid,:3,:3])),
+                   axis=1)
+        dv = gmean(np.sqrt(np.linalg.eigvalsh(covmatrices[valid,3:,3:])),
+                   axis=1)
+        alpha = calc_alpha(dx, dv, np.sum(memb_probs))
+        lnpriors[valid] = lnlognormal(alpha, mu=2.1, sig=1.0)
+    return lnpriors
+
+
+def get_lnoverlaps(comp, data, star_mask=None, nthreads=1):
     """
     Given the parametric description of an origin, calculate star overlaps
 
@@ -188,6 +375,9 @@ def get_lnoverlaps(comp, data, star_mask=None):
     star_mask: [len(data)] indices
         A mask that excludes stars that have negliglbe membership probablities
         (and thus have their log overlaps scaled to tiny numbers).
+    nthreads: int {1}
+        Number of threads the C module splits the stars across. The result
+        is identical irrespective of thread count.
     """
     # Prepare star arrays
     if star_mask is not None:
@@ -203,15 +393,293 @@ def get_lnoverlaps(comp, data, star_mask=None):
     mean_now, cov_now = comp.get_currentday_projection()
 
     # Calculate overlap integral of each star
-    if USE_C_IMPLEMENTATION:
+    if USE_C_MULTI_IMPLEMENTATION and nthreads > 1:
+        lnols = c_get_lnoverlaps_threaded(cov_now, mean_now, star_covs,
+                                          star_means, star_count, nthreads)
+    elif USE_C_IMPLEMENTATION:
         #~ print(cov_now, mean_now, star_count)
         lnols = c_get_lnoverlaps(cov_now, mean_now, star_covs, star_means,
                                  star_count)
     else:
-        lnols = slow_get_lnoverlaps(cov_now, mean_now, star_covs, star_means)
+        lnols = batch_get_lnoverlaps(cov_now, mean_now, star_covs, star_means)
+    return lnols
+
+
+def get_lnoverlaps_many_comps(comps, data, star_mask=None, nthreads=1):
+    """
+    Given a list of components, calculate each star's overlap with each
+
+    The current day projection of every component is stacked, and passed
+    to the C module in a single call, such that the star data is
+    marshalled only once irrespective of the number of components.
+
+    Parameters
+    ----------
+    comps: [ncomps] list of Component objects
+        The components with which to calculate overlaps
+    data: dict
+        stellar cartesian data being fitted to, stored as a dict:
+        'means': [nstars,6] float array
+            the central estimates of each star in XYZUVW space
+        'covs': [nstars,6,6] float array
+            the covariance of each star in XYZUVW space
+    star_mask: [len(data)] indices
+        A mask that excludes stars that have negliglbe membership probablities
+        (and thus have their log overlaps scaled to tiny numbers).
+    nthreads: int {1}
+        Number of threads the C module splits the stars across. The result
+        is identical irrespective of thread count.
+
+    Returns
+    -------
+    lnols: [nstars, ncomps] float array
+        The log overlap of each star with each component
+    """
+    # Prepare star arrays
+    if star_mask is not None:
+        star_means = data['means'][star_mask]
+        star_covs = data['covs'][star_mask]
+    else:
+        star_means = data['means']
+        star_covs = data['covs']
+
+    comp_count = len(comps)
+
+    # Get current day projection of every component
+    means_now = np.zeros((comp_count, star_means.shape[-1]))
+    covs_now = np.zeros((comp_count,) + star_covs.shape[1:])
+    for i, comp in enumerate(comps):
+        means_now[i], covs_now[i] = comp.get_currentday_projection()
+
+    return get_lnoverlaps_many_projections(means_now, covs_now, star_means,
+                                           star_covs, nthreads=nthreads)
+
+
+def get_lnoverlaps_many_projections(means_now, covs_now, star_means,
+                                    star_covs, nthreads=1):
+    """
+    Calculate each star's overlap with each of many current day component
+    projections, in a single call to the C module where available.
+
+    Parameters
+    ----------
+    means_now: [ncomps,6] float array
+        The current day means of the components
+    covs_now: [ncomps,6,6] float array
+        The current day covariance matrices of the components
+    star_means: [nstars,6] float array
+    star_covs: [nstars,6,6] float array
+    nthreads: int {1}
+        Number of threads the C module splits the stars across.
+
+    Returns
+    -------
+    lnols: [nstars, ncomps] float array
+        The log overlap of each star with each component
+    """
+    star_count = len(star_means)
+    comp_count = len(means_now)
+
+    if USE_C_MULTI_IMPLEMENTATION:
+        lnols = c_get_lnoverlaps_multi(covs_now, means_now,
+                                       star_covs, star_means,
+                                       star_count * comp_count, nthreads)
+        return lnols.reshape(star_count, comp_count)
+
+    lnols = np.zeros((star_count, comp_count))
+    for i in range(comp_count):
+        if USE_C_IMPLEMENTATION:
+            lnols[:,i] = c_get_lnoverlaps(covs_now[i], means_now[i],
+                                          star_covs, star_means, star_count)
+        else:
+            lnols[:,i] = batch_get_lnoverlaps(covs_now[i], means_now[i],
+                                              star_covs, star_means)
     return lnols
 
 
+def get_lnoverlap_upper_bounds(comps, data):
+    """
+    Cheaply calculate an upper bound on the log overlap of each star with
+    each component, without evaluating the overlap integral.
+
+    With C = S + G the sum of the star's and component's covariance
+    matrices, and d the separation of their means:
+        ln|C| >= ln|G|
+        d^T C^-1 d >= |d|^2 / lambda_max(C)
+                   >= |d|^2 / (lambda_max(G) + trace(S))
+    so substituting these into the log overlap yields an upper bound.
+
+    Parameters
+    ----------
+    comps: [ncomps] list of Component objects
+        The components with which to bound overlaps
+    data: dict
+        'means': [nstars,6] float array
+            the central estimates of each star in XYZUVW space
+        'covs': [nstars,6,6] float array
+            the covariance of each star in XYZUVW space
+
+    Returns
+    -------
+    ln_ubs: [nstars, ncomps] float array
+        An upper bound on the log overlap of each star with each component
+    """
+    star_means = data['means']
+    dim = star_means.shape[-1]
+    # Largest eigenvalue of a positive semi-definite matrix is at most its trace
+    star_max_eigs = np.trace(data['covs'], axis1=1, axis2=2)
+
+    ln_ubs = np.zeros((len(star_means), len(comps)))
+    for i, comp in enumerate(comps):
+        mean_now, cov_now = comp.get_currentday_projection()
+        comp_eigs = np.linalg.eigvalsh(cov_now)
+        sq_dists = np.sum((star_means - mean_now)**2, axis=1)
+        ln_ubs[:,i] = -0.5 * (dim * np.log(2*np.pi)
+                              + np.sum(np.log(comp_eigs))
+                              + sq_dists / (comp_eigs[-1] + star_max_eigs))
+    return ln_ubs
+
+
+class OverlapCache(object):
+    """
+    A least-recently-used cache of the log overlaps of every star with
+    individual components.
+
+    Within an EM iteration the same components' overlaps are required by
+    the E-step, by the likelihood (and posterior) scoring and by the
+    stability checks. Each component's [nstars] column of log overlaps
+    is stored against its class, its trace orbit function, its emcee
+    parameters and the identity of the dataset, such that it is only
+    calculated once. Once the stored columns exceed `max_bytes`, the
+    least recently used columns are evicted.
+
+    The dataset is identified by a hash of its 'means' and 'covs' arrays,
+    which is remembered for as long as those array objects exist. Arrays
+    that are modified in place will therefore not be recognised as a
+    different dataset.
+
+    Attributes
+    ----------
+    max_bytes: int
+        the memory budget for stored columns
+    nbytes: int
+        the memory currently used by stored columns
+    hits: int
+        number of lookups that found a stored column
+    misses: int
+        number of lookups that did not find a stored column
+    evictions: int
+        number of columns evicted to stay within the memory budget
+    """
+    def __init__(self, max_bytes=100*2**20):
+        """
+        Parameters
+        ----------
+        max_bytes: int {100*2**20}
+            the memory budget for stored columns, in bytes
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._columns = OrderedDict()
+        self._data_keys = {}
+
+    def __len__(self):
+        return len(self._columns)
+
+    def get_data_key(self, data):
+        """
+        Identify a dataset by a hash of its star means and covariances
+        """
+        means, covs = data['means'], data['covs']
+        memo_key = (id(means), id(covs))
+        if memo_key in self._data_keys:
+            means_ref, covs_ref, data_key = self._data_keys[memo_key]
+            if means_ref() is means and covs_ref() is covs:
+                return data_key
+
+        data_hash = hashlib.sha1()
+        for arr in (means, covs):
+            arr = np.ascontiguousarray(arr, dtype=np.float64)
+            data_hash.update(str(arr.shape).encode())
+            data_hash.update(arr.data)
+        data_key = data_hash.hexdigest()
+        self._data_keys[memo_key] = (weakref.ref(means), weakref.ref(covs),
+                                     data_key)
+        return data_key
+
+    def get_key(self, comp, data):
+        """
+        Identify a component's overlaps with a dataset
+        """
+        comp_pars = np.ascontiguousarray(comp.get_emcee_pars(),
+                                         dtype=np.float64)
+        return (type(comp), comp.trace_orbit_func,
+                comp_pars.tobytes(), self.get_data_key(data))
+
+    def lookup(self, comp, data):
+        """
+        Retrieve the stored log overlaps of each star with `comp`
+
+        Returns
+        -------
+        lnols: [nstars] float array -or- None
+            the (read-only) stored log overlaps, or None if not stored
+        """
+        key = self.get_key(comp, data)
+        if key not in self._columns:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # Mark as most recently used
+        lnols = self._columns.pop(key)
+        self._columns[key] = lnols
+        return lnols
+
+    def store(self, comp, data, lnols):
+        """
+        Store the log overlaps of each star with `comp`, evicting the least
+        recently used columns if over the memory budget
+        """
+        key = self.get_key(comp, data)
+        lnols = np.array(lnols, dtype=np.float64)
+        if lnols.nbytes > self.max_bytes:
+            return
+        lnols.flags.writeable = False
+        if key in self._columns:
+            self.nbytes -= self._columns.pop(key).nbytes
+        self._columns[key] = lnols
+        self.nbytes += lnols.nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._columns.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            self.evictions += 1
+
+    def clear(self):
+        """
+        Discard all stored columns, leaving counters untouched
+        """
+        self._columns.clear()
+        self._data_keys.clear()
+        self.nbytes = 0
+
+    def get_stats(self):
+        """
+        Summarise the usage of the cache, e.g. for logging
+        """
+        nlookups = self.hits + self.misses
+        return {
+            'hits':self.hits,
+            'misses':self.misses,
+            'hit_rate':float(self.hits) / nlookups if nlookups else 0.,
+            'evictions':self.evictions,
+            'ncolumns':len(self),
+            'nbytes':self.nbytes,
+        }
+
+
 def lnlike(comp, data, memb_probs, memb_threshold=1e-5,
            minimum_exp_starcount=10.):
     """Computes the log-likelihood for a fit to a group.
@@ -229,12 +697,15 @@ def lnlike(comp, data, memb_probs, memb_threshold=1e-5,
     ----------
     pars: [npars] list
         Parameters describing the group model being fitted
-    data: dict
+    data: dict -or- ActiveStarSet
         traceback data being fitted to, stored as a dict:
         'means': [nstars,6] float array
             the central estimates of each star in XYZUVW space
         'covs': [nstars,6,6] float array
             the covariance of each star in XYZUVW space
+        If an ActiveStarSet, its prepared weights are used, and
+        `memb_probs`, `memb_threshold` and `minimum_exp_starcount`
+        are ignored.
     memb_probs: [nstars] float array
         array of weights [0.0 - 1.0] for each star, describing how likely
         they are members of group to be fitted.
@@ -245,6 +716,10 @@ def lnlike(comp, data, memb_probs, memb_threshold=1e-5,
         the logarithm of the likelihood of the fit
 
     """
+    # Stars, and their weights, have already been extracted
+    if isinstance(data, ActiveStarSet):
+        return np.dot(get_lnoverlaps(comp, data), data.weights)
+
     # Boost expect star count to some minimum threshold
     # This is a bit of a hack to prevent component amplitudes dwindling
     # to nothing
@@ -282,7 +757,7 @@ def lnprob_func(pars, data, memb_probs=None,
             0,1,2,3,4,5,   6,   7,  8
             X,Y,Z,U,V,W,lndX,lndV,age
     data
-    data: dict
+    data: dict -or- ActiveStarSet
         'means': [nstars,6] float array_like
             the central estimates of star phase-space properties
         'covs': [nstars,6,6] float array_like
@@ -290,6 +765,8 @@ def lnprob_func(pars, data, memb_probs=None,
         'bg_lnols': [nstars] float array_like (opt.)
             the log overlaps of stars with whatever pdf describes
             the background distribution of stars.
+        Providing an ActiveStarSet, built once per fit, avoids
+        re-extracting the member stars on every call.
     memb_probs
         array of weights [0.0 - 1.0] for each star, describing how likely
         they are members of group to be fitted.
@@ -329,7 +806,10 @@ def lnprob_func(pars, data, memb_probs=None,
 
     
     if memb_probs is None:
-        memb_probs = np.ones(len(data['means']))
+        if isinstance(data, ActiveStarSet):
+            memb_probs = data.memb_probs
+        else:
+            memb_probs = np.ones(len(data['means']))
     comp = Component(emcee_pars=pars, trace_orbit_func=trace_orbit_func)
     lp = lnprior(comp, memb_probs)
     
@@ -342,3 +822,57 @@ def lnprob_func(pars, data, memb_probs=None,
         if not np.isfinite(lp):
             return np.inf
         return - (lp + lnlike(comp, data, memb_probs, **kwargs))
+
+
+def lnprob_func_batch(pars, data, memb_probs=None, trace_orbit_func=None,
+                      Component=SphereComponent, nthreads=1):
+    """Computes the log-probability for many fits to a group at once.
+
+    Equivalent to lnprob_func (with optimisation_method 'emcee') applied
+    to each row of `pars`, e.g. every walker of an emcee ensemble. The
+    components' attributes are built as arrays, projected to the current
+    day together (see AbstractComponent.get_currentday_projections), and
+    their overlaps calculated in one call to the multi-component overlap
+    kernel, so the Python overhead does not grow with the number of rows.
+
+    Parameters
+    ----------
+    pars: [ncomps, npars] float array_like
+        Parameters describing each group model being fitted, in emcee
+        parametrisation
+    data: dict -or- ActiveStarSet
+        See lnprob_func
+    memb_probs: [nstars] float array {None}
+        array of weights [0.0 - 1.0] for each star, describing how likely
+        they are members of group to be fitted.
+    trace_orbit_func: function {None}
+        See lnprob_func
+    Component: Class implmentation of component.AbstractComponent
+    nthreads: int {1}
+        Number of threads across which the C module splits the overlaps
+
+    Returns
+    -------
+    lnprobs: [ncomps] float array
+        the logarithm of the posterior probability of each fit
+    """
+    pars = np.atleast_2d(pars)
+    if not isinstance(data, ActiveStarSet):
+        data = ActiveStarSet(data, memb_probs)
+    if memb_probs is None:
+        memb_probs = data.memb_probs
+
+    means, covmatrices, ages = Component.get_batch_attributes(pars)
+    lnprobs = lnprior_batch(means, covmatrices, ages, memb_probs)
+
+    valid = np.isfinite(lnprobs)
+    if np.any(valid):
+        means_now, covs_now = Component.get_currentday_projections(
+                means[valid], covmatrices[valid], ages[valid],
+                trace_orbit_func=trace_orbit_func,
+        )
+        lnols = get_lnoverlaps_many_projections(means_now, covs_now,
+                                                data.means, data.covs,
+                                                nthreads=nthreads)
+        lnprobs[valid] += np.dot(data.weights, lnols)
+    return lnprobs
@@ -11,6 +11,7 @@
 #include <gsl/gsl_blas.h>
 #include <string.h>
 #include <math.h>
+#include "overlap.h"
 
 /*
  *  A simple helper function to display the contents of a 2-D gsl matrix
@@ -72,6 +73,157 @@ void print_vec(double* vec, int dim1)
   printf("\n");
 }
 
+/*
+ * Which method calc_lnoverlap uses to factorise (B+A). Set from python
+ * with set_lnoverlap_method, so the two can be compared at runtime.
+ */
+static int LNOVERLAP_METHOD = LNOVERLAP_CHOLESKY;
+
+void set_lnoverlap_method(int method)
+{
+  LNOVERLAP_METHOD = method;
+}
+
+int get_lnoverlap_method(void)
+{
+  return LNOVERLAP_METHOD;
+}
+
+/* Function: calc_lnoverlap_chol6
+ * ------------------------------
+ *   Calculates the log overlap of a single star with a single group,
+ *   specialised to the 6D case.
+ *
+ *   (B+A) is symmetric positive definite, so rather than the generic gsl
+ *   LU decomposition, this performs a Cholesky decomposition C = L L^T on
+ *   fixed size stack arrays (loop bounds are compile time constants so
+ *   the compiler can fully unroll them). Then
+ *     ln(|C|)             = sum_i ln(L_ii^2)
+ *     (b-a)^T C^-1 (b-a)  = y^T y,  where L y = (b-a)
+ *   with y found by forward substitution. No memory is allocated.
+ *
+ * Returns
+ * -------
+ *  the log overlap, or NAN if (B+A) is not positive definite, in which
+ *  case the caller should fall back to the LU approach.
+ */
+static double calc_lnoverlap_chol6(
+  double* gr_cov, double* gr_mn, double* st_cov, double* st_mn
+  )
+{
+  int i, j, k;
+  double C[CHOL_DIM][CHOL_DIM], L[CHOL_DIM][CHOL_DIM];
+  double y[CHOL_DIM];
+  double d_temp, ln_det, mahal;
+
+  // INITIALISE LOWER TRIANGLE OF (B+A)
+  for (i=0; i<CHOL_DIM; i++)
+    for (j=0; j<=i; j++)
+      C[i][j] = st_cov[i*CHOL_DIM+j] + gr_cov[i*CHOL_DIM+j];
+
+  // CHOLESKY DECOMPOSITION, accumulating the log determinant
+  ln_det = 0.0;
+  for (j=0; j<CHOL_DIM; j++) {
+    d_temp = C[j][j];
+    for (k=0; k<j; k++)
+      d_temp -= L[j][k]*L[j][k];
+    if (!(d_temp > 0.0))
+      return NAN;
+    ln_det += log(d_temp);       // ln(L_jj^2)
+    L[j][j] = sqrt(d_temp);
+
+    for (i=j+1; i<CHOL_DIM; i++) {
+      d_temp = C[i][j];
+      for (k=0; k<j; k++)
+        d_temp -= L[i][k]*L[j][k];
+      L[i][j] = d_temp / L[j][j];
+    }
+  }
+
+  // FORWARD SUBSTITUTION, accumulating (b-a)^T C^-1 (b-a) = y^T y
+  mahal = 0.0;
+  for (i=0; i<CHOL_DIM; i++) {
+    d_temp = st_mn[i] - gr_mn[i];
+    for (k=0; k<i; k++)
+      d_temp -= L[i][k]*y[k];
+    y[i] = d_temp / L[i][i];
+    mahal += y[i]*y[i];
+  }
+
+  return -0.5 * (CHOL_DIM*log(2*M_PI) + ln_det + mahal);
+}
+
+/* Function: calc_lnoverlap
+ * ------------------------
+ *   Calculates the log overlap of a single star with a single group.
+ *   Shared by all get_lnoverlaps* entry points such that serial, multi
+ *   component and threaded calculations perform identical arithmetic.
+ *
+ *   For 6D inputs the specialised Cholesky routine is used, unless the
+ *   gsl LU approach has been selected with set_lnoverlap_method (or the
+ *   matrix turns out not to be positive definite).
+ *
+ *   The gsl workspace (BpA, bma, v_temp, p1) is provided by the caller
+ *   so that it can be allocated once per call (or once per thread) rather
+ *   than once per star.
+ *
+ *   See get_lnoverlaps for a description of the calculation.
+ */
+static double calc_lnoverlap(
+  double* gr_cov, double* gr_mn, double* st_cov, double* st_mn, int MAT_DIM,
+  gsl_matrix *BpA, gsl_vector *bma, gsl_vector *v_temp, gsl_permutation *p1
+  )
+{
+  int i, j, signum;
+  double d_temp, result, ln_det_BpA;
+
+  if (LNOVERLAP_METHOD == LNOVERLAP_CHOLESKY && MAT_DIM == CHOL_DIM) {
+    result = calc_lnoverlap_chol6(gr_cov, gr_mn, st_cov, st_mn);
+    if (!isnan(result))
+      return result;
+  }
+
+  // INITIALISE STAR MATRIX
+  for (i=0; i<MAT_DIM; i++)
+    for (j=0; j<MAT_DIM; j++)
+      //performing st_cov+gr_cov as part of the initialisation
+      gsl_matrix_set(BpA, i, j, st_cov[i*MAT_DIM+j] + gr_cov[i*MAT_DIM+j]);
+
+  // INITIALISE CENTRAL ESTIMATES
+  // performing st_mn - gr_mn as part of the initialisation
+  for (i=0; i<MAT_DIM; i++)
+    gsl_vector_set(bma, i, st_mn[i] - gr_mn[i]);
+
+  // CALCULATE OVERLAPS
+  // Performed in 4 stages
+  // Calc and sum up the inner terms:
+  // 1) 6 ln(2pi)
+  // 2) ln(|C|)
+  // 3) (b-a)^T(C^-1)(b-a)
+  // Then apply -0.5 coefficient
+
+  // 1) Calc 6 ln(2pi)
+  result = 6*log(2*M_PI);
+
+  // 2) Get log determiant of C
+  gsl_linalg_LU_decomp(BpA, p1, &signum);
+  ln_det_BpA = log(fabs(gsl_linalg_LU_det(BpA, signum)));
+  result += ln_det_BpA;
+
+  // 3) Calc (b-a)^T(C^-1)(b-a)
+  gsl_vector_set_zero(v_temp);
+  gsl_linalg_LU_solve(BpA, p1, bma, v_temp); /* v_temp holds (B+A)^-1 (b-a) *
+                                              * utilises `p1` as calculated *
+                                              * above                       */
+  gsl_blas_ddot(v_temp, bma, &d_temp); //d_temp holds (b-a)^T (B+A)-1 (b-a)
+  result += d_temp;
+
+  // 4) Apply coefficient
+  result *= -0.5;
+
+  return result;
+}
+
 /* Function: get_lnoverlaps
  * ------------------------
  *   Calculates the log overlap (convolution) with a set of 6D Gaussians with
@@ -121,8 +273,6 @@ void get_lnoverlaps(
   // ALLOCATE MEMORY
   int star_count = 0;
   int MAT_DIM = gr_dim1; //Typically set to 6
-  int i, j, signum;
-  double d_temp, result, ln_det_BpA;
   gsl_permutation *p1;
 
   gsl_matrix *BpA      = gsl_matrix_alloc(MAT_DIM, MAT_DIM); //will hold (B+A)
@@ -133,54 +283,12 @@ void get_lnoverlaps(
 
   // Go through each star, calculating and storing overlap
   for (star_count=0; star_count<n; star_count++) {
-    // INITIALISE STAR MATRIX
-    for (i=0; i<MAT_DIM; i++)
-      for (j=0; j<MAT_DIM; j++)
-        //performing st_cov+gr_cov as part of the initialisation
-        gsl_matrix_set(
-          BpA,i,j,
-          st_covs[star_count*MAT_DIM*MAT_DIM+i*MAT_DIM+j] +
-          gr_cov[i*MAT_DIM+j]
-        );
-
-    // INITIALISE CENTRAL ESTIMATES
-    // performing st_mn - gr_mn as part of the initialisation
-    for (i=0; i<MAT_DIM; i++) {
-      gsl_vector_set(
-        bma, i,
-        st_mns[star_count*MAT_DIM + i] - gr_mn[i]
-      );
-    }
-
-    // CALCULATE OVERLAPS
-    // Performed in 4 stages
-    // Calc and sum up the inner terms:
-    // 1) 6 ln(2pi)
-    // 2) ln(|C|)
-    // 3) (b-a)^T(C^-1)(b-a)
-    // Then apply -0.5 coefficient
-
-    // 1) Calc 6 ln(2pi)
-    result = 6*log(2*M_PI);
-
-    // 2) Get log determiant of C
-    gsl_linalg_LU_decomp(BpA, p1, &signum);
-    ln_det_BpA = log(fabs(gsl_linalg_LU_det(BpA, signum)));
-    result += ln_det_BpA;
-
-    // 3) Calc (b-a)^T(C^-1)(b-a)
-    gsl_vector_set_zero(v_temp);
-    gsl_linalg_LU_solve(BpA, p1, bma, v_temp); /* v_temp holds (B+A)^-1 (b-a) *
-                                                * utilises `p1` as calculated *
-                                                * above                       */
-    gsl_blas_ddot(v_temp, bma, &d_temp); //d_temp holds (b-a)^T (B+A)-1 (b-a)
-    result += d_temp;
-
-    // 4) Apply coefficient
-    result *= -0.5;
-
     // STORE RESULT 'lnols_output'
-    lnols_output[star_count] = result;
+    lnols_output[star_count] = calc_lnoverlap(
+      gr_cov, gr_mn,
+      &st_covs[star_count*MAT_DIM*MAT_DIM], &st_mns[star_count*MAT_DIM],
+      MAT_DIM, BpA, bma, v_temp, p1
+    );
   }
 
   // DEALLOCATE THE MEMORY
@@ -190,6 +298,144 @@ void get_lnoverlaps(
   gsl_permutation_free(p1);
 }
 
+/* Function: get_lnoverlaps_threaded
+ * ---------------------------------
+ *   As get_lnoverlaps, but with the star range split across `nthreads`
+ *   OpenMP threads. Each thread owns its own gsl workspace and writes to a
+ *   disjoint, statically scheduled slice of `lnols_output`, so results are
+ *   bit-identical to get_lnoverlaps irrespective of thread count.
+ *
+ *   The swig wrapper releases the GIL for the duration of this call.
+ *   If compiled without OpenMP, this falls back to a serial loop.
+ *
+ * Paramaters
+ *  name      type            description
+ * ----------
+ *  (as get_lnoverlaps)
+ *  nthreads:     (int)           number of threads to split stars across
+ */
+void get_lnoverlaps_threaded(
+  double* gr_cov, int gr_dim1, int gr_dim2,
+  double* gr_mn, int gr_mn_dim,
+  double* st_covs, int st_dim1, int st_dim2, int st_dim3,
+  double* st_mns, int st_mn_dim1, int st_mn_dim2,
+  double* lnols_output, int n, int nthreads
+  )
+{
+  int MAT_DIM = gr_dim1; //Typically set to 6
+
+  if (nthreads < 1)
+    nthreads = 1;
+
+#ifdef _OPENMP
+  #pragma omp parallel num_threads(nthreads)
+#endif
+  {
+    // ALLOCATE MEMORY (per thread)
+    int star_count;
+    gsl_matrix *BpA      = gsl_matrix_alloc(MAT_DIM, MAT_DIM);
+    gsl_vector *bma      = gsl_vector_alloc(MAT_DIM);
+    gsl_vector *v_temp   = gsl_vector_alloc(MAT_DIM);
+    gsl_permutation *p1  = gsl_permutation_alloc(MAT_DIM);
+
+#ifdef _OPENMP
+    #pragma omp for schedule(static)
+#endif
+    for (star_count=0; star_count<n; star_count++) {
+      lnols_output[star_count] = calc_lnoverlap(
+        gr_cov, gr_mn,
+        &st_covs[star_count*MAT_DIM*MAT_DIM], &st_mns[star_count*MAT_DIM],
+        MAT_DIM, BpA, bma, v_temp, p1
+      );
+    }
+
+    // DEALLOCATE THE MEMORY
+    gsl_matrix_free(BpA);
+    gsl_vector_free(bma);
+    gsl_vector_free(v_temp);
+    gsl_permutation_free(p1);
+  }
+}
+
+/* Function: get_lnoverlaps_multi
+ * ------------------------------
+ *   Calculates the log overlap of a set of 6D Gaussians (stars) with
+ *   each of a set of 6D Gaussians (components) in a single call.
+ *
+ *   Equivalent to calling get_lnoverlaps once per component, but the
+ *   star data is only marshalled once, and the loops are ordered such
+ *   that each star's covariance matrix and mean remain in cache while
+ *   it is compared against every component. Stars are split across
+ *   `nthreads` OpenMP threads as in get_lnoverlaps_threaded.
+ *
+ * Paramaters
+ *  name      type            description
+ * ----------
+ *  gr_covs       (m*6*6 npArray) array of each component's covariance matrix
+ *  gr_mns        (m*6 npArray)   array of each component's central estimate
+ *  st_covs       (n*6*6 npArray) array of each star's cov matrix
+ *  st_mns:       (n*6 npArray)   array of each star's central estimate
+ *  lnols_output: (n*m npArray)   used to store and return calculated overlaps
+ *  n:            (int)           nstars * ncomps, used for array dimensions
+ *  nthreads:     (int)           number of threads to split stars across
+ *
+ * Returns
+ * -------
+ *  (nstars*ncomps) array of calculated log overlaps, stored row major such
+ *      that element [i*ncomps + j] is the log overlap of star i with
+ *      component j. Reshaping to (nstars, ncomps) in python is free.
+ */
+void get_lnoverlaps_multi(
+  double* gr_covs, int gr_dim1, int gr_dim2, int gr_dim3,
+  double* gr_mns, int gr_mn_dim1, int gr_mn_dim2,
+  double* st_covs, int st_dim1, int st_dim2, int st_dim3,
+  double* st_mns, int st_mn_dim1, int st_mn_dim2,
+  double* lnols_output, int n, int nthreads
+  )
+{
+  int comp_total = gr_dim1;
+  int star_total = st_dim1;
+  int MAT_DIM = gr_dim2; //Typically set to 6
+
+  // Guard against a mismatched output array
+  if (n < star_total * comp_total)
+    star_total = n / comp_total;
+  if (nthreads < 1)
+    nthreads = 1;
+
+#ifdef _OPENMP
+  #pragma omp parallel num_threads(nthreads)
+#endif
+  {
+    // ALLOCATE MEMORY (per thread)
+    int star_count, comp_count;
+    gsl_matrix *BpA      = gsl_matrix_alloc(MAT_DIM, MAT_DIM);
+    gsl_vector *bma      = gsl_vector_alloc(MAT_DIM);
+    gsl_vector *v_temp   = gsl_vector_alloc(MAT_DIM);
+    gsl_permutation *p1  = gsl_permutation_alloc(MAT_DIM);
+
+    // Stars on the outside, so each star is read from memory once
+#ifdef _OPENMP
+    #pragma omp for schedule(static)
+#endif
+    for (star_count=0; star_count<star_total; star_count++) {
+      for (comp_count=0; comp_count<comp_total; comp_count++) {
+        lnols_output[star_count*comp_total + comp_count] = calc_lnoverlap(
+          &gr_covs[comp_count*MAT_DIM*MAT_DIM], &gr_mns[comp_count*MAT_DIM],
+          &st_covs[star_count*MAT_DIM*MAT_DIM], &st_mns[star_count*MAT_DIM],
+          MAT_DIM, BpA, bma, v_temp, p1
+        );
+      }
+    }
+
+    // DEALLOCATE THE MEMORY
+    gsl_matrix_free(BpA);
+    gsl_vector_free(bma);
+    gsl_vector_free(v_temp);
+    gsl_permutation_free(p1);
+  }
+}
+
 /* NOTE:
  * Everything below this line is left simply for correctness comparisons
  */
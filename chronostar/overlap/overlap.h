@@ -1,3 +1,22 @@
+/*
+ * Methods available to factorise (B+A) when calculating log overlaps
+ *   LNOVERLAP_GSL_LU:   generic gsl LU decomposition
+ *   LNOVERLAP_CHOLESKY: hand specialised 6x6 Cholesky decomposition
+ *                       (falls back to LU if not positive definite)
+ */
+#define LNOVERLAP_GSL_LU 0
+#define LNOVERLAP_CHOLESKY 1
+#define CHOL_DIM 6
+
+/*
+ * Function: set_lnoverlap_method
+ * ------------------------------
+ * Select which method all get_lnoverlaps* functions use. Defaults to
+ * LNOVERLAP_CHOLESKY.
+ */
+void set_lnoverlap_method(int method);
+int get_lnoverlap_method(void);
+
 /*
  * Function: get_lnoverlaps
  * ------------------------
@@ -14,6 +33,35 @@ void get_lnoverlaps(
   double* lnols_output, int n
   );
 
+/*
+ * Function: get_lnoverlaps_multi
+ * ------------------------------
+ * As get_lnoverlaps, but for `m` group 6D Gaussians (in `gr_covs` and
+ * `gr_mns`) at once. Output is flattened [nstars, m], so `n` must be
+ * nstars * m. Stars are split across `nthreads` threads.
+ */
+void get_lnoverlaps_multi(
+  double* gr_covs, int gr_dim1, int gr_dim2, int gr_dim3,
+  double* gr_mns, int gr_mn_dim1, int gr_mn_dim2,
+  double* st_covs, int st_dim1, int st_dim2, int st_dim3,
+  double* st_mns, int st_mn_dim1, int st_mn_dim2,
+  double* lnols_output, int n, int nthreads
+  );
+
+/*
+ * Function: get_lnoverlaps_threaded
+ * ---------------------------------
+ * As get_lnoverlaps, but splits the stars across `nthreads` OpenMP
+ * threads. Output is bit-identical to get_lnoverlaps.
+ */
+void get_lnoverlaps_threaded(
+  double* gr_cov, int gr_dim1, int gr_dim2,
+  double* gr_mn, int gr_mn_dim,
+  double* st_covs, int st_dim1, int st_dim2, int st_dim3,
+  double* st_mns, int st_mn_dim1, int st_mn_dim2,
+  double* lnols_output, int n, int nthreads
+  );
+
 double get_overlap2(PyObject *gr_icov, PyObject *gr_mn, double gr_icov_det,
                     PyObject *st_icov, PyObject *st_mn, double st_icov_det);
 
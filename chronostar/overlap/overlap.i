@@ -25,20 +25,41 @@
 %apply (double* IN_ARRAY3, int DIM1, int DIM2, int DIM3) \
       {(double* npyArray3D, int npyLength1D, int npyLength2D, int npyLength3D),
        (double* st_icovs, int st_dim1, int st_dim2, int st_dim3),
-       (double* st_covs,  int st_dim1, int st_dim2, int st_dim3)}
+       (double* st_covs,  int st_dim1, int st_dim2, int st_dim3),
+       (double* gr_covs,  int gr_dim1, int gr_dim2, int gr_dim3)}
 
 %apply (double* IN_ARRAY2, int DIM1, int DIM2) \
       {(double* gr_icov, int gr_dim1, int gr_dim2),
        (double* gr_cov,  int gr_dim1, int gr_dim2),
        (double* st_icov, int st_dim1, int st_dim2),
        (double* st_cov, int st_dim1, int st_dim2),
-       (double* st_mns, int st_mn_dim1, int st_mn_dim2)}
+       (double* st_mns, int st_mn_dim1, int st_mn_dim2),
+       (double* gr_mns, int gr_mn_dim1, int gr_mn_dim2)}
 
 %apply (double* IN_ARRAY1, int DIM1) \
       {(double* gr_mn, int gr_mn_dim),
        (double* st_mn, int st_mn_dim),
        (double* st_icov_dets, int st_icov_dets_dim)}
 
+/* The log overlap kernels touch no python objects, so release the GIL
+ * while they run. This lets python threads (e.g. a thread based pool
+ * evaluating emcee walkers) proceed concurrently */
+%exception get_lnoverlaps {
+  Py_BEGIN_ALLOW_THREADS
+  $action
+  Py_END_ALLOW_THREADS
+}
+%exception get_lnoverlaps_threaded {
+  Py_BEGIN_ALLOW_THREADS
+  $action
+  Py_END_ALLOW_THREADS
+}
+%exception get_lnoverlaps_multi {
+  Py_BEGIN_ALLOW_THREADS
+  $action
+  Py_END_ALLOW_THREADS
+}
+
 %include "overlap.h"
 
 %clear (double* npyArray3D, int npyLength1D, int npyLength2D, int npyLength3D);
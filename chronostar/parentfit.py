@@ -13,12 +13,15 @@ import random
 import uuid
 
 #~ from emcee.utils import MPIPool
+import multiprocessing
+from multiprocessing.connection import wait
 from multiprocessing import Pool
 
 from multiprocessing import cpu_count
 
 sys.path.insert(0, os.path.abspath('..'))
 from . import expectmax
+from . import likelihood
 from . import readparam
 from . import tabletool
 from . import component
@@ -30,7 +33,7 @@ try:
 except NameError:
     FileNotFoundError = IOError
 
-def dummy_trace_orbit_func(loc, times=None):
+def dummy_trace_orbit_func(loc, times=None, single_age=True):
     """
     Purely for testing purposes
 
@@ -38,6 +41,8 @@ def dummy_trace_orbit_func(loc, times=None):
     A little constraint on age (since otherwise its a free floating
     parameter)
     """
+    if not single_age:
+        return np.array([dummy_trace_orbit_func(loc, time) for time in times])
     if times is not None:
         if np.all(times > 1.):
             return loc + 1000.
@@ -116,7 +121,19 @@ class ParentFit(object):
 
         'max_comp_count':20,
         'max_em_iterations':200,
-        'nthreads':1,     # TODO: NOT IMPLEMENTED
+        # Number of processes in the pool evaluating emcee walkers, and
+        # number of threads the C module splits stars across in the E-step
+        'nthreads':1,
+
+        # If set, skip E-step overlaps that are guaranteed to change
+        # membership probabilities by less than this tolerance (requires
+        # a background). See expectmax.get_all_lnoverlaps
+        'overlap_cull_tol':None,
+
+        # Memory budget (in MB) of the cache of each component's overlaps,
+        # shared by every EM fit and score calculation of this run.
+        # See likelihood.OverlapCache
+        'lnol_cache_mb':100,
         'use_background':True,
         'use_box_background':False,
 
@@ -128,10 +145,15 @@ class ParentFit(object):
 
         # If loading parameters from text file, can provide strings:
         #  - 'epicyclic' for epicyclic
+        #  - 'variational' for galpy potential, with Jacobians integrated
+        #    alongside the orbit
+        #  - 'emulator' for interpolating the orbits tabulated in
+        #    'orbit_emulator_file' (see traceorbit.build_orbit_emulator)
         #  - 'dummy_trace_orbit_func' for a trace orbit funciton that doens't do antyhing (for testing)
         # Alternativley, if building up parameter dictionary in a script, can
         # provide actual function.
         'trace_orbit_func':traceorbit.trace_cartesian_orbit,
+        'orbit_emulator_file':None,
 
         # MZ
         # Specify what optimisation method in the maximisation step of
@@ -146,6 +168,30 @@ class ParentFit(object):
         # Optimise components in parallel in expectmax.maximise.
         'nprocess_ncomp': False,
 
+        # Number of long-lived worker processes optimising components when
+        # 'nprocess_ncomp' is set. If None, uses all but one cpu.
+        # See expectmax.ComponentPool
+        'ncomp_workers': None,
+
+        # Number of candidate splits to fit concurrently, each in its own
+        # process, and the `nthreads` each of those fits may use (if None,
+        # uses `nthreads`). The 'ncomp_workers' are divided between them.
+        # See ParentFit.run_split_candidates
+        'nsplit_workers': 1,
+        'split_nthreads': None,
+
+        # Race candidate splits (NaiveFit only), advancing each by
+        # 'race_em_iterations' EM iterations at a time, and pausing those
+        # whose BIC trails the leader's by more than 'race_bic_margin'.
+        # See ParentFit.race_split_candidates
+        'race_splits': False,
+        'race_em_iterations': 5,
+        'race_bic_margin': 20.,
+
+        # Score all emcee walkers together, with one batched lnprob call
+        # per step. See compfitter.fit_comp
+        'vectorise_lnprob': False,
+
         # Overwrite final results in a fits file
         'overwrite_fits': False,
 
@@ -242,6 +288,11 @@ class ParentFit(object):
         else:
             self.pool = None
 
+        # Share component overlaps between all fits of this run
+        self.fit_pars['lnol_cache'] = likelihood.OverlapCache(
+                max_bytes=int(self.fit_pars['lnol_cache_mb'] * 2**20)
+        )
+
         # ------------------------------------------------------------
         # -----  SETTING UP RUN CUSTOMISATIONS  ----------------------
         # ------------------------------------------------------------
@@ -252,9 +303,32 @@ class ParentFit(object):
         elif self.fit_pars['trace_orbit_func'] == 'epicyclic':
             log_message('trace_orbit: epicyclic')
             self.fit_pars['trace_orbit_func'] = traceorbit.trace_epicyclic_orbit
+        elif self.fit_pars['trace_orbit_func'] == 'variational':
+            log_message('trace_orbit: variational')
+            self.fit_pars['trace_orbit_func'] = traceorbit.trace_variational_orbit
+        elif self.fit_pars['trace_orbit_func'] == 'emulator':
+            log_message('trace_orbit: emulator')
+            self.fit_pars['trace_orbit_func'] = \
+                traceorbit.trace_orbit_emulator_builder(
+                        self.fit_pars['orbit_emulator_file'])
+            # Accuracy depends on the emulator's grid, so log it
+            traceorbit.validate_orbit_emulator(
+                    self.fit_pars['trace_orbit_func'].emulator, nvalidate=10,
+            )
         else:
             self.fit_pars['trace_orbit_func'] = traceorbit.trace_cartesian_orbit
 
+        # Keep the same worker processes for every M-step of the run
+        if self.fit_pars['nprocess_ncomp']:
+            ncomp_workers = self.fit_pars['ncomp_workers']
+            if ncomp_workers is None:
+                ncomp_workers = max(cpu_count() - 1, 1)
+            log_message('Component pool of {} workers'.format(ncomp_workers))
+            self.fit_pars['comp_pool'] = expectmax.ComponentPool(
+                    ncomp_workers,
+                    trace_orbit_func=self.fit_pars['trace_orbit_func'],
+            )
+
         if type(self.fit_pars['init_comps']) is str:
             self.fit_pars['init_comps'] = self.Component.load_raw_components(
                     self.fit_pars['init_comps'])
@@ -268,6 +342,35 @@ class ParentFit(object):
         # TODO: If initialising with membership probabilities, adjust self.ncomps
 
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Stop the worker processes of the component pool, if any. The pool
+        starts afresh on next use, so the fit can still be run again.
+        """
+        comp_pool = self.fit_pars.get('comp_pool')
+        if comp_pool is not None:
+            comp_pool.shutdown()
+
+    def run_fit(self):
+        """
+        Perform the fit of the subclass (see its `_run_fit`), stopping the
+        component pool's workers however the fit ends.
+        """
+        try:
+            return self._run_fit()
+        finally:
+            self.close()
+
+    def _run_fit(self):
+        raise NotImplementedError
+
+
     def build_comps_from_chains(self, run_dir):
         """
         Build compoennt objects from stored emcee chains and cooresponding
@@ -441,6 +544,346 @@ class ParentFit(object):
         return {'comps':comps, 'med_and_spans':med_and_spans, 'memb_probs':memb_probs}
 
 
+    def build_split_candidates(self, prev_result, ncomps):
+        """
+        Set up every candidate decomposition of a previous fit, where each
+        candidate splits one of the previous components into two.
+
+        Candidate `i` splits `prev_result['comps'][i]`, and is fitted in
+        `{rdir}/{ncomps}/{label}/` where label is 'A', 'B', ...
+
+        Parameters
+        ----------
+        prev_result : dict
+            The best fit so far, as returned by `run_em_unless_loadable`
+        ncomps : int
+            The number of components in each candidate
+
+        Returns
+        -------
+        run_dirs : [N] list of str
+            The results directory of each candidate
+        all_init_comps : [N] list of lists of Component objects
+            The components with which to initialise each candidate
+        """
+        run_dirs = []
+        all_init_comps = []
+        for i, target_comp in enumerate(prev_result['comps']):
+            div_label = chr(ord('A') + i)
+            run_dir = self.rdir + '{}/{}/'.format(ncomps, div_label)
+            log_message(msg='Subdividing stage {}'.format(div_label),
+                        symbol='+', surround=True)
+            mkpath(run_dir)
+
+            run_dirs.append(run_dir)
+            all_init_comps.append(self.build_init_comps(
+                    prev_result['comps'], split_comp_ix=i,
+                    prev_med_and_spans=prev_result['med_and_spans'],
+                    memb_probs = prev_result['memb_probs']))
+        return run_dirs, all_init_comps
+
+
+    def run_split_candidates(self, prev_result, ncomps):
+        """
+        Fit every candidate decomposition of a previous fit, see
+        `build_split_candidates`.
+
+        If 'nsplit_workers' > 1 the candidates are first fitted concurrently
+        (see `run_em_concurrently`), then all are loaded and scored once
+        every candidate has finished.
+
+        Parameters
+        ----------
+        prev_result : dict
+            The best fit so far, as returned by `run_em_unless_loadable`
+        ncomps : int
+            The number of components in each candidate
+
+        Returns
+        -------
+        all_results : [N] list of dicts
+            The result of each candidate, see `run_em_unless_loadable`
+        all_scores : [N] list of dicts
+            The score of each candidate, see `calc_score`
+        """
+        run_dirs, all_init_comps = self.build_split_candidates(prev_result,
+                                                               ncomps)
+        if self.fit_pars['nsplit_workers'] > 1:
+            self.run_em_concurrently(run_dirs, all_init_comps)
+
+        all_results = []
+        all_scores = []
+        for i, (run_dir, init_comps) in enumerate(zip(run_dirs,
+                                                      all_init_comps)):
+            result, score = self.load_split_candidate(run_dir, init_comps,
+                                                      label=chr(ord('A') + i))
+            all_results.append(result)
+            all_scores.append(score)
+
+        return all_results, all_scores
+
+
+    def load_split_candidate(self, run_dir, init_comps, label):
+        """
+        Get the result and score of a candidate's fit, running the fit
+        first if it isn't loadable
+        """
+        self.fit_pars['init_comps'] = init_comps
+        self.ncomps = len(init_comps)
+
+        result = self.run_em_unless_loadable(run_dir)
+        score = self.calc_score(
+                result['comps'], result['memb_probs'],
+                use_box_background=self.fit_pars['use_box_background']
+        )
+
+        logging.info(
+                'Decomposition {} finished with \nBIC: {}\nlnlike: {}\n'
+                'lnpost: {}'.format(
+                        label, score['bic'], score['lnlike'], score['lnpost'],
+                ))
+        return result, score
+
+
+    def race_split_candidates(self, prev_result, ncomps):
+        """
+        Race the candidate decompositions of a previous fit against each
+        other, only fitting the promising ones to convergence. An
+        alternative to `run_split_candidates` used by NaiveFit when
+        'race_splits' is set.
+
+        All candidates are advanced 'race_em_iterations' EM iterations at a
+        time. After each round, a candidate's running score is the BIC of
+        its latest iteration (or, once converged, of its chosen iteration),
+        and the leader is the best scoring candidate that isn't paused.
+        Candidates scoring worse than the leader by more than
+        'race_bic_margin' are paused. Their EM iterations are already
+        checkpointed in their run directory, so a paused candidate is
+        resumed if the leader's score worsens to within the margin of it.
+        The race ends once every candidate has either converged, or is
+        paused.
+
+        Parameters
+        ----------
+        prev_result : dict
+            The best fit so far, as returned by `run_em_unless_loadable`
+        ncomps : int
+            The number of components in each candidate
+
+        Returns
+        -------
+        all_results : [N] list of dicts
+            The result of each candidate, see `run_em_unless_loadable`.
+            None for candidates left paused.
+        all_scores : [N] list of dicts
+            The score of each candidate, see `calc_score`. Candidates left
+            paused have a BIC of infinity.
+        """
+        run_dirs, all_init_comps = self.build_split_candidates(prev_result,
+                                                               ncomps)
+        labels = [chr(ord('A') + i) for i in range(len(run_dirs))]
+        ncands = len(run_dirs)
+        nsteps = self.fit_pars['race_em_iterations']
+        max_em_iterations = self.fit_pars['max_em_iterations']
+        margin = self.fit_pars['race_bic_margin']
+
+        all_bics = ncands * [np.array([])]
+        finished = np.array(ncands * [False])
+        paused = np.array(ncands * [False])
+
+        log_message('Racing {} candidates'.format(ncands), symbol='+',
+                    surround=True)
+        while np.any(~finished & ~paused):
+            racing = np.where(~finished & ~paused)[0]
+            budgets = [min(len(all_bics[i]) + nsteps, max_em_iterations)
+                       for i in racing]
+
+            # Advance every racing candidate by a few iterations
+            failed = []
+            if self.fit_pars['nsplit_workers'] > 1:
+                failed = self.run_em_concurrently(
+                        [run_dirs[i] for i in racing],
+                        [all_init_comps[i] for i in racing],
+                        all_max_em_iterations=budgets,
+                )
+            for i, budget in zip(racing, budgets):
+                if self.fit_pars['nsplit_workers'] <= 1 or \
+                        run_dirs[i] in failed:
+                    self.advance_em(run_dirs[i], all_init_comps[i], budget)
+                all_bics[i] = np.load(run_dirs[i] + 'bic_list.npy')
+
+                # EM stops short of its budget once converged (or unstable)
+                finished[i] = len(all_bics[i]) < budget or \
+                              len(all_bics[i]) >= max_em_iterations
+
+            scores = np.array([
+                np.min(bics) if done else bics[-1]
+                for bics, done in zip(all_bics, finished)
+            ])
+            leader_score = np.min(scores[~paused])
+            logging.info('Race scores: {}'.format(dict(zip(labels, scores))))
+
+            for i in range(ncands):
+                if not finished[i] and not paused[i] and \
+                        scores[i] > leader_score + margin:
+                    paused[i] = True
+                    log_message('Pausing {} after {} iterations'.format(
+                            labels[i], len(all_bics[i])), symbol='-')
+                elif paused[i] and scores[i] <= leader_score + margin:
+                    paused[i] = False
+                    log_message('Resuming {} after {} iterations'.format(
+                            labels[i], len(all_bics[i])), symbol='-')
+
+        all_results = []
+        all_scores = []
+        for i in range(ncands):
+            if paused[i]:
+                logging.info('Decomposition {} left paused'.format(labels[i]))
+                all_results.append(None)
+                all_scores.append({'bic':np.inf, 'lnlike':np.nan,
+                                   'lnpost':np.nan})
+            else:
+                result, score = self.load_split_candidate(
+                        run_dirs[i], all_init_comps[i], label=labels[i]
+                )
+                all_results.append(result)
+                all_scores.append(score)
+
+        return all_results, all_scores
+
+
+    def advance_em(self, run_dir, init_comps, max_em_iterations):
+        """
+        Run an EM fit until it either converges, or has completed
+        `max_em_iterations` iterations in total. The fit resumes from any
+        iterations already stored in `run_dir`.
+        """
+        fit_pars = dict(self.fit_pars)
+        fit_pars['init_comps'] = init_comps
+        fit_pars['max_em_iterations'] = max_em_iterations
+        expectmax.fit_many_comps(data=self.data_dict, ncomps=len(init_comps),
+                                 rdir=run_dir, **fit_pars)
+
+
+    def run_em_concurrently(self, run_dirs, all_init_comps,
+                            all_max_em_iterations=None):
+        """
+        Run independent EM fits at the same time, at most 'nsplit_workers'
+        at once, each in a forked process of its own.
+
+        Each fit stores its results in its own `run_dir` (as usual), from
+        where they can be loaded by `run_em_unless_loadable`. Fits that
+        fail are logged and returned, to be rerun in serial.
+        Requires the 'fork' start method, otherwise nothing is run and
+        every fit is returned as failed. The component pool is shut down,
+        and the emcee pool ('pool') closed, before forking, and the emcee
+        pool is recreated once every fit has finished.
+
+        Parameters
+        ----------
+        run_dirs : [N] list of str
+            The results directory of each fit
+        all_init_comps : [N] list of lists of Component objects
+            The components with which to initialise each fit
+        all_max_em_iterations : [N] list of ints {None}
+            If provided, each fit is only advanced to this many iterations
+            (see `advance_em`) rather than run to convergence
+
+        Returns
+        -------
+        failed : list of str
+            The run directories of any fits that failed
+        """
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            logging.info('Concurrent fits require forking, so fitting in '
+                         'serial')
+            return list(run_dirs)
+        ctx = multiprocessing.get_context('fork')
+
+        if all_max_em_iterations is None:
+            all_max_em_iterations = len(run_dirs) * [None]
+
+        # Forked children only get the calling thread, so stop the pools'
+        # handler threads before forking. This also frees the component
+        # pool's idle workers while the children run their own (it
+        # restarts on next use). The emcee pool is restarted afterwards.
+        comp_pool = self.fit_pars.get('comp_pool')
+        if comp_pool is not None:
+            comp_pool.shutdown()
+        pool = self.fit_pars.get('pool')
+        if pool is not None:
+            pool.close()
+            pool.join()
+            self.fit_pars['pool'] = None
+
+        todo = list(zip(run_dirs, all_init_comps, all_max_em_iterations))
+        running = {}
+        failed = []
+        try:
+            while todo or running:
+                while todo and \
+                        len(running) < self.fit_pars['nsplit_workers']:
+                    run_dir, init_comps, max_em_iterations = todo.pop(0)
+                    process = ctx.Process(target=self._run_em_in_child,
+                                          args=(run_dir, init_comps,
+                                                max_em_iterations))
+                    process.start()
+                    logging.info('Started fit of {} in process {}'.format(
+                            run_dir, process.pid))
+                    running[process.sentinel] = (process, run_dir)
+
+                for sentinel in wait(list(running.keys())):
+                    process, run_dir = running.pop(sentinel)
+                    process.join()
+                    if process.exitcode != 0:
+                        logging.info(
+                                'Fit of {} failed with exit code {}'.format(
+                                        run_dir, process.exitcode))
+                        failed.append(run_dir)
+        finally:
+            if pool is not None:
+                self.fit_pars['pool'] = Pool(self.fit_pars['nthreads'])
+        return failed
+
+
+    def _run_em_in_child(self, run_dir, init_comps, max_em_iterations=None):
+        """
+        Target of the processes of `run_em_concurrently`. This is a forked
+        copy of the fit, so changes to its state are not seen by the parent.
+        """
+        self.fit_pars['init_comps'] = init_comps
+        self.ncomps = len(init_comps)
+
+        # Pools belong to the parent process, so set up our own
+        nthreads = self.fit_pars['split_nthreads']
+        if nthreads is None:
+            nthreads = self.fit_pars['nthreads']
+        self.fit_pars['nthreads'] = nthreads
+        if nthreads > 1:
+            self.fit_pars['pool'] = Pool(nthreads)
+        else:
+            self.fit_pars['pool'] = None
+        # Share the component workers between the concurrent fits
+        comp_pool = self.fit_pars.get('comp_pool')
+        if comp_pool is not None:
+            self.fit_pars['comp_pool'] = expectmax.ComponentPool(
+                    max(comp_pool.nworkers
+                        // self.fit_pars['nsplit_workers'], 1),
+                    trace_orbit_func=comp_pool.trace_orbit_func,
+            )
+
+        try:
+            if max_em_iterations is None:
+                self.run_em_unless_loadable(run_dir)
+            else:
+                self.advance_em(run_dir, init_comps, max_em_iterations)
+        finally:
+            if self.fit_pars['pool'] is not None:
+                self.fit_pars['pool'].close()
+            if comp_pool is not None:
+                self.fit_pars['comp_pool'].shutdown()
+
+
     def iter_end_log(self, best_split_ix, prev_result, new_result):
         logging.info("Selected {} as best decomposition".format(
                 chr(ord('A') + best_split_ix)))
@@ -496,6 +939,9 @@ class ParentFit(object):
                                                     comps,
                                                     old_memb_probs=memb_probs,
                                                     use_box_background=use_box_background,
+                                                    nthreads=self.fit_pars['nthreads'],
+                                                    overlap_cull_tol=self.fit_pars['overlap_cull_tol'],
+                                                    lnol_cache=self.fit_pars['lnol_cache'],
                                                     # bg_ln_ols=bg_ln_ols,
                                                     )
         lnpost = expectmax.get_overall_lnlikelihood(self.data_dict,
@@ -503,6 +949,9 @@ class ParentFit(object):
                                                     # bg_ln_ols=bg_ln_ols,
                                                     old_memb_probs=memb_probs,
                                                     use_box_background=use_box_background,
+                                                    nthreads=self.fit_pars['nthreads'],
+                                                    overlap_cull_tol=self.fit_pars['overlap_cull_tol'],
+                                                    lnol_cache=self.fit_pars['lnol_cache'],
                                                     inc_posterior=True)
 
         bic = expectmax.calc_bic(self.data_dict, self.ncomps, lnlike,
@@ -0,0 +1,150 @@
+"""
+sharedmem.py
+
+Place numpy arrays in blocks of shared memory, such that worker
+processes can attach to them without the arrays being pickled or
+copied.
+
+The process that publishes the arrays owns the memory and is
+responsible for unlinking it once all workers are finished. Workers
+only ever receive the (small) `specs` of each block, from which they
+rebuild array views with `SharedArrays.attach`.
+
+Requires python 3.8+ (multiprocessing.shared_memory). Check
+`shared_memory_avail` before use.
+"""
+import numpy as np
+
+try:
+    from multiprocessing import shared_memory
+    shared_memory_avail = True
+except ImportError:
+    shared_memory_avail = False
+
+
+class SharedArrays(object):
+    """
+    A collection of named numpy arrays, each backed by its own block of
+    shared memory.
+
+    Typical usage, in the owning process:
+    >>> shared = SharedArrays()
+    >>> shared.publish('means', data['means'])
+    >>> shared.allocate('results', (ncomps, npars))
+    >>> # ... pass `shared.specs` to workers, wait for them to finish
+    >>> results = np.copy(shared['results'])
+    >>> shared.close()
+
+    And in a worker:
+    >>> shared = SharedArrays.attach(specs)
+    >>> shared['results'][i] = fit(shared['means'])
+    >>> shared.close()
+    """
+    def __init__(self):
+        self.arrays = {}
+        self._blocks = {}
+        self._owner = True
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def __contains__(self, name):
+        return name in self.arrays
+
+    def allocate(self, name, shape, dtype=float):
+        """
+        Create a new (zeroed) shared array
+
+        Parameters
+        ----------
+        name: str
+            The key by which the array is accessed
+        shape: tuple of ints
+            Shape of the array
+        dtype: numpy dtype {float}
+            Data type of the array
+
+        Returns
+        -------
+        array: np.ndarray
+            A view onto the shared memory
+        """
+        dtype = np.dtype(dtype)
+        # Shared memory blocks can't be empty
+        nbytes = max(int(np.prod(shape)) * dtype.itemsize, 1)
+        block = shared_memory.SharedMemory(create=True, size=nbytes)
+        self._blocks[name] = block
+        self.arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        self.arrays[name][...] = 0
+        return self.arrays[name]
+
+    def publish(self, name, array):
+        """
+        Copy an existing array into shared memory
+
+        Parameters
+        ----------
+        name: str
+            The key by which the array is accessed
+        array: array_like
+            The data to be shared
+
+        Returns
+        -------
+        array: np.ndarray
+            A view onto the shared memory
+        """
+        array = np.asarray(array)
+        shared_array = self.allocate(name, array.shape, array.dtype)
+        shared_array[...] = array
+        return shared_array
+
+    @property
+    def specs(self):
+        """
+        Everything a worker needs to attach: a dictionary mapping each
+        array name to (block name, shape, dtype string)
+        """
+        return dict([
+            (name, (self._blocks[name].name, array.shape, array.dtype.str))
+            for name, array in self.arrays.items()
+        ])
+
+    @classmethod
+    def attach(cls, specs):
+        """
+        Attach to arrays published by another process
+
+        Parameters
+        ----------
+        specs: dict
+            The `specs` of the owning SharedArrays object
+
+        Returns
+        -------
+        shared: SharedArrays
+            Views onto the same memory as the owner. Writes are visible
+            to all processes.
+        """
+        shared = cls()
+        shared._owner = False
+        for name, (block_name, shape, dtype) in specs.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            shared._blocks[name] = block
+            shared.arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype),
+                                             buffer=block.buf)
+        return shared
+
+    def close(self):
+        """
+        Release this process's access to the memory. If this object
+        created the memory, the memory is also freed.
+
+        Any views onto the arrays held elsewhere must be deleted first.
+        """
+        self.arrays = {}
+        for block in self._blocks.values():
+            block.close()
+            if self._owner:
+                block.unlink()
+        self._blocks = {}
@@ -75,7 +75,7 @@ try:
 except NameError:
     FileNotFoundError = IOError
 
-def dummy_trace_orbit_func(loc, times=None):
+def dummy_trace_orbit_func(loc, times=None, single_age=True):
     """
     Purely for testing purposes
 
@@ -83,6 +83,8 @@ def dummy_trace_orbit_func(loc, times=None):
     A little constraint on age (since otherwise its a free floating
     parameter)
     """
+    if not single_age:
+        return np.array([dummy_trace_orbit_func(loc, time) for time in times])
     if times is not None:
         if np.all(times > 1.):
             return loc + 1000.
@@ -111,7 +113,7 @@ class SmartFit(ParentFit):
         """
         super(SmartFit, self).__init__(fit_pars)
 
-    def run_fit(self):
+    def _run_fit(self):
         """
         Perform a fit (as described in Paper I) to a set of prepared data.
 
@@ -200,41 +202,11 @@ class SmartFit(ParentFit):
             log_message(msg='FITTING {} COMPONENT'.format(stage_2_ncomps),
                         symbol='*', surround=True)
 
-            all_results = []
-            all_scores = []
-
-            # Iteratively try subdividing each previous component
-            # target_comp is the component we will split into two.
-            # This will make a total of ncomps (the target comp split into 2,
-            # plus the remaining components from prev_result['comps']
-            for i, target_comp in enumerate(prev_result['comps']):
-                div_label = chr(ord('A') + i)
-                run_dir = self.rdir + '{}/{}/'.format(stage_2_ncomps, div_label)
-                log_message(msg='Subdividing stage {}'.format(div_label),
-                            symbol='+', surround=True)
-                mkpath(run_dir)
-
-                self.fit_pars['init_comps'] = self.build_init_comps(
-                        prev_result['comps'], split_comp_ix=i,
-                        prev_med_and_spans=prev_result['med_and_spans'],
-                        memb_probs = prev_result['memb_probs'])
-                self.ncomps = len(self.fit_pars['init_comps'])
-
-                result = self.run_em_unless_loadable(run_dir)
-                all_results.append(result)
-
-                score = self.calc_score(
-                        result['comps'], result['memb_probs'],
-                        use_box_background=self.fit_pars['use_box_background']
-                )
-                all_scores.append(score)
-
-                logging.info(
-                        'Decomposition {} finished with \nBIC: {}\nlnlike: {}\n'
-                        'lnpost: {}'.format(
-                                div_label, all_scores[-1]['bic'],
-                                all_scores[-1]['lnlike'], all_scores[-1]['lnpost'],
-                        ))
+            # Try subdividing each previous component in turn.
+            # Each candidate has a total of ncomps (the target comp split
+            # into 2, plus the remaining components from prev_result['comps'])
+            all_results, all_scores = self.run_split_candidates(
+                    prev_result, stage_2_ncomps)
 
             # ------------------------------------------------------------
             # -----  STAGE 2a: COMBINE RESULTS OF EACH GOOD SPLIT  -------
@@ -308,7 +280,7 @@ class SmartFit(ParentFit):
                     # all_results.append(result)
 
                     new_score = self.calc_score(
-                            result['comps'], result['memb_probs'],
+                            new_result['comps'], new_result['memb_probs'],
                             use_box_background=self.fit_pars['use_box_background']
                     )
                     # all_scores.append(score)
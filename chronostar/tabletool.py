@@ -11,7 +11,6 @@ from astropy.units.core import UnitConversionError
 import string
 
 from . import coordinate
-from . import transform
 
 def load(filename, **kwargs):
     """Cause I'm too lazy to import Astropy.table.Table in terminal"""
@@ -375,13 +374,41 @@ def convert_astro2cart(astr_mean, astr_cov):
     xyzuvw_cov: [6,6] float array_like
         The carteisan covariance matrix
     """
-    xyzuvw_mean = coordinate.convert_astrometry2lsrxyzuvw(astr_mean)
-    xyzuvw_cov = transform.transform_covmatrix(
-            cov=astr_cov, trans_func=coordinate.convert_astrometry2lsrxyzuvw,
-            loc=astr_mean
-    )
+    xyzuvw_means, xyzuvw_covs = convert_many_astro2cart([astr_mean],
+                                                        [astr_cov])
+
+    return xyzuvw_means[0], xyzuvw_covs[0]
+
 
-    return xyzuvw_mean, xyzuvw_cov
+def convert_many_astro2cart(astr_means, astr_covs):
+    """
+    Convert astrometry data (means and covariances) of many stars into
+    cartesian coordinates, centred on the local standard of rest
+    (Schoenrich 2010).
+
+    The Jacobians of the transformation are calculated in closed form for
+    all stars at once, so no per-star finite differencing is required.
+
+    Parameters
+    ----------
+    astr_means: [n,6] float array_like
+        The central estimates of each star's astrometry values, in the
+        same order and units as `convert_astro2cart`
+    astr_covs: [n,6,6] float array_like
+        The covariance matrices of the measurements
+
+    Returns
+    -------
+    xyzuvw_means: [n,6] float array
+        The cartesian means (XYZUVW)
+    xyzuvw_covs: [n,6,6] float array
+        The cartesian covariance matrices
+    """
+    xyzuvw_means = coordinate.convert_many_astrometry2lsrxyzuvw(astr_means)
+    jacs = coordinate.calc_many_astrometry2lsrxyzuvw_jacobians(astr_means)
+    xyzuvw_covs = np.einsum('nij,njk,nlk->nil', jacs, astr_covs, jacs)
+
+    return xyzuvw_means, xyzuvw_covs
 
 
 def insert_data_into_row(row, mean, cov, main_colnames=None, error_colnames=None,
@@ -433,6 +460,57 @@ def insert_data_into_row(row, mean, cov, main_colnames=None, error_colnames=None
             pass
 
 
+def insert_data_into_table(table, means, covs, row_ixs=None,
+                           main_colnames=None, error_colnames=None,
+                           corr_colnames=None, cartesian=True):
+    """
+    Insert data, errors and correlations of many stars into a table
+
+    Column-wise equivalent of `insert_data_into_row`. The columns must
+    already exist!
+
+    Parameters
+    ----------
+    table: astropy table
+        The table in which the data will be inserted, with required
+        columns already existing
+    means: [n,6] float array
+        The means of data
+    covs: [n,6,6] float array
+        The covariance matrices of data
+    row_ixs: [n] int array {None}
+        The table rows corresponding to each entry of `means` and `covs`.
+        If left as None, data are inserted into the first `n` rows.
+    """
+    main_colnames, error_colnames, corr_colnames = get_colnames(
+            main_colnames, error_colnames, corr_colnames, cartesian=cartesian
+    )
+    if row_ixs is None:
+        row_ixs = np.arange(len(means))
+
+    # Insert mean data
+    for ix, main_colname in enumerate(main_colnames):
+        table[main_colname][row_ixs] = means[:,ix]
+
+    # Insert errors
+    standard_devs = np.sqrt(np.diagonal(covs, axis1=1, axis2=2))
+    for ix, error_colname in enumerate(error_colnames):
+        table[error_colname][row_ixs] = standard_devs[:,ix]
+
+    # Insert correlations, dividing covariances through by stdevs in both axes
+    indices = np.triu_indices(6,1)      # the indices of the upper right
+                                        # triangle, excluding main diagonal
+    for ix in range(len(corr_colnames)):
+        try:
+            fst_ix = indices[0][ix]
+            snd_ix = indices[1][ix]
+            table[corr_colnames[ix]][row_ixs] = covs[:, fst_ix, snd_ix] /\
+                    standard_devs[:,fst_ix] / standard_devs[:,snd_ix]
+        except KeyError:
+            # It's fine if some correlation columns are missing
+            pass
+
+
 def insert_column(table, col_data, col_name, filename=''):
     """
     Little helper to insert column data
@@ -535,10 +613,11 @@ def convert_table_astro2cart(table, return_table=False, write_table=False,
                      corr_colnames=astr_corr_colnames,
                      cartesian=False)
 
-    data = build_data_dict_from_table(table,
-                                      astr_main_colnames,
-                                      astr_error_colnames,
-                                      astr_corr_colnames)
+    data, table_ixs = build_data_dict_from_table(table,
+                                                 astr_main_colnames,
+                                                 astr_error_colnames,
+                                                 astr_corr_colnames,
+                                                 return_table_ixs=True)
 
     # Establish what column names are used
     cart_main_colnames, cart_error_colnames, cart_corr_colnames = \
@@ -554,14 +633,15 @@ def convert_table_astro2cart(table, return_table=False, write_table=False,
                                   cart_error_colnames,
                                   cart_corr_colnames)
 
-    # Iteratively transform data to cartesian coordinates, storing as we go
-    for row, astr_mean, astr_cov in zip(table, data['means'], data['covs']):
-        cart_mean, cart_cov = convert_astro2cart(astr_mean, astr_cov)
-        insert_data_into_row(row, cart_mean, cart_cov,
-                             main_colnames=cart_main_colnames,
-                             error_colnames=cart_error_colnames,
-                             corr_colnames=cart_corr_colnames
-                             )
+    # Transform all data to cartesian coordinates at once, then store
+    # column by column. Rows with missing data are left untouched.
+    cart_means, cart_covs = convert_many_astro2cart(data['means'],
+                                                    data['covs'])
+    insert_data_into_table(table, cart_means, cart_covs,
+                           row_ixs=table_ixs[0],
+                           main_colnames=cart_main_colnames,
+                           error_colnames=cart_error_colnames,
+                           corr_colnames=cart_corr_colnames)
 
     # Save data
     if filename and write_table:
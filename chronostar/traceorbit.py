@@ -5,15 +5,26 @@ A module aimed at projecting an orbit forward or backward through time.
 Operates in a co-rotating, RH cartesian coordinate system centred on the
 local standard of rest.
 """
+import itertools
 import logging
 import numpy as np
+from scipy.integrate import odeint
+from scipy.interpolate import CubicSpline
 
 # from astropy.io import fits
+import galpy
 from galpy.orbit import Orbit
 from galpy.potential import MWPotential2014 #, MiyamotoNagaiPotential
+from galpy.potential import evaluateRforces, evaluatezforces, \
+    evaluateR2derivs, evaluatez2derivs, evaluateRzderivs
 from galpy.util import bovy_conversion
 
 mp = MWPotential2014
+
+# galpy supports integrating many orbits in a single Orbit instance from 1.5
+_GALPY_MULTI_ORBIT = tuple(
+        int(v) for v in galpy.__version__.split('.')[:2]
+) >= (1, 5)
 # mp = MiyamotoNagaiPotential(a=0.5,b=0.0375,amp=1.,normalize=1.) # Params from the example webpage. No idea if that's good or not.
 
 def convert_myr2bovytime(times):
@@ -324,26 +335,19 @@ def convert_curvilin2cart(data, ro=8., vo=220.,
 
     return cart_coordinates.T
 
-def epicyclic_approx(data, times=None, sA=0.89, sB=1.15, sR=1.21):
+def get_epicyclic_constants(sA=0.89, sB=1.15, sR=1.21):
     """
-    MZ (2020 - 01 - 17)
+    Oort constants and epicyclic frequencies used by the epicyclic
+    approximation, scaled by the factors `sA`, `sB` and `sR` to match
+    MWPotential2014.
 
-    Epicyclic approximation following the Makarov et al. 2004 paper
-    in the curvilinear coordinate system:
-    The radial component xi is pointing towards the Galactic center
-    at all times and equals 0 at R0.
-    The circular component eta circles around the Galaxy; eta = phi*R.
-    The vertical component is defined as a displacement from the Galactic plane.
-
-    This approximation works close to the LSR.
-
-    Parameters
-    ------------
-    data : [pc, pc*, pc, km/s, km/s, km/s] # *parsecs in the eta component are scales parsecs...
-           xi, eta, zeta, xidot, etadot, zetadot
+    Returns
+    -------
+    A, B : float
+        Oort constants [Myr-1]
+    kappa, nu : float
+        Radial and vertical epicyclic frequencies [Myr-1]
     """
-    xi0, eta0, zeta0, xidot0, etadot0, zetadot0 = data.T
-
     # Bovy 2017
     A0 = 15.3  # km/s/kpc
     B0 = -11.9  # km/s/kpc
@@ -369,6 +373,180 @@ def epicyclic_approx(data, times=None, sA=0.89, sB=1.15, sR=1.21):
     kappa = np.sqrt(-4.0 * B * (A - B)) # Myr-1
     nu = np.sqrt(4.0 * np.pi * Grho + (A + B) * (A - B)) # Myr-1
 
+    return A, B, kappa, nu
+
+
+def get_epicyclic_matrix(times, sA=0.89, sB=1.15, sR=1.21):
+    """
+    The epicyclic approximation as a linear map in curvilinear coordinates,
+    such that `epicyclic_approx(data, times)` equals
+    `np.dot(get_epicyclic_matrix(times), data.T).T` for a single time.
+
+    Parameters
+    ----------
+    times : float or [ntimes] float array
+        Myr - time(s) to trace to
+
+    Returns
+    -------
+    epi_matrix : [6,6] or [ntimes,6,6] float array
+        Maps [xi, eta, zeta, xidot, etadot, zetadot] (velocities in pc/Myr)
+        at time 0 to the same coordinates at `times`
+    """
+    A, B, kappa, nu = get_epicyclic_constants(sA=sA, sB=sB, sR=sR)
+
+    kt = kappa*np.asarray(times, dtype=float)
+    nt = nu*np.asarray(times, dtype=float)
+
+    epi_matrix = np.zeros(kt.shape + (6,6))
+    epi_matrix[...,0,0] = 1.0 - A*(1.0 - np.cos(kt))/B
+    epi_matrix[...,0,3] = np.sin(kt)/kappa
+    epi_matrix[...,0,4] = (1.0 - np.cos(kt))/(2.0*B)
+    epi_matrix[...,1,0] = -2.0*A*(A-B)*(kt - np.sin(kt))/(kappa*B)
+    epi_matrix[...,1,1] = 1.
+    epi_matrix[...,1,3] = -(1.0 - np.cos(kt))/(2.0*B)
+    epi_matrix[...,1,4] = (A*kt - (A-B)*np.sin(kt))/(kappa*B)
+    epi_matrix[...,2,2] = np.cos(nt)
+    epi_matrix[...,2,5] = np.sin(nt)/nu
+    epi_matrix[...,3,0] = -A*kappa*np.sin(kt)/B
+    epi_matrix[...,3,3] = np.cos(kt)
+    epi_matrix[...,3,4] = kappa*np.sin(kt)/(2.0*B)
+    epi_matrix[...,4,0] = -2.0*A*(A-B)*(1.0 - np.cos(kt))/B
+    epi_matrix[...,4,3] = -kappa*np.sin(kt)/(2.0*B)
+    epi_matrix[...,4,4] = (A - (A-B)*np.cos(kt))/B
+    epi_matrix[...,5,2] = -nu*np.sin(nt)
+    epi_matrix[...,5,5] = np.cos(nt)
+    return epi_matrix
+
+
+def get_cart2curvilin_jacobian(data, ro=8., vo=220.):
+    """
+    Analytic Jacobian of `convert_cart2curvilin` at the point(s) `data`.
+
+    Parameters
+    ----------
+    data : [6] or [npoints,6] float array
+        [X, Y, Z, U, V, W], in the same units as passed to
+        `convert_cart2curvilin`
+
+    Returns
+    -------
+    jac : [6,6] or [npoints,6,6] float array
+        jac[i,j] is the derivative of curvilinear coordinate i with respect
+        to cartesian coordinate j
+    """
+    X, Y, Z, U, V, W = np.asarray(data).T
+
+    R0 = ro*1000.0 # pc
+    Omega0 = vo/R0 # km/s / pc
+
+    U = U - Y*Omega0
+    V = V + X*Omega0
+
+    R = np.sqrt(Y**2 + (R0-X)**2)
+    phi = np.arctan2(Y, R0-X)
+    cphi = np.cos(phi)
+    sphi = np.sin(phi)
+
+    # d/dX, d/dY
+    dR_dX, dR_dY = -(R0-X)/R, Y/R
+    dphi_dX, dphi_dY = Y/R**2, (R0-X)/R**2
+
+    jac = np.zeros(np.shape(X) + (6,6))
+    jac[...,0,0] = -dR_dX
+    jac[...,0,1] = -dR_dY
+    jac[...,1,0] = R0*dphi_dX
+    jac[...,1,1] = R0*dphi_dY
+    jac[...,2,2] = 1.
+
+    Q = U*sphi + V*cphi
+    jac[...,3,0] = -Q*dphi_dX - sphi*Omega0
+    jac[...,3,1] = -Q*dphi_dY - cphi*Omega0
+    jac[...,3,3] = cphi
+    jac[...,3,4] = -sphi
+
+    P = V*cphi + U*sphi
+    S = U*cphi - V*sphi
+    jac[...,4,0] = -R0/R**2*P*dR_dX + R0/R*(S*dphi_dX + cphi*Omega0)
+    jac[...,4,1] = -R0/R**2*P*dR_dY + R0/R*(S*dphi_dY - sphi*Omega0)
+    jac[...,4,3] = R0/R*sphi
+    jac[...,4,4] = R0/R*cphi
+    jac[...,5,5] = 1.
+    return jac
+
+
+def get_curvilin2cart_jacobian(data, ro=8., vo=220.):
+    """
+    Analytic Jacobian of `convert_curvilin2cart` at the point(s) `data`.
+
+    Parameters
+    ----------
+    data : [6] or [npoints,6] float array
+        [xi, eta, zeta, xidot, etadot, zetadot]
+
+    Returns
+    -------
+    jac : [6,6] or [npoints,6,6] float array
+        jac[i,j] is the derivative of cartesian coordinate i with respect
+        to curvilinear coordinate j
+    """
+    xi, eta, zeta, xidot, etadot, zetadot = np.asarray(data).T
+
+    R0 = ro*1000.0
+    Omega0 = vo/R0 # km/s / pc
+
+    R = R0 - xi
+    phi = eta/R0
+    cphi = np.cos(phi)
+    sphi = np.sin(phi)
+
+    jac = np.zeros(np.shape(xi) + (6,6))
+    # X, Y with respect to xi, eta
+    jac[...,0,0] = cphi
+    jac[...,0,1] = R*sphi/R0
+    jac[...,1,0] = -sphi
+    jac[...,1,1] = R*cphi/R0
+    jac[...,2,2] = 1.
+
+    # U, V with respect to xi, eta, xidot, etadot (before frame rotation)
+    jac[...,3,0] = -etadot*sphi/R0
+    jac[...,3,1] = (-xidot*sphi + R/R0*etadot*cphi)/R0
+    jac[...,3,3] = cphi
+    jac[...,3,4] = R*sphi/R0
+    jac[...,4,0] = -etadot*cphi/R0
+    jac[...,4,1] = (-xidot*cphi - R/R0*etadot*sphi)/R0
+    jac[...,4,3] = -sphi
+    jac[...,4,4] = R*cphi/R0
+
+    # Convert to a non-rotating observed frame
+    jac[...,3,:] += Omega0*jac[...,1,:]
+    jac[...,4,:] -= Omega0*jac[...,0,:]
+    jac[...,5,5] = 1.
+    return jac
+
+
+def epicyclic_approx(data, times=None, sA=0.89, sB=1.15, sR=1.21):
+    """
+    MZ (2020 - 01 - 17)
+
+    Epicyclic approximation following the Makarov et al. 2004 paper
+    in the curvilinear coordinate system:
+    The radial component xi is pointing towards the Galactic center
+    at all times and equals 0 at R0.
+    The circular component eta circles around the Galaxy; eta = phi*R.
+    The vertical component is defined as a displacement from the Galactic plane.
+
+    This approximation works close to the LSR.
+
+    Parameters
+    ------------
+    data : [pc, pc*, pc, km/s, km/s, km/s] # *parsecs in the eta component are scales parsecs...
+           xi, eta, zeta, xidot, etadot, zetadot
+    """
+    xi0, eta0, zeta0, xidot0, etadot0, zetadot0 = data.T
+
+    A, B, kappa, nu = get_epicyclic_constants(sA=sA, sB=sB, sR=sR)
+
     t=times
 
     kt=kappa*t
@@ -400,19 +578,20 @@ def trace_epicyclic_orbit(xyzuvw_start, times=None, sA=0.89, sB=1.15, sR=1.21, s
 
     Parameters
     ----------
-    xyzuvw : [pc,pc,pc,km/s,km/s,km/s]
+    xyzuvw : [6] or [nstarts, 6] float array
+        [pc,pc,pc,km/s,km/s,km/s]
     times : (float) or ([ntimes] float array)
-        Myr - time of 0.0 must be present in the array. Times need not be #TODO: time 0.0 really? [TC: this was true for galpy]
-        spread linearly.
+        Myr - times need not be spread linearly, nor share a sign.
     single_age: (bool) {True}
         Set this flag if only providing a single age to trace to
         This is there for the plotting purposes.
 
     Returns
     -------
-    xyzuvw_tf : [ntimes, 6] array
+    xyzuvw_tf : [6], [nstarts, 6], [ntimes, 6] or [nstarts, ntimes, 6] array
         [pc, pc, pc, km/s, km/s, km/s] - the traced orbit with positions
-        and velocities
+        and velocities. Without `single_age`, each start point has a row
+        per time.
     """
     if single_age:
         # replace 0 with some tiny number
@@ -428,17 +607,22 @@ def trace_epicyclic_orbit(xyzuvw_start, times=None, sA=0.89, sB=1.15, sR=1.21, s
             raise
 
     else:
-        raise UserWarning('Multi age orbit integation no longer supported')
-        times = np.array(times)
+        times = np.array(times, dtype=float)
 
     # Make sure numbers are floats!
-    xyzuvw_start = xyzuvw_start.astype(np.float)
+    xyzuvw_start = np.array(xyzuvw_start).astype(float)
+
+    # Trace every (start, time) pair at once, the epicyclic approximation
+    # being closed-form in time
+    if not single_age:
+        single_start = xyzuvw_start.ndim == 1
+        xyzuvw_starts = np.atleast_2d(xyzuvw_start)
+        nstarts, ntimes = len(xyzuvw_starts), len(times)
+        xyzuvw_start = np.repeat(xyzuvw_starts, ntimes, axis=0)
+        times = np.tile(times, nstarts)
 
     # Units: Velocities are in km/s, convert into pc/Myr
-    try:
-        xyzuvw_start[3:] = xyzuvw_start[3:] * 1.0227121650537077 # pc/Myr
-    except:
-        xyzuvw_start[:,3:] = xyzuvw_start[:,3:] * 1.0227121650537077 # pc/Myr
+    xyzuvw_start[...,3:] = xyzuvw_start[...,3:] * 1.0227121650537077 # pc/Myr
 
     # Transform to curvilinear
     curvilin = convert_cart2curvilin(xyzuvw_start, ro=ro, vo=vo)
@@ -453,12 +637,108 @@ def trace_epicyclic_orbit(xyzuvw_start, times=None, sA=0.89, sB=1.15, sR=1.21, s
     xyzuvw_new = convert_curvilin2cart(new_position, ro=ro, vo=vo)
 
     # Units: Transform velocities from pc/Myr back to km/s
-    xyzuvw_new[3:] /= 1.0227121650537077
+    xyzuvw_new[...,3:] /= 1.0227121650537077
 
-#     if single_age:
-#         return xyzuvw_new[-1]
+    if not single_age:
+        xyzuvw_new = xyzuvw_new.reshape(nstarts, ntimes, 6)
+        if single_start:
+            return xyzuvw_new[0]
     return xyzuvw_new
 
+
+def propagate_epicyclic_orbit(xyzuvw_start, times=None, sA=0.89, sB=1.15,
+                              sR=1.21, ro=8., vo=220.):
+    """
+    Trace a single star with the epicyclic approximation, as in
+    `trace_epicyclic_orbit`, and also return the analytic Jacobian of the
+    trace about `xyzuvw_start`.
+
+    Since the epicyclic approximation is linear in curvilinear
+    coordinates, the Jacobian is the product of the Jacobians of the
+    curvilinear transformation, the epicyclic matrix, and the inverse
+    curvilinear transformation (with velocity unit conversions either
+    side). This replaces the 12 finite-difference orbit evaluations of
+    `transform.calc_jacobian`, and has no step-size sensitivity.
+
+    Parameters
+    ----------
+    xyzuvw_start : [6] float array
+        [pc,pc,pc,km/s,km/s,km/s]
+    times : float
+        Myr - the (single) age to trace to
+
+    Returns
+    -------
+    xyzuvw_end : [6] float array
+        [pc,pc,pc,km/s,km/s,km/s] - identical to
+        `trace_epicyclic_orbit(xyzuvw_start, times)`
+    jac : [6,6] float array
+        jac[i,j] is the derivative of final coordinate i with respect to
+        initial coordinate j
+    """
+    if times == 0.:
+        times = 1e-15
+
+    vel_scale = np.array(3*[1.] + 3*[1.0227121650537077]) # km/s -> pc/Myr
+    start = np.array(xyzuvw_start).astype(float) * vel_scale
+
+    curvilin = convert_cart2curvilin(start, ro=ro, vo=vo)
+    new_position = epicyclic_approx(curvilin, times=times, sA=sA, sB=sB, sR=sR)
+    xyzuvw_end = convert_curvilin2cart(new_position, ro=ro, vo=vo) / vel_scale
+
+    epi_matrix = get_epicyclic_matrix(times, sA=sA, sB=sB, sR=sR)
+    jac = np.dot(get_curvilin2cart_jacobian(new_position, ro=ro, vo=vo),
+                 np.dot(epi_matrix,
+                        get_cart2curvilin_jacobian(start, ro=ro, vo=vo)))
+    jac = (jac / vel_scale[:,np.newaxis]) * vel_scale
+    return xyzuvw_end, jac
+
+
+def propagate_many_epicyclic_orbits(xyzuvw_starts, ages, sA=0.89, sB=1.15,
+                                    sR=1.21, ro=8., vo=220.):
+    """
+    Equivalent of `propagate_epicyclic_orbit` for many start points, each
+    traced to its own age, in a single set of array operations.
+
+    Parameters
+    ----------
+    xyzuvw_starts : [npoints, 6] float array
+        [pc,pc,pc,km/s,km/s,km/s]
+    ages : [npoints] float array
+        Myr - the age to trace each start point to
+
+    Returns
+    -------
+    xyzuvw_ends : [npoints, 6] float array
+    jacs : [npoints, 6, 6] float array
+    """
+    ages = np.array(ages, dtype=float)
+    ages[ages == 0.] = 1e-15
+
+    vel_scale = np.array(3*[1.] + 3*[1.0227121650537077]) # km/s -> pc/Myr
+    starts = np.atleast_2d(xyzuvw_starts).astype(float) * vel_scale
+
+    curvilin = convert_cart2curvilin(starts, ro=ro, vo=vo)
+    new_positions = epicyclic_approx(curvilin, times=ages, sA=sA, sB=sB,
+                                     sR=sR)
+    xyzuvw_ends = convert_curvilin2cart(new_positions, ro=ro, vo=vo) \
+                  / vel_scale
+
+    jacs = np.einsum('nij,njk,nkl->nil',
+                     get_curvilin2cart_jacobian(new_positions, ro=ro, vo=vo),
+                     get_epicyclic_matrix(ages, sA=sA, sB=sB, sR=sR),
+                     get_cart2curvilin_jacobian(starts, ro=ro, vo=vo))
+    jacs = (jacs / vel_scale[:,np.newaxis]) * vel_scale
+    return xyzuvw_ends, jacs
+
+
+# Lets components and transform.calc_jacobian skip finite differences,
+# and batches of components (each with their own age) be projected at once
+trace_epicyclic_orbit.propagate_with_jacobian = propagate_epicyclic_orbit
+trace_epicyclic_orbit.propagate_many_with_jacobians = \
+    propagate_many_epicyclic_orbits
+
+
 def trace_galpy_orbit(galpy_start, times=None, single_age=True,
                       potential=MWPotential2014, ro=8, vo=220.,
                       method='dopr54_c'):
@@ -513,6 +793,44 @@ def trace_galpy_orbit(galpy_start, times=None, single_age=True,
     return galpy_coords
 
 
+def _integrate_galpy_orbits(galpy_starts, bovy_times,
+                            potential=MWPotential2014, ro=8., vo=220.,
+                            method='dopr54_c'):
+    """
+    Integrate many start points (in galpy coordinates) to each of many
+    times, with one integration per direction of time.
+
+    Parameters
+    ----------
+    galpy_starts : [nstarts, 6] float array
+    bovy_times : [ntimes] float array
+        galpy time units - any order, and either sign
+
+    Returns
+    -------
+    galpy_ends : [nstarts, ntimes, 6] float array
+    """
+    galpy_ends = np.repeat(galpy_starts[:,np.newaxis], len(bovy_times),
+                           axis=1)
+    for mask in (bovy_times > 0., bovy_times < 0.):
+        if not np.any(mask):
+            continue
+        ixs = np.where(mask)[0]
+        ixs = ixs[np.argsort(np.abs(bovy_times[ixs]))]
+        ts = np.hstack((0., bovy_times[ixs]))
+        if _GALPY_MULTI_ORBIT:
+            # Integrate every start point as a single multi-object Orbit
+            o = Orbit(vxvv=galpy_starts, ro=ro, vo=vo)
+            o.integrate(ts, potential, method=method)
+            galpy_ends[:,ixs] = o.getOrbit()[:,1:]
+        else:
+            for start_ix, galpy_start in enumerate(galpy_starts):
+                o = Orbit(vxvv=galpy_start, ro=ro, vo=vo)
+                o.integrate(ts, potential, method=method)
+                galpy_ends[start_ix,ixs] = o.getOrbit()[1:]
+    return galpy_ends
+
+
 def trace_cartesian_orbit(xyzuvw_start, times=None, single_age=True,
                           potential=MWPotential2014, ro=8., vo=220.,
                           method='dopr54_c'):
@@ -523,14 +841,17 @@ def trace_cartesian_orbit(xyzuvw_start, times=None, single_age=True,
     Positive times --> traceforward
     Negative times --> traceback
 
-    TODO: Primary source of inefficiencies, 1366.2 (s)
+    Multiple start points are integrated together as one multi-object
+    galpy Orbit (galpy >= 1.5), which yields identical results to
+    integrating each start point separately. Multiple times are taken
+    from that one integration (one per direction of time).
 
     Parameters
     ----------
-    xyzuvw : [pc,pc,pc,km/s,km/s,km/s]
+    xyzuvw : [6] or [nstarts, 6] float array
+        [pc,pc,pc,km/s,km/s,km/s]
     times : (float) or ([ntimes] float array)
-        Myr - time of 0.0 must be present in the array. Times need not be
-        spread linearly.
+        Myr - times need not be spread linearly, nor share a sign.
     single_age: (bool) {True}
         Set this flag if only providing a single age to trace to
     method: str {'odeint'}
@@ -547,9 +868,10 @@ def trace_cartesian_orbit(xyzuvw_start, times=None, single_age=True,
 
     Returns
     -------
-    xyzuvw_tf : [ntimes, 6] array
+    xyzuvw_tf : [6], [nstarts, 6], [ntimes, 6] or [nstarts, ntimes, 6] array
         [pc, pc, pc, km/s, km/s, km/s] - the traced orbit with positions
-        and velocities
+        and velocities. Without `single_age`, each start point has a row
+        per time.
 
     Notes
     -----
@@ -562,7 +884,7 @@ def trace_cartesian_orbit(xyzuvw_start, times=None, single_age=True,
         try:
             if times == 0.:
                 times = 1e-15
-            times = np.array([0., times])
+            times = np.array([times])
         except ValueError as err:
             if not err.args:
                 err.args = ('',)
@@ -571,37 +893,756 @@ def trace_cartesian_orbit(xyzuvw_start, times=None, single_age=True,
             raise
 
     else:
-        raise UserWarning('Multi age orbit integation no longer supported')
-        times = np.array(times)
+        times = np.array(times, dtype=float)
 
     #Make sure we have a float array.
     xyzuvw_starts = np.array(xyzuvw_start).astype(np.float)
 
     # Check if we are doing multiple orbits in one call
-    if len(xyzuvw_starts.shape) == 1:
-        xyzuvw_starts = [xyzuvw_starts]
+    xyzuvw_starts = np.atleast_2d(xyzuvw_starts)
 
-    #Convert to to Galpy times, which go from 0 to 2\pi around the LSR orbit. 
+    #Convert to to Galpy times, which go from 0 to 2\pi around the LSR orbit.
     bovy_times = convert_myr2bovytime(times)
 
     # since the LSR is constant in chron coordinates, the starting point
     # is always treated as time 0
-    xyzuvw_ends = []
-    for xyzuvw_start in xyzuvw_starts:
-        galpy_coords = convert_cart2galpycoords(xyzuvw_start, ts=0.,
-                                                ro=ro, vo=vo)
-        o = Orbit(vxvv=galpy_coords, ro=ro, vo=vo)
-        o.integrate(bovy_times, potential, method=method)
-
-        xyzuvw_ends.append(convert_galpycoords2cart(o.getOrbit(), bovy_times,
-                                          ro=ro, vo=vo)[-1])
-    xyzuvw_ends = np.squeeze(np.array(xyzuvw_ends))
-
-   #  if single_age:
-   #      return xyzuvw[-1]
+    galpy_starts = np.atleast_2d(convert_cart2galpycoords(
+            xyzuvw_starts, ts=0., ro=ro, vo=vo
+    ))
+    galpy_ends = _integrate_galpy_orbits(galpy_starts, bovy_times,
+                                         potential=potential, ro=ro, vo=vo,
+                                         method=method)
+
+    # Convert every (start, time) pair back to cartesian in one call
+    nstarts, ntimes = galpy_ends.shape[:2]
+    xyzuvw_ends = convert_galpycoords2cart(
+            galpy_ends.reshape(-1, 6), np.tile(bovy_times, nstarts),
+            ro=ro, vo=vo,
+    ).reshape(nstarts, ntimes, 6)
+
+    if single_age:
+        return np.squeeze(xyzuvw_ends[:,0])
+    if np.ndim(xyzuvw_start) == 1:
+        return xyzuvw_ends[0]
     return xyzuvw_ends
 
 
+def propagate_many_cartesian_orbits(xyzuvw_starts, ages, h=1e-3,
+                                    potential=MWPotential2014, ro=8., vo=220.,
+                                    method='dopr54_c'):
+    """
+    Trace many start points through the galpy potential, as in
+    `trace_cartesian_orbit`, each to its own age, and also return the
+    Jacobian of each trace.
+
+    Jacobians are taken by central differences with step `h`, as in
+    `transform.calc_jacobian`, but every start point and all 12 of its
+    offset probes are integrated together as one multi-object Orbit, over
+    the sorted union of all ages. Each start point (and its probes) then
+    takes the row at its own age. This replaces 13 separate integrations
+    per start point with one integration per direction of time.
+
+    Parameters
+    ----------
+    xyzuvw_starts : [npoints, 6] float array
+        [pc,pc,pc,km/s,km/s,km/s]
+    ages : [npoints] float array
+        Myr - the age to trace each start point to
+    h : float {1e-3}
+        The step of the finite differences
+
+    Returns
+    -------
+    xyzuvw_ends : [npoints, 6] float array
+    jacs : [npoints, 6, 6] float array
+        jacs[n,i,j] is the derivative of final coordinate i with respect to
+        initial coordinate j, for start point n
+    """
+    xyzuvw_starts = np.atleast_2d(xyzuvw_starts).astype(float)
+    ages = np.array(ages, dtype=float).reshape(-1)
+    ages[ages == 0.] = 1e-15
+    npoints, dim = xyzuvw_starts.shape
+
+    # Each start point, followed by its +h and -h offsets along each axis
+    offsets = np.vstack((np.zeros(dim), h*np.eye(dim), -h*np.eye(dim)))
+    nprobes = len(offsets)
+    probes = (xyzuvw_starts[:,np.newaxis] + offsets).reshape(-1, dim)
+
+    uniq_ages, age_ixs = np.unique(ages, return_inverse=True)
+    bovy_times = convert_myr2bovytime(uniq_ages)
+    galpy_starts = np.atleast_2d(convert_cart2galpycoords(probes, ts=0.,
+                                                          ro=ro, vo=vo))
+    galpy_ends = _integrate_galpy_orbits(galpy_starts, bovy_times,
+                                         potential=potential, ro=ro, vo=vo,
+                                         method=method)
+    probe_age_ixs = np.repeat(age_ixs, nprobes)
+    xyzuvw_probe_ends = convert_galpycoords2cart(
+            galpy_ends[np.arange(len(probes)), probe_age_ixs],
+            bovy_times[probe_age_ixs], ro=ro, vo=vo,
+    ).reshape(npoints, nprobes, dim)
+
+    xyzuvw_ends = xyzuvw_probe_ends[:,0]
+    jacs = (xyzuvw_probe_ends[:,1:dim+1] - xyzuvw_probe_ends[:,dim+1:]) / (2*h)
+    return xyzuvw_ends, np.swapaxes(jacs, 1, 2)
+
+
+# Lets batches of components (each with their own age) be projected with
+# one galpy integration
+trace_cartesian_orbit.propagate_many_with_jacobians = \
+    propagate_many_cartesian_orbits
+
+
+def get_galactocentric_accel_and_hessian(xyz, potential=MWPotential2014):
+    """
+    Acceleration and Hessian of an axisymmetric galpy potential, in
+    galactocentric cartesian coordinates and galpy's natural units.
+
+    Parameters
+    ----------
+    xyz : [3] float array
+        galactocentric position [x, y, z] in units of `ro`
+    potential : galpy potential (or list of potentials)
+
+    Returns
+    -------
+    accel : [3] float array
+        -grad(Phi)
+    hessian : [3,3] float array
+        second derivatives of Phi
+    """
+    x, y, z = xyz
+    R = np.sqrt(x**2 + y**2)
+    R_force = evaluateRforces(potential, R, z, use_physical=False)
+    z_force = evaluatezforces(potential, R, z, use_physical=False)
+    R2_deriv = evaluateR2derivs(potential, R, z, use_physical=False)
+    z2_deriv = evaluatez2derivs(potential, R, z, use_physical=False)
+    Rz_deriv = evaluateRzderivs(potential, R, z, use_physical=False)
+
+    cos_phi = x/R
+    sin_phi = y/R
+    accel = np.array([R_force*cos_phi, R_force*sin_phi, z_force])
+
+    # dPhi/dR = -R_force
+    hessian = np.zeros((3,3))
+    hessian[0,0] = R2_deriv*cos_phi**2 - R_force*sin_phi**2/R
+    hessian[1,1] = R2_deriv*sin_phi**2 - R_force*cos_phi**2/R
+    hessian[0,1] = hessian[1,0] = (R2_deriv + R_force/R)*cos_phi*sin_phi
+    hessian[0,2] = hessian[2,0] = Rz_deriv*cos_phi
+    hessian[1,2] = hessian[2,1] = Rz_deriv*sin_phi
+    hessian[2,2] = z2_deriv
+    return accel, hessian
+
+
+def _integrate_variational_orbit(xyzuvw_start, times, potential=MWPotential2014,
+                                 ro=8., vo=220., rtol=1e-11, atol=1e-12):
+    """
+    Integrate a single star and its state transition matrix to each of
+    `times`, in one integration per direction of time. See
+    `propagate_variational_orbit`.
+
+    Parameters
+    ----------
+    xyzuvw_start : [6] float array
+        [pc,pc,pc,km/s,km/s,km/s]
+    times : [ntimes] float array
+        Myr - any order, and either sign
+
+    Returns
+    -------
+    xyzuvw_ends : [ntimes, 6] float array
+    jacs : [ntimes, 6, 6] float array
+    """
+    pots = potential if isinstance(potential, list) else [potential]
+    if np.any([pot.isNonAxi for pot in pots]):
+        raise UserWarning('Variational orbit integration requires an '
+                          'axisymmetric potential')
+    bovy_times = convert_myr2bovytime(np.atleast_1d(times).astype(float))
+
+    # Chronostar coordinates at t=0 -> galactocentric cartesian (see
+    # convert_cart2galpycoords)
+    X, Y, Z, U, V, W = np.array(xyzuvw_start).astype(float)
+    pos_scale = 1000. * ro
+    state_start = np.array([1. - X/pos_scale, Y/pos_scale, Z/pos_scale,
+                            -U/vo, (V+220.)/vo, W/vo])
+    jac_start = np.diag([-1./pos_scale, 1./pos_scale, 1./pos_scale,
+                         -1./vo, 1./vo, 1./vo])
+
+    def derivs(y, t):
+        pos, vel = y[:3], y[3:6]
+        stm = y[6:].reshape(6,6)
+        accel, hessian = get_galactocentric_accel_and_hessian(pos, potential)
+        stm_derivs = np.vstack((stm[3:], -np.dot(hessian, stm[:3])))
+        return np.hstack((vel, accel, stm_derivs.ravel()))
+
+    # Integrate forwards and backwards from t=0 separately, each through
+    # its times in order of distance from t=0
+    y_start = np.hstack((state_start, np.identity(6).ravel()))
+    y_ends = np.tile(y_start, (len(bovy_times), 1))
+    for mask in (bovy_times > 0., bovy_times < 0.):
+        if np.any(mask):
+            ixs = np.where(mask)[0]
+            ixs = ixs[np.argsort(np.abs(bovy_times[ixs]))]
+            y_ends[ixs] = odeint(derivs, y_start,
+                                 np.hstack((0., bovy_times[ixs])),
+                                 rtol=rtol, atol=atol, mxstep=100000)[1:]
+    state_ends = y_ends[:,:6]
+    stms = y_ends[:,6:].reshape(-1,6,6)
+
+    # Galactocentric cartesian -> chronostar coordinates at the final
+    # time: rotate back by the LSR's azimuthal travel (see
+    # convert_galpycoords2cart)
+    cos_t = np.cos(bovy_times)
+    sin_t = np.sin(bovy_times)
+    rot6 = np.tile(np.identity(6), (len(bovy_times), 1, 1))
+    for offset in (0, 3):
+        rot6[:,offset,offset] = rot6[:,offset+1,offset+1] = cos_t
+        rot6[:,offset,offset+1] = sin_t
+        rot6[:,offset+1,offset] = -sin_t
+    rot_states = np.einsum('tij,tj->ti', rot6, state_ends)
+
+    xyzuvw_ends = np.vstack((
+        pos_scale * (1. - rot_states[:,0]),
+        pos_scale * rot_states[:,1],
+        pos_scale * rot_states[:,2],
+        -vo * rot_states[:,3],
+        vo * (rot_states[:,4] - 1.),
+        vo * rot_states[:,5],
+    )).T
+    jac_ends = np.einsum('i,tij->tij',
+                         [-pos_scale, pos_scale, pos_scale, -vo, vo, vo],
+                         rot6)
+    jacs = np.einsum('tij,tjk,kl->til', jac_ends, stms, jac_start)
+    return xyzuvw_ends, jacs
+
+
+def propagate_variational_orbit(xyzuvw_start, times=None,
+                                potential=MWPotential2014, ro=8., vo=220.,
+                                rtol=1e-11, atol=1e-12):
+    """
+    Trace a single star through an axisymmetric galpy potential while
+    integrating the variational (tangent-linear) equations, returning the
+    current-day position and the Jacobian of the trace from one
+    integration.
+
+    The orbit and its 6x6 state transition matrix are integrated in
+    galpy's galactocentric, inertial cartesian frame, where the
+    variational equations are d(STM)/dt = [[0, I], [-H, 0]] STM, with H
+    the Hessian of the potential. Chronostar coordinates are an affine
+    map of this frame at time 0, and a rotation by the LSR's azimuthal
+    travel (plus offsets) at the final time, so the Jacobian of the whole
+    trace follows exactly.
+
+    Parameters
+    ----------
+    xyzuvw_start : [6] float array
+        [pc,pc,pc,km/s,km/s,km/s]
+    times : float
+        Myr - the (single) age to trace to
+    potential : galpy potential {MWPotential2014}
+        Must be axisymmetric
+    rtol, atol : float
+        Tolerances passed to scipy.integrate.odeint
+
+    Returns
+    -------
+    xyzuvw_end : [6] float array
+        [pc,pc,pc,km/s,km/s,km/s] - agrees with `trace_cartesian_orbit`
+        to within integration tolerances
+    jac : [6,6] float array
+        jac[i,j] is the derivative of final coordinate i with respect to
+        initial coordinate j
+    """
+    if times == 0.:
+        times = 1e-15
+    xyzuvw_ends, jacs = _integrate_variational_orbit(
+            xyzuvw_start, [times], potential=potential, ro=ro, vo=vo,
+            rtol=rtol, atol=atol,
+    )
+    return xyzuvw_ends[0], jacs[0]
+
+
+def trace_variational_orbit(xyzuvw_start, times=None, single_age=True,
+                            potential=MWPotential2014, ro=8., vo=220.):
+    """
+    Equivalent of `trace_cartesian_orbit` that integrates with
+    `propagate_variational_orbit`. Used as a `trace_orbit_func`, components
+    get their current-day mean and covariance matrix from a single
+    integration (via the `propagate_with_jacobian` attribute).
+
+    Parameters
+    ----------
+    xyzuvw_start : [6] or [npoints, 6] float array
+        [pc,pc,pc,km/s,km/s,km/s]
+    times : float -or- [ntimes] float array
+        Myr - the (single) age to trace to, or without `single_age`, the
+        times to trace to
+
+    Returns
+    -------
+    xyzuvw_end : [6] or [npoints, 6] float array
+        or without `single_age`, [ntimes, 6] or [npoints, ntimes, 6]
+    """
+    xyzuvw_starts = np.atleast_2d(xyzuvw_start)
+    if not single_age:
+        # Every time comes from the one integration (per direction)
+        xyzuvw_ends = np.array([
+            _integrate_variational_orbit(start, times, potential=potential,
+                                         ro=ro, vo=vo)[0]
+            for start in xyzuvw_starts
+        ])
+        if np.ndim(xyzuvw_start) == 1:
+            return xyzuvw_ends[0]
+        return xyzuvw_ends
+    xyzuvw_ends = [
+        propagate_variational_orbit(start, times=times, potential=potential,
+                                    ro=ro, vo=vo)[0]
+        for start in xyzuvw_starts
+    ]
+    return np.squeeze(np.array(xyzuvw_ends))
+
+
+trace_variational_orbit.propagate_with_jacobian = propagate_variational_orbit
+
+
+# Emulator nodes for each of the curvilinear coordinates xi, zeta, xidot,
+# etadot, zetadot [pc, pc, km/s, km/s, km/s], see convert_cart2curvilin.
+# Chronostar components are born within a few hundred pc of the LSR.
+# No nodes are needed along eta, as rotating a start point about the
+# Galactic axis (shifting its eta) shifts its orbit's eta alike. Nor
+# below the plane, as mirroring a start point in the plane mirrors its orbit
+DEFAULT_EMULATOR_NODES = (
+    np.linspace(-300., 300., 5),
+    np.linspace(0., 150., 3),
+    np.linspace(-20., 20., 5),
+    np.linspace(-20., 20., 5),
+    np.linspace(-10., 10., 5),
+)
+# Ages tabulated by the emulator, spanning lnprior's MAX_AGE [Myr]
+DEFAULT_EMULATOR_AGES = np.linspace(0., 500., 101)
+# The curvilinear coordinates spanned by an emulator's nodes
+EMULATOR_DIMS = [0, 2, 3, 4, 5]
+# Mirrors curvilinear coordinates in the Galactic plane
+_PLANE_MIRROR = np.array([1., 1., -1., 1., 1., -1.])
+
+
+def _add_emulator_splines(emulator):
+    """
+    Add the (unstored) cubic spline coefficients, in age, of every
+    anchor's end point and Jacobian to an emulator dictionary.
+    Coefficients have shape [4, nages-1, nanchors, ...], as
+    scipy.interpolate.CubicSpline.c
+    """
+    ages = emulator['ages']
+    emulator['endpoint_coeffs'] = CubicSpline(ages, emulator['endpoints'],
+                                              axis=1).c
+    emulator['jacobian_coeffs'] = CubicSpline(ages, emulator['jacobians'],
+                                              axis=1).c
+    node_counts = emulator['node_counts']
+    emulator['node_arrays'] = np.split(emulator['nodes'],
+                                       np.cumsum(node_counts)[:-1])
+    return emulator
+
+
+def build_orbit_emulator(ages=None, nodes=None, potential=MWPotential2014,
+                         ro=8., vo=220., filename=None, rtol=1e-10,
+                         atol=1e-11):
+    """
+    Tabulate the end point and Jacobian of orbits through `potential` on a
+    grid of ages and local phase-space offsets (anchors), such that
+    `propagate_emulated_orbit` can interpolate rather than integrate.
+
+    Anchors are placed in curvilinear coordinates (see
+    `convert_cart2curvilin`) at eta = 0 and zeta >= 0. Orbits of any other
+    eta, or below the plane, follow exactly by symmetry of the
+    (axisymmetric) potential. End points and Jacobians are tabulated in
+    curvilinear coordinates too.
+
+    Each anchor needs one integration (see `_integrate_variational_orbit`)
+    covering every age, so building the default emulator takes about
+    twenty minutes. This is intended to be done once, offline.
+
+    Parameters
+    ----------
+    ages : [nages] float array {DEFAULT_EMULATOR_AGES}
+        Myr - ascending. Traces are only emulated within this range.
+        Include negative ages to emulate tracebacks.
+    nodes : list of 5 float arrays {DEFAULT_EMULATOR_NODES}
+        The ascending nodes along each of xi, zeta, xidot, etadot, zetadot
+        [pc, pc, km/s, km/s, km/s]. The anchors are every combination of
+        these. Nodes along zeta should start at 0.
+    potential : galpy potential {MWPotential2014}
+        Must be axisymmetric
+    filename : str {None}
+        If provided, the emulator is stored here (as a .npz file), to be
+        retrieved with load_orbit_emulator
+    rtol, atol : float
+        Tolerances passed to scipy.integrate.odeint
+
+    Returns
+    -------
+    emulator : dict
+        'ages': [nages] float array
+        'nodes': [sum(node_counts)] float array
+            the nodes of each dimension, concatenated
+        'node_counts': [5] int array
+        'endpoints': [nanchors, nages, 6] float array
+            in curvilinear coordinates
+        'jacobians': [nanchors, nages, 6, 6] float array
+            of the curvilinear end point with respect to the curvilinear
+            start point
+        'ro', 'vo': float
+        along with spline coefficients that are not stored.
+    """
+    if ages is None:
+        ages = DEFAULT_EMULATOR_AGES
+    if nodes is None:
+        nodes = DEFAULT_EMULATOR_NODES
+    ages = np.array(ages, dtype=float)
+    nodes = [np.array(dim_nodes, dtype=float) for dim_nodes in nodes]
+
+    # Anchors are ordered such that np.ravel_multi_index over the node
+    # indices gives an anchor's index
+    anchors = np.zeros((np.prod([len(dim_nodes) for dim_nodes in nodes]), 6))
+    anchors[:,EMULATOR_DIMS] = list(itertools.product(*nodes))
+    endpoints = np.zeros((len(anchors), len(ages), 6))
+    jacobians = np.zeros((len(anchors), len(ages), 6, 6))
+    for anchor_ix, anchor in enumerate(anchors):
+        logging.debug('Emulating anchor {} of {}'.format(anchor_ix + 1,
+                                                         len(anchors)))
+        xyzuvw_start = convert_curvilin2cart(anchor, ro=ro, vo=vo)
+        xyzuvw_ends, cart_jacs = _integrate_variational_orbit(
+                xyzuvw_start, ages, potential=potential, ro=ro, vo=vo,
+                rtol=rtol, atol=atol,
+        )
+        endpoints[anchor_ix] = convert_cart2curvilin(xyzuvw_ends, ro=ro,
+                                                     vo=vo)
+        jacobians[anchor_ix] = np.einsum(
+                'nij,njk,kl->nil',
+                get_cart2curvilin_jacobian(xyzuvw_ends, ro=ro, vo=vo),
+                cart_jacs,
+                get_curvilin2cart_jacobian(anchor, ro=ro, vo=vo),
+        )
+
+    emulator = {
+        'ages':ages,
+        'nodes':np.hstack(nodes),
+        'node_counts':np.array([len(dim_nodes) for dim_nodes in nodes]),
+        'endpoints':endpoints,
+        'jacobians':jacobians,
+        'ro':ro,
+        'vo':vo,
+    }
+    if filename is not None:
+        np.savez_compressed(filename, **emulator)
+    return _add_emulator_splines(emulator)
+
+
+def load_orbit_emulator(filename):
+    """
+    Load an orbit emulator stored by build_orbit_emulator
+    """
+    with np.load(filename) as stored:
+        emulator = {key:stored[key] for key in stored.files}
+    return _add_emulator_splines(emulator)
+
+
+def propagate_emulated_orbit(xyzuvw_start, times=None, emulator=None):
+    """
+    Emulate the trace of one or many stars, and its Jacobian, from
+    tabulated orbits (see `build_orbit_emulator`).
+
+    Stars are converted to curvilinear coordinates, mirrored above the
+    plane and shifted to eta = 0 (see `build_orbit_emulator`). The end
+    points and Jacobians of the anchors at the corners of each star's
+    grid cell are cubic spline interpolated to the age. The Jacobian at
+    the star is their multilinear interpolation. The end point is the
+    multilinear blend of each corner's expansion to the star, where each
+    expansion uses the mean of the corner's and the star's Jacobian (the
+    trapezoid rule). Emulated end points are therefore exact for orbits
+    that are quadratic in the start point, and errors grow with the cube
+    of the node spacing. They can be measured with
+    `validate_orbit_emulator`.
+
+    Parameters
+    ----------
+    xyzuvw_start : [6] or [npoints, 6] float array
+        [pc,pc,pc,km/s,km/s,km/s]
+    times : float -or- [npoints] float array
+        Myr - the age to trace to (or that of each star), within the
+        emulator's ages
+    emulator : dict -or- str
+        The output of build_orbit_emulator, or the file it was stored in
+
+    Returns
+    -------
+    xyzuvw_end : [6] or [npoints, 6] float array
+        [pc,pc,pc,km/s,km/s,km/s]
+    jac : [6,6] or [npoints, 6, 6] float array
+        jac[i,j] is the derivative of final coordinate i with respect to
+        initial coordinate j
+    """
+    if type(emulator) is str:
+        emulator = load_orbit_emulator(emulator)
+    ages = emulator['ages']
+    if np.any(np.asarray(times) < ages[0]) or \
+            np.any(np.asarray(times) > ages[-1]):
+        raise UserWarning('Age {} is outside the range of the orbit '
+                          'emulator ({} to {} Myr)'.format(times, ages[0],
+                                                           ages[-1]))
+    ro, vo = emulator['ro'], emulator['vo']
+    xyzuvw_starts = np.atleast_2d(xyzuvw_start).astype(float)
+    star_ages = np.broadcast_to(times, len(xyzuvw_starts))
+
+    curv_starts = convert_cart2curvilin(xyzuvw_starts, ro=ro, vo=vo)
+    below = curv_starts[:,2] < 0
+    curv_starts[below] *= _PLANE_MIRROR
+    etas = np.copy(curv_starts[:,1])
+    curv_starts[:,1] = 0.
+
+    # The lower corner of each star's grid cell, and the star's fractional
+    # position within the cell. Stars outside the grid are extrapolated
+    # from the outermost cell. Dimensions with a single node have
+    # one-node cells
+    lower_ixs = []
+    fracs = []
+    for dim, dim_nodes in zip(EMULATOR_DIMS, emulator['node_arrays']):
+        if len(dim_nodes) == 1:
+            lower_ixs.append(np.zeros(len(curv_starts), dtype=int))
+            fracs.append(np.zeros(len(curv_starts)))
+            continue
+        dim_ixs = np.clip(np.searchsorted(dim_nodes, curv_starts[:,dim])
+                          - 1, 0, len(dim_nodes) - 2)
+        lower_ixs.append(dim_ixs)
+        fracs.append((curv_starts[:,dim] - dim_nodes[dim_ixs])
+                     / (dim_nodes[dim_ixs+1] - dim_nodes[dim_ixs]))
+
+    # Evaluate the anchors' splines at each star's age
+    age_ixs = np.clip(np.searchsorted(ages, star_ages, side='right') - 1,
+                      0, len(ages) - 2)
+    powers = (star_ages - ages[age_ixs])[:,np.newaxis] \
+             ** np.arange(3, -1, -1)
+
+    weighted_ends = np.zeros((len(curv_starts), 6))
+    curv_jacs = np.zeros((len(curv_starts), 6, 6))
+    mean_corners = np.zeros((len(curv_starts), 6))
+    corner_steps = itertools.product(*[
+        [0] if len(dim_nodes) == 1 else [0, 1]
+        for dim_nodes in emulator['node_arrays']
+    ])
+    for steps in corner_steps:
+        node_ixs = [dim_ixs + step
+                    for dim_ixs, step in zip(lower_ixs, steps)]
+        weights = np.prod([
+            frac if step else 1. - frac
+            for frac, step in zip(fracs, steps)
+        ], axis=0)
+        corners = np.zeros((len(curv_starts), 6))
+        corners[:,EMULATOR_DIMS] = np.array([
+            dim_nodes[dim_ixs]
+            for dim_nodes, dim_ixs in zip(emulator['node_arrays'], node_ixs)
+        ]).T
+        anchor_ixs = np.ravel_multi_index(node_ixs, emulator['node_counts'])
+
+        corner_ends = np.einsum(
+                'nk,kni->ni', powers,
+                emulator['endpoint_coeffs'][:,age_ixs,anchor_ixs],
+        )
+        corner_jacs = np.einsum(
+                'nk,knij->nij', powers,
+                emulator['jacobian_coeffs'][:,age_ixs,anchor_ixs],
+        )
+        weighted_ends += weights[:,np.newaxis] * (
+            corner_ends + 0.5 * np.einsum('nij,nj->ni', corner_jacs,
+                                          curv_starts - corners)
+        )
+        curv_jacs += weights[:,np.newaxis,np.newaxis] * corner_jacs
+        mean_corners += weights[:,np.newaxis] * corners
+
+    # The star's half of each corner's trapezoid
+    curv_ends = weighted_ends + 0.5 * np.einsum(
+            'nij,nj->ni', curv_jacs, curv_starts - mean_corners
+    )
+
+    # Undo the shift and mirroring
+    curv_ends[:,1] += etas
+    curv_ends[below] *= _PLANE_MIRROR
+    curv_jacs[below] *= _PLANE_MIRROR[:,np.newaxis] * _PLANE_MIRROR
+
+    xyzuvw_ends = convert_curvilin2cart(curv_ends, ro=ro, vo=vo)
+    jacs = np.einsum('nij,njk,nkl->nil',
+                     get_curvilin2cart_jacobian(curv_ends, ro=ro, vo=vo),
+                     curv_jacs,
+                     get_cart2curvilin_jacobian(xyzuvw_starts, ro=ro, vo=vo))
+    if np.ndim(xyzuvw_start) == 1:
+        return xyzuvw_ends[0], jacs[0]
+    return xyzuvw_ends, jacs
+
+
+def trace_emulated_orbit(xyzuvw_start, times=None, single_age=True,
+                         emulator=None):
+    """
+    Equivalent of `trace_cartesian_orbit` that interpolates tabulated
+    orbits with `propagate_emulated_orbit`. Use `trace_orbit_emulator_builder`
+    to get a `trace_orbit_func`.
+
+    Parameters
+    ----------
+    xyzuvw_start : [6] or [npoints, 6] float array
+        [pc,pc,pc,km/s,km/s,km/s]
+    times : float -or- [ntimes] float array
+        Myr - the (single) age to trace to, or without `single_age`, the
+        times to trace to
+    emulator : dict -or- str
+        The output of build_orbit_emulator, or the file it was stored in
+
+    Returns
+    -------
+    xyzuvw_end : [6] or [npoints, 6] float array
+        or without `single_age`, [ntimes, 6] or [npoints, ntimes, 6]
+    """
+    if not single_age:
+        # Emulate each (start, time) pair with its own age
+        times = np.array(times, dtype=float)
+        xyzuvw_starts = np.atleast_2d(xyzuvw_start)
+        xyzuvw_ends = propagate_emulated_orbit(
+                np.repeat(xyzuvw_starts, len(times), axis=0),
+                times=np.tile(times, len(xyzuvw_starts)), emulator=emulator,
+        )[0].reshape(len(xyzuvw_starts), len(times), 6)
+        if np.ndim(xyzuvw_start) == 1:
+            return xyzuvw_ends[0]
+        return xyzuvw_ends
+    return propagate_emulated_orbit(xyzuvw_start, times=times,
+                                    emulator=emulator)[0]
+
+
+class OrbitEmulator(object):
+    """
+    A replica of trace_cartesian_orbit that interpolates the tabulated
+    orbits of an emulator (see `build_orbit_emulator`), with
+    `propagate_with_jacobian` and `propagate_many_with_jacobians`
+    methods, so components' covariance matrices are projected with the
+    tabulated Jacobians.
+
+    Unlike a closure, this can be pickled, and so handed to worker
+    processes under any start method. An emulator loaded from a file is
+    pickled as just the filename. Otherwise the tables are pickled
+    without their (recomputable) spline coefficients.
+    """
+    def __init__(self, emulator):
+        """
+        Parameters
+        ----------
+        emulator : dict -or- str
+            The output of build_orbit_emulator, or the file it was stored
+            in
+        """
+        self.filename = None
+        if type(emulator) is str:
+            self.filename = emulator
+            emulator = load_orbit_emulator(emulator)
+        self.emulator = emulator
+
+    def __call__(self, xyzuvw_start, times=None, single_age=True):
+        return trace_emulated_orbit(xyzuvw_start, times=times,
+                                    single_age=single_age,
+                                    emulator=self.emulator)
+
+    def propagate_with_jacobian(self, xyzuvw_start, times=None):
+        return propagate_emulated_orbit(xyzuvw_start, times=times,
+                                        emulator=self.emulator)
+
+    # Each star may have its own age
+    propagate_many_with_jacobians = propagate_with_jacobian
+
+    def __getstate__(self):
+        if self.filename is not None:
+            return {'filename':self.filename}
+        spline_keys = ('endpoint_coeffs', 'jacobian_coeffs', 'node_arrays')
+        return {'emulator':{key:val for key, val in self.emulator.items()
+                            if key not in spline_keys}}
+
+    def __setstate__(self, state):
+        if 'filename' in state:
+            self.__init__(state['filename'])
+        else:
+            self.__init__(_add_emulator_splines(state['emulator']))
+
+
+def trace_orbit_emulator_builder(emulator):
+    """
+    Build a replica of trace_cartesian_orbit that interpolates the
+    tabulated orbits of `emulator` (a dict from build_orbit_emulator, or
+    the file it was stored in). See `OrbitEmulator`.
+    """
+    return OrbitEmulator(emulator)
+
+
+def validate_orbit_emulator(emulator, potential=MWPotential2014,
+                            nvalidate=100, seed=0, method='dopr54_c'):
+    """
+    Compare emulated traces against direct galpy integration (see
+    `trace_cartesian_orbit`), for random start points within the span of
+    the emulator's nodes (either side of the plane, and with eta spanning
+    the same range as xi), and random ages within its range.
+
+    Parameters
+    ----------
+    emulator : dict -or- str
+        The output of build_orbit_emulator, or the file it was stored in
+    potential : galpy potential {MWPotential2014}
+        The potential the emulator was built with
+    nvalidate : int {100}
+        Number of random traces to validate
+    seed : int {0}
+        Seed for the random start points and ages
+    method : str {'dopr54_c'}
+        galpy integration method, see `trace_cartesian_orbit`
+
+    Returns
+    -------
+    report : dict
+        'nvalidate': the number of traces validated
+        'max_pos_err', 'median_pos_err': statistics of the distance [pc]
+            between emulated and integrated end points
+        'max_vel_err', 'median_vel_err': likewise for the velocity [km/s]
+    """
+    if type(emulator) is str:
+        emulator = load_orbit_emulator(emulator)
+    rand = np.random.RandomState(seed)
+    lower = [dim_nodes[0] for dim_nodes in emulator['node_arrays']]
+    upper = [dim_nodes[-1] for dim_nodes in emulator['node_arrays']]
+    curv_starts = np.zeros((nvalidate, 6))
+    curv_starts[:,EMULATOR_DIMS] = rand.uniform(lower, upper,
+                                                size=(nvalidate, 5))
+    # Either side of the plane, and over the same range in eta as in xi
+    curv_starts[:,2] *= rand.choice([-1, 1], size=nvalidate)
+    curv_starts[:,1] = rand.uniform(lower[0], upper[0], size=nvalidate)
+    starts = convert_curvilin2cart(curv_starts, ro=emulator['ro'],
+                                   vo=emulator['vo'])
+    ages = rand.uniform(emulator['ages'][0], emulator['ages'][-1],
+                        size=nvalidate)
+
+    errs = np.array([
+        propagate_emulated_orbit(start, age, emulator=emulator)[0]
+        - trace_cartesian_orbit(start, age, potential=potential,
+                                ro=emulator['ro'], vo=emulator['vo'],
+                                method=method)
+        for start, age in zip(starts, ages)
+    ])
+    pos_errs = np.linalg.norm(errs[:,:3], axis=1)
+    vel_errs = np.linalg.norm(errs[:,3:], axis=1)
+    report = {
+        'nvalidate':nvalidate,
+        'max_pos_err':np.max(pos_errs),
+        'median_pos_err':np.median(pos_errs),
+        'max_vel_err':np.max(vel_errs),
+        'median_vel_err':np.median(vel_errs),
+    }
+    logging.info('Orbit emulator validation (pc, km/s errors): '
+                 '{}'.format(report))
+    return report
+
+
 def trace_many_cartesian_orbit(xyzuvw_starts, times=None, single_age=True,
                                savefile=''):
     """
@@ -630,22 +1671,16 @@ def trace_many_cartesian_orbit(xyzuvw_starts, times=None, single_age=True,
         and velocities
         If single_age is set, output is [nstars, 6] array
     """
-    if single_age:
-        ntimes = 1
-    else:
-        times = np.array(times)
-        ntimes = times.shape[0]
-
+    xyzuvw_starts = np.atleast_2d(xyzuvw_starts)
     nstars = xyzuvw_starts.shape[0]
     logging.debug("Nstars: {}".format(nstars))
 
     if single_age:
-        xyzuvw_to = np.zeros((nstars, 6))
+        xyzuvw_to = trace_cartesian_orbit(xyzuvw_starts, times,
+                                          single_age=True).reshape(nstars, 6)
     else:
-        xyzuvw_to = np.zeros((nstars, ntimes, 6))
-    for st_ix in range(nstars):
-        xyzuvw_to[st_ix] = trace_cartesian_orbit(xyzuvw_starts[st_ix], times,
-                                                 single_age=single_age)
+        xyzuvw_to = trace_cartesian_orbit(xyzuvw_starts, times,
+                                          single_age=False)
     #TODO: test this
     if savefile:
         np.save(savefile, xyzuvw_to)
@@ -93,10 +93,18 @@ def calc_jacobian(trans_func, loc, dim=6, h=1e-3, args=None):
     The application of `trans_func` is the bottleneck of Chronostar
     (at least when `trans_func` is traceorbit.trace_cartesian_orbit).
     Since this is a loop, there is scope for parallelisation.
+
+    If `trans_func` has a `propagate_with_jacobian` attribute (e.g.
+    traceorbit.trace_epicyclic_orbit), taking the same arguments as
+    `trans_func` and returning the transformed position along with the
+    Jacobian, it is used instead of finite differences.
     """
     if args is None:
         args = []
 
+    if hasattr(trans_func, 'propagate_with_jacobian'):
+        return trans_func.propagate_with_jacobian(loc, *args)[1]
+
     jac = np.zeros((dim, dim))
 
     # Even with epicyclic, this constitutes 90% of chronostar work
@@ -51,7 +51,7 @@ overlaps = expectmax.get_all_lnoverlaps(data_dict, comps)
 print('overlaps.shape', overlaps.shape, len(comps))
 
 # MEMBERSHIP PROBABILITIES
-membership_probabilities = np.array([expectmax.calc_membership_probs(ol) for ol in overlaps])
+membership_probabilities = expectmax.calc_membership_probs(overlaps, inplace=True)
 
 # Create a table
 for i in range(membership_probabilities.shape[1]-1):
@@ -63,7 +63,7 @@ print('overlaps.shape', overlaps.shape, len(comps))
 if 'background_log_overlap' not in data_table.colnames:
     print('WARNING: Please provide background overlaps first!!')
     #~ exit()
-membership_probabilities = np.array([expectmax.calc_membership_probs(ol) for ol in overlaps])
+membership_probabilities = expectmax.calc_membership_probs(overlaps, inplace=True)
 
 comps_fits = Table.read(comps_filename.replace('.npy', '.fits'))
 
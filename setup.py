@@ -45,6 +45,14 @@ try:
 except AttributeError:
     numpy_include = numpy.get_numpy_include()
 
+# OpenMP is used to split the overlap calculations across threads. The
+# default OSX compiler breaks with these flags, so there the C module
+# is built serial (the threaded entry points still work, on one thread)
+if sys.platform == 'darwin':
+    openmp_args = []
+else:
+    openmp_args = ['-fopenmp']
+
 # &TC added extra directory
 _overlap = Extension("chronostar/_overlap",
                     ["chronostar/overlap/overlap.i", "chronostar/overlap/overlap.c"],
@@ -55,6 +63,8 @@ _overlap = Extension("chronostar/_overlap",
 #                   extra_compile_args = ["-Xclang -fopenmp -lomp"],
 # MJI Remove these flags that now make the default OSX compiler break.
 #                   extra_compile_args = ["-floop-parallelize-all","-ftree-parallelize-loops=4"],
+                    extra_compile_args = openmp_args,
+                    extra_link_args = openmp_args,
                     )
 
 setup(name="chronostar",
@@ -149,6 +149,28 @@ def test_simple_projection():
         assert np.allclose(comp.get_covmatrix(), comp.get_covmatrix_now(),
                            atol=1e-4)
 
+def test_projection_with_jacobian():
+    """
+    Components whose trace_orbit_func provides a Jacobian project to the
+    same current day distribution as with finite differences
+    """
+    from chronostar import traceorbit
+    for trace_orbit_func in [traceorbit.trace_epicyclic_orbit,
+                             traceorbit.trace_variational_orbit]:
+        for name, ComponentClass in COMPONENT_CLASSES.items():
+            comp = ComponentClass(pars=DEFAULT_PARS[name],
+                                  trace_orbit_func=trace_orbit_func)
+            mean_now, cov_now = comp.get_currentday_projection()
+
+            fd_comp = ComponentClass(
+                    pars=DEFAULT_PARS[name],
+                    trace_orbit_func=lambda loc, times:
+                            trace_orbit_func(loc, times=times),
+            )
+            assert np.allclose(mean_now, fd_comp.get_mean_now())
+            assert np.allclose(cov_now, fd_comp.get_covmatrix_now(),
+                               rtol=1e-5)
+
 def test_split_group_age():
     """
     Splitting group by provided ages yields identical initial cov matrix,
@@ -172,6 +194,27 @@ def test_split_group_age():
                            atol=1e-4)
 
 
+def test_split_group_ages_custom_trace_orbit_func():
+    """
+    A trace_orbit_func with just the documented (xyzuvw_start, times)
+    signature is called once per age
+    """
+    calls = []
+    def dummy_trace_orbit_func(loc, times=None):
+        calls.append(times)
+        return loc + times
+
+    comp = SphereComponent(pars=DEFAULT_PARS['sphere'],
+                           trace_orbit_func=dummy_trace_orbit_func)
+    ages = [5., 10., 20.]
+    split_comps = comp.split_group_ages(ages)
+    mean_now = comp.get_mean_now()
+    assert calls == [comp.get_age(), -5., -10., -20.]
+    for age, split_comp in zip(ages, split_comps):
+        assert age == split_comp.get_age()
+        assert np.allclose(mean_now - age, split_comp.get_mean())
+
+
 def test_load_components():
     single_filename = 'temp_data/single_comp.npy'
     multi_filename = 'temp_data/multi_comp.npy'
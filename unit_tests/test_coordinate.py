@@ -221,7 +221,6 @@ def test_convertLSRXYZUVWToAstrometry():
 
 
 def test_convertManyLSRXYZUVWToAstrometry():
-    return
     xyzuvw_bp_helio = np.array([-3.4, -16.4, -9.9, -11.0, -16.0, -9.1])
     xyzuvw_bp_lsr =  xyzuvw_bp_helio + XYZUVWSOLARNOW_pc
     astr_bp = [ # astrometry from wikiepdia
@@ -251,6 +250,25 @@ def test_convertManyLSRXYZUVWToAstrometry():
 
 
 
+def test_convertManyMatchesSingle():
+    """Check batched conversions agree with star-by-star conversions"""
+    np.random.seed(0)
+    xyzuvw_lsrs = np.random.randn(20,6) * [100., 100., 50., 10., 10., 5.]
+
+    astros = cc.convert_many_lsrxyzuvw2astrometry(xyzuvw_lsrs)
+    for xyzuvw_lsr, astro in zip(xyzuvw_lsrs, astros):
+        assert np.allclose(cc.convert_lsrxyzuvw2astrometry(xyzuvw_lsr), astro)
+
+    xyzuvws = cc.convert_many_astrometry2lsrxyzuvw(astros)
+    for astro, xyzuvw in zip(astros, xyzuvws):
+        assert np.allclose(cc.convert_astrometry2lsrxyzuvw(astro), xyzuvw)
+    assert np.allclose(xyzuvws, xyzuvw_lsrs)
+
+    # A single star still yields a [1,6] array
+    assert cc.convert_many_lsrxyzuvw2astrometry(xyzuvw_lsrs[:1]).shape ==\
+           (1,6)
+
+
 def test_internalConsistency():
     '''
     Take a starting LSR cartesian mean, convert to RA, DEC directly and
@@ -4,6 +4,7 @@ sample_par_files) and confirm the resulting table has been modified
 in the correct way.
 '''
 from astropy.table import Table
+import multiprocessing
 import numpy as np
 import os.path
 import pytest
@@ -118,6 +119,164 @@ def test_bg_overlaps():
 
     assert not np.any(np.isnan(result[data_pars['bg_col_name']]))
 
+def test_calc_background_overlaps_resumable(tmp_path):
+    """
+    Check that chunked, parallel background overlaps match the serial
+    calculation, and that a checkpointed calculation resumes from its
+    finished chunks
+    """
+    nbgstars = 200
+    background_means = np.random.randn(nbgstars, 6) * 20.
+    nstars = 23
+    star_means = np.random.randn(nstars, 6) * 20.
+    star_covs = np.array(nstars * [np.identity(6)])
+
+    serial_ols = datatool.calc_background_overlaps(
+            background_means, star_means, star_covs, chunk_size=nstars,
+    )
+    parallel_ols = datatool.calc_background_overlaps(
+            background_means, star_means, star_covs, chunk_size=5,
+            nprocesses=2,
+    )
+    assert np.allclose(serial_ols, parallel_ols)
+
+    checkpoint_dir = str(tmp_path / 'bg_ols_checkpoints')
+    datatool.calc_background_overlaps(
+            background_means, star_means, star_covs, chunk_size=5,
+            checkpoint_dir=checkpoint_dir,
+    )
+    # Tamper with a finished chunk, and remove another as though the
+    # run crashed, so only the removed chunk is recalculated
+    chunk_files = sorted(f for f in os.listdir(checkpoint_dir)
+                         if f.startswith('bg_ols_chunk'))
+    assert len(chunk_files) == 5
+    np.save(os.path.join(checkpoint_dir, chunk_files[0]), np.zeros(5))
+    os.remove(os.path.join(checkpoint_dir, chunk_files[1]))
+    resumed_ols = datatool.calc_background_overlaps(
+            background_means, star_means, star_covs, chunk_size=5,
+            checkpoint_dir=checkpoint_dir,
+    )
+    assert np.all(resumed_ols[:5] == 0.)
+    assert np.allclose(resumed_ols[5:], serial_ols[5:])
+
+    # Checkpoints from different stars, or a different background
+    # reference, are refused
+    with pytest.raises(UserWarning):
+        datatool.calc_background_overlaps(
+                background_means, star_means + 1., star_covs, chunk_size=5,
+                checkpoint_dir=checkpoint_dir,
+        )
+    with pytest.raises(UserWarning):
+        datatool.calc_background_overlaps(
+                background_means + 1., star_means, star_covs, chunk_size=5,
+                checkpoint_dir=checkpoint_dir,
+        )
+
+
+def test_calc_background_overlaps_closes_pool(monkeypatch):
+    """
+    Check that the pool of worker processes is shut down when calculating
+    a chunk fails
+    """
+    class FailingPool(object):
+        instances = []
+
+        def __init__(self, nprocesses, initializer, initargs):
+            initializer(*initargs)
+            self.calls = []
+            FailingPool.instances.append(self)
+
+        def imap_unordered(self, func, tasks):
+            yield func(tasks[0])
+            raise ValueError('chunk failed')
+
+        def terminate(self):
+            self.calls.append('terminate')
+
+        def close(self):
+            self.calls.append('close')
+
+        def join(self):
+            self.calls.append('join')
+
+    monkeypatch.setattr(datatool, 'Pool', FailingPool)
+    background_means = np.random.randn(50, 6) * 20.
+    star_means = np.random.randn(10, 6) * 20.
+    star_covs = np.array(10 * [np.identity(6)])
+    with pytest.raises(ValueError):
+        datatool.calc_background_overlaps(
+                background_means, star_means, star_covs, chunk_size=5,
+                nprocesses=2,
+        )
+    assert FailingPool.instances[0].calls == ['terminate', 'close', 'join']
+
+
+def test_background_overlap_store(tmp_path):
+    """
+    Check that stored background overlaps are retrieved by source_id,
+    that later additions replace earlier ones, and that each background
+    reference has its own store
+    """
+    store_dir = str(tmp_path / 'bg_ols_store')
+    background_means = np.random.randn(100, 6) * 20.
+    bg_store = datatool.BackgroundOverlapStore(store_dir, background_means)
+    assert len(bg_store) == 0
+
+    source_ids = np.array([50, 3, 1000000000000000007, 12])
+    bg_lnols = np.array([-10., -11., -12., -13.])
+    bg_store.add(source_ids, bg_lnols)
+    bg_store.add([3, 7], [-20., -21.])
+    assert len(bg_store) == 5
+
+    found_lnols, found = bg_store.lookup([12, 3, 4, 1000000000000000007, 7])
+    assert np.all(found == [True, True, False, True, True])
+    assert np.all(found_lnols[found] == [-13., -20., -12., -21.])
+    assert np.isnan(found_lnols[2])
+
+    other_store = datatool.BackgroundOverlapStore(store_dir,
+                                                  background_means + 1.)
+    assert other_store.store_file != bg_store.store_file
+    assert not np.any(other_store.lookup(source_ids)[1])
+
+
+def _add_to_store(store_dir, background_means, source_ids):
+    bg_store = datatool.BackgroundOverlapStore(store_dir, background_means)
+    for source_id in source_ids:
+        bg_store.add([source_id], [-float(source_id)])
+
+
+@pytest.mark.skipif(datatool.fcntl is None,
+                    reason='Requires file locking')
+def test_background_overlap_store_concurrent(tmp_path):
+    """
+    Check that processes adding to a shared store at the same time never
+    lose each other's additions
+    """
+    store_dir = str(tmp_path / 'bg_ols_store')
+    background_means = np.random.randn(100, 6) * 20.
+    nprocesses = 4
+    nadditions = 25
+    processes = [
+        multiprocessing.Process(
+                target=_add_to_store,
+                args=(store_dir, background_means,
+                      range(i*nadditions, (i+1)*nadditions)),
+        )
+        for i in range(nprocesses)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    bg_store = datatool.BackgroundOverlapStore(store_dir, background_means)
+    source_ids = np.arange(nprocesses * nadditions)
+    found_lnols, found = bg_store.lookup(source_ids)
+    assert np.all(found)
+    assert np.all(found_lnols == -source_ids)
+
+
 def test_attempted_overwrite():
     # TODO: test the case where this fails while everything else is valid
     data_pars = {
@@ -132,6 +132,59 @@ def test_get_lnoverlaps():
     assert np.allclose(ln_overlaps, sorted(ln_overlaps)[::-1])
 
 
+def test_batch_get_lnoverlaps():
+    """
+    Confirms the vectorised numpy overlap implementation matches the
+    per-star implementation, both for well separated stars and for
+    stars with strongly correlated covariance matrices.
+    """
+    dim = 6
+    nstars = 50
+    np.random.seed(0)
+    g_mn = np.random.randn(dim) * 10.
+    g_cov = np.identity(dim) * 4.
+    g_cov[0,3] = g_cov[3,0] = 1.5
+
+    st_mns = g_mn + np.random.randn(nstars, dim) * 20.
+    rand_mats = np.random.randn(nstars, dim, dim)
+    st_covs = np.einsum('nij,nkj->nik', rand_mats, rand_mats) \
+              + 1e-2 * np.identity(dim)
+
+    slow_lnols = likelihood.slow_get_lnoverlaps(g_cov, g_mn, st_covs, st_mns)
+    batch_lnols = likelihood.batch_get_lnoverlaps(g_cov, g_mn,
+                                                  st_covs, st_mns, nstars)
+
+    assert np.all(np.isfinite(batch_lnols))
+    assert np.allclose(slow_lnols, batch_lnols, rtol=1e-10, atol=1e-10)
+
+
+def test_get_lnoverlaps_many_comps():
+    """
+    Confirms that evaluating many components at once yields the same
+    overlaps as evaluating each component in turn.
+    """
+    dim = 6
+    comps = [
+        SphereComponent(attributes={
+            'mean':np.ones(dim) * offset,
+            'covmatrix':np.identity(dim) * (1. + offset),
+            'age':1e-10,
+        })
+        for offset in [0., 3., 10.]
+    ]
+    synth_data = SynthData(pars=[comps[0].get_pars()], starcounts=50,
+                           measurement_error=1e-2)
+    synth_data.synthesise_everything()
+    tabletool.convert_table_astro2cart(synth_data.table)
+    data = tabletool.build_data_dict_from_table(synth_data.table)
+
+    many_lnols = likelihood.get_lnoverlaps_many_comps(comps, data)
+    assert many_lnols.shape == (50, len(comps))
+    for i, comp in enumerate(comps):
+        assert np.allclose(many_lnols[:,i],
+                           likelihood.get_lnoverlaps(comp, data))
+
+
 def test_lnprob_func():
     """
     Generates two components. Generates a synthetic data set based on the
@@ -184,3 +237,125 @@ def test_lnprob_func():
     # Check that the different realisations only differ by 20%
     assert np.isclose(lnprob_comp1_data1, lnprob_comp2_data2, rtol=2e-1)
     assert np.isclose(lnprob_comp1_data2, lnprob_comp2_data1, rtol=2e-1)
+
+
+def test_active_star_set():
+    """
+    Confirms that the lnprob of a component is unchanged when the data
+    is provided as a prepared ActiveStarSet.
+    """
+    dim = 6
+    comp = SphereComponent(attributes={
+        'mean':np.zeros(dim),
+        'covmatrix':np.identity(dim),
+        'age':1e-10,
+    })
+    star_count = 100
+    synth_data = SynthData(pars=[comp.get_pars()], starcounts=star_count,
+                           measurement_error=1e-2)
+    synth_data.synthesise_everything()
+    tabletool.convert_table_astro2cart(synth_data.table)
+    data = tabletool.build_data_dict_from_table(synth_data.table)
+
+    # Include some stars with negligible membership
+    memb_probs = np.random.rand(star_count)
+    memb_probs[:20] = 1e-8
+
+    active_stars = likelihood.ActiveStarSet(data, memb_probs)
+    assert len(active_stars) == star_count - 20
+    assert active_stars['covs'].flags['C_CONTIGUOUS']
+
+    for pars in [comp.get_emcee_pars(),
+                 comp.get_emcee_pars() + np.random.rand(len(comp.get_pars()))]:
+        assert np.isclose(
+                likelihood.lnprob_func(pars, data, memb_probs),
+                likelihood.lnprob_func(pars, active_stars, memb_probs),
+        )
+    # memberships are stored for the prior if not provided explicitly
+    assert np.isclose(
+            likelihood.lnprob_func(comp.get_emcee_pars(), data, memb_probs),
+            likelihood.lnprob_func(comp.get_emcee_pars(), active_stars),
+    )
+
+
+def test_overlap_cache():
+    """
+    Confirms that the overlap cache reproduces freshly calculated overlaps,
+    counts hits and misses, distinguishes components and datasets, and
+    respects its memory budget
+    """
+    dim = 6
+    comps = [
+        SphereComponent(attributes={
+            'mean':np.ones(dim) * offset,
+            'covmatrix':np.identity(dim),
+            'age':1e-10,
+        })
+        for offset in [0., 3., 10.]
+    ]
+    nstars = 50
+    synth_data = SynthData(pars=[comps[0].get_pars()], starcounts=nstars,
+                           measurement_error=1e-2)
+    synth_data.synthesise_everything()
+    tabletool.convert_table_astro2cart(synth_data.table)
+    data = tabletool.build_data_dict_from_table(synth_data.table)
+
+    lnol_cache = likelihood.OverlapCache()
+    assert lnol_cache.lookup(comps[0], data) is None
+    lnols = likelihood.get_lnoverlaps(comps[0], data)
+    lnol_cache.store(comps[0], data, lnols)
+    assert np.array_equal(lnol_cache.lookup(comps[0], data), lnols)
+    assert (lnol_cache.hits, lnol_cache.misses) == (1, 1)
+
+    # A different component, or an equal but distinct dataset
+    assert lnol_cache.lookup(comps[1], data) is None
+    other_data = {'means':data['means'] + 1., 'covs':data['covs']}
+    assert lnol_cache.lookup(comps[0], other_data) is None
+    copied_data = {'means':np.copy(data['means']),
+                   'covs':np.copy(data['covs'])}
+    assert lnol_cache.lookup(comps[0], copied_data) is not None
+
+    # Budget of two columns evicts the least recently used
+    lnol_cache = likelihood.OverlapCache(max_bytes=2 * nstars * 8)
+    for comp in comps:
+        lnol_cache.store(comp, data, likelihood.get_lnoverlaps(comp, data))
+    assert len(lnol_cache) == 2
+    assert lnol_cache.evictions == 1
+    assert lnol_cache.lookup(comps[0], data) is None
+    assert lnol_cache.lookup(comps[2], data) is not None
+
+
+def test_lnprob_func_batch():
+    """
+    Confirms that scoring many walkers in one batched call matches scoring
+    each walker with lnprob_func, including walkers outside the prior.
+    """
+    from chronostar import traceorbit
+    np.random.seed(0)
+    star_count = 50
+    data = {
+        'means':np.random.randn(star_count, 6) * [20, 20, 20, 2, 2, 2],
+        'covs':np.array([np.diag(np.random.rand(6) + 1.)
+                         for _ in range(star_count)]),
+    }
+    memb_probs = np.random.rand(star_count)
+    active_stars = likelihood.ActiveStarSet(data, memb_probs)
+
+    nwalkers = 6
+    pars = np.array([0., 0., 0., 0., 0., 0., np.log(10.), np.log(1.), 5.]) \
+           + np.random.randn(nwalkers, 9) * [5, 5, 5, 1, 1, 1, .2, .2, 2]
+    pars[0,-1] = -1.    # negative age
+    pars[1,6] = 20.     # enormous position spread
+
+    for trace_orbit_func in [traceorbit.trace_epicyclic_orbit,
+                             traceorbit.trace_cartesian_orbit]:
+        seq_lnprobs = [
+            likelihood.lnprob_func(walker_pars, active_stars, memb_probs,
+                                   trace_orbit_func)
+            for walker_pars in pars
+        ]
+        batch_lnprobs = likelihood.lnprob_func_batch(
+                pars, data, memb_probs, trace_orbit_func=trace_orbit_func,
+        )
+        assert np.all(np.isinf(batch_lnprobs[:2]))
+        assert np.allclose(batch_lnprobs, seq_lnprobs)
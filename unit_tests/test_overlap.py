@@ -12,7 +12,11 @@ sys.path.insert(0, '..')
 
 import chronostar.compfitter as gf
 from chronostar.likelihood import slow_get_lnoverlaps as p_lno
+from chronostar.likelihood import batch_get_lnoverlaps as b_lno
 from chronostar._overlap import get_lnoverlaps as c_lno
+from chronostar._overlap import get_lnoverlaps_multi as c_lno_multi
+from chronostar._overlap import get_lnoverlaps_threaded as c_lno_threaded
+from chronostar import _overlap
 from chronostar.component import SphereComponent
 from chronostar.synthdata import SynthData
 from chronostar import tabletool
@@ -188,5 +192,129 @@ def test_swigImplementation():
     assert np.isfinite(p_lnos).all()
     assert np.isfinite(c_lnos).all()
 
+
+def test_batchImplementation():
+    """
+    Compares the vectorised python fallback against the swigged c
+    implementation
+    """
+    true_comp_mean = np.zeros(6)
+    true_comp_covmatrix = np.identity(6)
+    true_comp_covmatrix[:3,:3] *= 2.**2
+    true_comp_covmatrix[3:,3:] *= 2.**2
+    true_comp = SphereComponent(attributes={
+        'mean':true_comp_mean,
+        'covmatrix':true_comp_covmatrix,
+        'age':1e-10,
+    })
+    nstars = 100
+    synth_data = SynthData(pars=true_comp.get_pars(), starcounts=nstars)
+    synth_data.synthesise_everything()
+    tabletool.convert_table_astro2cart(synth_data.table)
+
+    star_data = tabletool.build_data_dict_from_table(synth_data.table)
+
+    b_lnos = b_lno(true_comp.get_covmatrix(), true_comp.get_mean(),
+                   star_data['covs'], star_data['means'], nstars)
+    c_lnos = c_lno(true_comp.get_covmatrix(), true_comp.get_mean(),
+                   star_data['covs'], star_data['means'], nstars)
+
+    assert np.allclose(b_lnos, c_lnos, rtol=1e-10, atol=1e-10)
+
+def test_multiCompImplementation():
+    """
+    Compares the multi-component c implementation against calling the
+    single component implementation once per component
+    """
+    nstars = 100
+    comp_means = np.array([np.zeros(6), np.ones(6), 5*np.ones(6)])
+    comp_covs = np.array([np.identity(6) * s for s in [4., 1., 9.]])
+    ncomps = len(comp_means)
+
+    true_comp = SphereComponent(attributes={
+        'mean':comp_means[0],
+        'covmatrix':comp_covs[0],
+        'age':1e-10,
+    })
+    synth_data = SynthData(pars=true_comp.get_pars(), starcounts=nstars)
+    synth_data.synthesise_everything()
+    tabletool.convert_table_astro2cart(synth_data.table)
+    star_data = tabletool.build_data_dict_from_table(synth_data.table)
+
+    multi_lnos = c_lno_multi(comp_covs, comp_means,
+                             star_data['covs'], star_data['means'],
+                             nstars*ncomps, 1).reshape(nstars, ncomps)
+    for i in range(ncomps):
+        c_lnos = c_lno(comp_covs[i], comp_means[i],
+                       star_data['covs'], star_data['means'], nstars)
+        assert np.allclose(multi_lnos[:,i], c_lnos)
+
+def test_threadedImplementation():
+    """
+    Confirms the threaded c implementation is bit-identical to the serial
+    one, regardless of thread count
+    """
+    comp_mean = np.zeros(6)
+    comp_cov = np.identity(6) * 4.
+    true_comp = SphereComponent(attributes={
+        'mean':comp_mean,
+        'covmatrix':comp_cov,
+        'age':1e-10,
+    })
+    nstars = 1001
+    synth_data = SynthData(pars=true_comp.get_pars(), starcounts=nstars)
+    synth_data.synthesise_everything()
+    tabletool.convert_table_astro2cart(synth_data.table)
+    star_data = tabletool.build_data_dict_from_table(synth_data.table)
+
+    serial_lnos = c_lno(comp_cov, comp_mean,
+                        star_data['covs'], star_data['means'], nstars)
+    for nthreads in [1, 2, 3, 8]:
+        threaded_lnos = c_lno_threaded(comp_cov, comp_mean,
+                                       star_data['covs'], star_data['means'],
+                                       nstars, nthreads)
+        assert np.array_equal(serial_lnos, threaded_lnos)
+
+    multi_lnos = c_lno_multi(np.array([comp_cov]), np.array([comp_mean]),
+                             star_data['covs'], star_data['means'],
+                             nstars, 4)
+    assert np.array_equal(serial_lnos, multi_lnos)
+
+def test_lnoverlapMethods():
+    """
+    Compares the specialised 6x6 Cholesky method against the generic gsl
+    LU method, including for a star whose summed covariance is not
+    positive definite (where the Cholesky method defers to LU)
+    """
+    comp_mean = np.zeros(6)
+    comp_cov = np.identity(6) * 4.
+    true_comp = SphereComponent(attributes={
+        'mean':comp_mean,
+        'covmatrix':comp_cov,
+        'age':1e-10,
+    })
+    nstars = 100
+    synth_data = SynthData(pars=true_comp.get_pars(), starcounts=nstars)
+    synth_data.synthesise_everything()
+    tabletool.convert_table_astro2cart(synth_data.table)
+    star_data = tabletool.build_data_dict_from_table(synth_data.table)
+
+    # Make one summed covariance matrix indefinite
+    star_data['covs'][0] = -star_data['covs'][0] - 2*comp_cov
+
+    orig_method = _overlap.get_lnoverlap_method()
+    try:
+        _overlap.set_lnoverlap_method(_overlap.LNOVERLAP_GSL_LU)
+        lu_lnos = c_lno(comp_cov, comp_mean,
+                        star_data['covs'], star_data['means'], nstars)
+        _overlap.set_lnoverlap_method(_overlap.LNOVERLAP_CHOLESKY)
+        chol_lnos = c_lno(comp_cov, comp_mean,
+                          star_data['covs'], star_data['means'], nstars)
+    finally:
+        _overlap.set_lnoverlap_method(orig_method)
+
+    assert np.allclose(lu_lnos, chol_lnos, rtol=1e-10)
+    assert lu_lnos[0] == chol_lnos[0]
+
 if __name__ == '__main__':
     test_pythonFuncs()
@@ -10,6 +10,8 @@
 import logging
 import numpy as np
 import sys
+import time
+import tracemalloc
 
 sys.path.insert(0, '..')
 
@@ -63,3 +65,109 @@ def test_compare_two_overlap_implementations():
     assert np.isfinite(ln_bg_ols_kde).all()
     assert np.isfinite(ln_bg_ols_cov).all()
 
+
+
+def test_background_mixture(tmp_path):
+    """
+    Check that compressing the background into a Gaussian mixture recovers
+    the exact background overlaps when there is one mixture component per
+    background star, and that stored mixtures are loaded unchanged
+    """
+    nbgstars = 300
+    background_means = np.random.randn(nbgstars, 6)
+    background_means[:, :3] *= 100.
+    background_means[:, 3:] *= 10.
+
+    n_sample_stars = 10
+    star_means = np.random.randn(n_sample_stars, 6)
+    star_means[:,:3] *= 100.
+    star_means[:,3:] *= 10.
+    star_covs = np.array(n_sample_stars * [np.identity(6)])
+
+    bg_mixture = expectmax.compress_background(background_means,
+                                               ncomps=nbgstars)
+    assert np.isclose(np.sum(bg_mixture['amps']), nbgstars)
+    report = expectmax.validate_background_mixture(
+            bg_mixture, background_means, star_means, star_covs,
+    )
+    assert report['nvalidate'] == n_sample_stars
+    assert report['max_abs_err'] < 1e-8
+
+    # A compressed mixture still conserves the number of background stars
+    mixture_file = str(tmp_path / 'bg_mixture.npz')
+    bg_mixture = expectmax.compress_background(background_means, ncomps=20,
+                                               filename=mixture_file)
+    assert np.isclose(np.sum(bg_mixture['amps']), nbgstars)
+    loaded_mixture = expectmax.load_background_mixture(mixture_file)
+    assert np.allclose(
+            expectmax.get_background_overlaps_with_mixture(
+                    bg_mixture, star_means, star_covs),
+            expectmax.get_background_overlaps_with_mixture(
+                    loaded_mixture, star_means, star_covs),
+    )
+
+
+def test_tree_kernel_densities():
+    """
+    Check that tree-approximated kernel densities are within the requested
+    relative tolerance of the exact kernel densities, including the
+    inversion of Z and W and the scaling by amp_scale
+    """
+    nbgstars = 3000
+    background_means = np.random.randn(nbgstars, 6)
+    background_means[:, :3] *= 100.
+    background_means[:, 3:] *= 10.
+
+    n_sample_stars = 50
+    star_means = np.random.randn(n_sample_stars, 6)
+    star_means[:,:3] *= 100.
+    star_means[:,3:] *= 10.
+    # A star far from every background star
+    star_means[0] = [5000., 0., 0., 0., 0., 0.]
+    # A star whose mirror image coincides with a background star
+    star_means[1] = background_means[0] * np.array([1., 1., -1., 1., 1., -1.])
+
+    for rtol in [1e-2, 1e-5]:
+        ln_bg_ols_kde = expectmax.get_kernel_densities(
+                background_means, star_means, amp_scale=0.1,
+        )
+        ln_bg_ols_tree = expectmax.get_kernel_densities(
+                background_means, star_means, amp_scale=0.1, rtol=rtol,
+        )
+        assert np.all(np.abs(np.exp(ln_bg_ols_tree - ln_bg_ols_kde) - 1.)
+                      <= rtol)
+
+
+def test_tree_kernel_densities_cost():
+    """
+    Check that tree-approximated kernel densities are faster than the exact
+    kernel densities, and that their memory overhead is bounded rather
+    than growing with the number of star-background pairs
+    """
+    nbgstars = 20000
+    background_means = np.random.randn(nbgstars, 6)
+    background_means[:, :3] *= 100.
+    background_means[:, 3:] *= 10.
+    star_means = np.random.randn(1000, 6)
+    star_means[:,:3] *= 100.
+    star_means[:,3:] *= 10.
+
+    def measure(rtol):
+        tracemalloc.start()
+        start = time.time()
+        ln_bg_ols = expectmax.get_kernel_densities(background_means,
+                                                   star_means, rtol=rtol)
+        duration = time.time() - start
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return ln_bg_ols, duration, peak_memory
+
+    ln_bg_ols_kde, kde_duration, kde_memory = measure(rtol=None)
+    ln_bg_ols_tree, tree_duration, tree_memory = measure(rtol=1e-3)
+
+    assert np.all(np.abs(np.exp(ln_bg_ols_tree - ln_bg_ols_kde) - 1.)
+                  <= 1e-3)
+    assert tree_duration < kde_duration
+    # A few [block_size, max_pairs] work arrays on top of the exact path,
+    # far less than the 160MB of all star-background pairs
+    assert tree_memory < kde_memory + 4 * 8 * 2**18
@@ -0,0 +1,237 @@
+from __future__ import print_function, division
+
+import json
+import numpy as np
+import os
+import pytest
+import sys
+import time
+
+sys.path.insert(0,'..')
+
+from chronostar import expectmax
+from chronostar import parentfit
+from chronostar.naivefit import NaiveFit
+
+
+class FakeComponentPool(object):
+    """Records shutdowns in place of expectmax.ComponentPool"""
+    def __init__(self, nworkers=1):
+        self.nworkers = nworkers
+        self.trace_orbit_func = None
+        self.nshutdowns = 0
+        self.shutdown_time = None
+
+    def shutdown(self):
+        self.nshutdowns += 1
+        self.shutdown_time = time.time()
+
+
+class FakePool(object):
+    """Records its use in place of multiprocessing.Pool"""
+    def __init__(self, nprocesses):
+        self.nprocesses = nprocesses
+        self.calls = []
+
+    def close(self):
+        self.calls.append(('close', time.time()))
+
+    def join(self):
+        self.calls.append(('join', time.time()))
+
+
+class FakeEMFit(NaiveFit):
+    """
+    Replaces the EM fits of NaiveFit with fakes that sleep for a given
+    time per candidate, and log where and when they ran in their run
+    directory, from where later calls load them
+    """
+    parent_pid = None
+    durations = {}
+    fail_labels = []
+
+    def run_em_unless_loadable(self, run_dir):
+        label = os.path.basename(os.path.normpath(run_dir))
+        result = {'comps':[label], 'med_and_spans':None, 'memb_probs':None}
+        log_file = os.path.join(run_dir, 'fit_log.json')
+        if os.path.exists(log_file):
+            return result
+
+        pid = os.getpid()
+        if pid != self.parent_pid and label in self.fail_labels:
+            raise RuntimeError('Fit of {} failed'.format(label))
+        start = time.time()
+        time.sleep(self.durations.get(label, 0.))
+        with open(log_file, 'w') as fp:
+            json.dump({'pid':pid, 'start':start, 'end':time.time(),
+                       'ncomp_workers':self.fit_pars['comp_pool'].nworkers},
+                      fp)
+        return result
+
+    def calc_score(self, comps, memb_probs, use_box_background=False):
+        return {'bic':float(ord(comps[0][0])), 'lnlike':0., 'lnpost':0.}
+
+
+def make_fit(fit_pars, FitClass=NaiveFit):
+    """A fit with just `fit_pars`, skipping data preparation"""
+    fit = FitClass.__new__(FitClass)
+    fit.fit_pars = fit_pars
+    return fit
+
+
+def test_run_fit_shuts_down_component_pool():
+    """
+    The component pool's workers are stopped whether the fit finishes
+    or fails, and when used as a context manager
+    """
+    comp_pool = FakeComponentPool()
+    fit = make_fit({'comp_pool':comp_pool})
+    fit._run_fit = lambda: ('result', 'score')
+    assert fit.run_fit() == ('result', 'score')
+    assert comp_pool.nshutdowns == 1
+
+    def failing_run_fit():
+        raise RuntimeError('EM failed')
+    fit._run_fit = failing_run_fit
+    with pytest.raises(RuntimeError):
+        fit.run_fit()
+    assert comp_pool.nshutdowns == 2
+
+    with make_fit({'comp_pool':comp_pool}) as fit:
+        pass
+    assert comp_pool.nshutdowns == 3
+
+    # Without a component pool there is nothing to stop
+    make_fit({}).close()
+
+
+def test_run_em_concurrently(tmp_path, monkeypatch):
+    """
+    Candidates are fitted concurrently, sharing the component workers,
+    a candidate that fails in its process is refitted in serial, and
+    results are returned in the order of the candidates. The parent's
+    pools are stopped before forking, and the emcee pool is recreated
+    """
+    monkeypatch.setattr(parentfit, 'Pool', FakePool)
+    comp_pool = FakeComponentPool(5)
+    pool = FakePool(2)
+    fit = make_fit({'nsplit_workers':2, 'split_nthreads':1,
+                    'nthreads':2, 'comp_pool':comp_pool, 'pool':pool,
+                    'race_splits':False, 'use_box_background':False,
+                    'init_comps':None},
+                   FitClass=FakeEMFit)
+    fit.parent_pid = os.getpid()
+    fit.durations = {'A':1., 'C':0.2}
+    fit.fail_labels = ['B']
+    labels = ['A', 'B', 'C']
+    run_dirs = []
+    for label in labels:
+        run_dir = str(tmp_path / label) + '/'
+        os.mkdir(run_dir)
+        run_dirs.append(run_dir)
+    fit.build_split_candidates = \
+        lambda prev_result, ncomps: (run_dirs, [[label] for label in labels])
+
+    failed = fit.run_em_concurrently(run_dirs, [[label] for label in labels])
+    assert failed == [run_dirs[1]]
+
+    logs = {}
+    for label, run_dir in zip(labels, run_dirs):
+        if label != 'B':
+            with open(run_dir + 'fit_log.json') as fp:
+                logs[label] = json.load(fp)
+    # C was started once B failed, while A was still fitting
+    assert logs['A']['start'] < logs['C']['start'] < logs['A']['end']
+    for log in logs.values():
+        assert log['pid'] != fit.parent_pid
+        assert log['ncomp_workers'] == 2
+
+    # Both pools were stopped before the first child started, and a new
+    # emcee pool replaced the closed one
+    assert comp_pool.nshutdowns == 1
+    assert comp_pool.shutdown_time < logs['A']['start']
+    assert [call for call, _ in pool.calls] == ['close', 'join']
+    assert pool.calls[-1][1] < logs['A']['start']
+    assert fit.fit_pars['pool'] is not pool
+    assert fit.fit_pars['pool'].nprocesses == 2
+
+    # A and C are loaded, and B is fitted in serial
+    all_results, all_scores = fit.run_split_candidates(None, 2)
+    assert [result['comps'] for result in all_results] == [['A'], ['B'], ['C']]
+    assert [score['bic'] for score in all_scores] == \
+           [float(ord(label)) for label in labels]
+    with open(run_dirs[1] + 'fit_log.json') as fp:
+        log = json.load(fp)
+    assert log['pid'] == fit.parent_pid
+    assert log['ncomp_workers'] == 5
+
+
+def test_race_split_candidates(tmp_path, monkeypatch):
+    """
+    Candidates trailing the leader are paused, and resumed from where
+    they left off once the leader falls back. The race ends once every
+    candidate has converged or is paused, and candidates left paused get
+    no result and a BIC of infinity
+    """
+    # The BIC of each EM iteration of each candidate. A candidate
+    # converges when it runs out of iterations before its budget
+    all_bics = {
+        'A':[100., 90., 97., 98., 90.],
+        'B':[100., 99., 70., 65., 60.],
+        'C':[100., 92., 93., 94., 95., 96., 97., 98., 99., 100.],
+    }
+    calls = []
+    def fake_fit_many_comps(data, ncomps, rdir, max_em_iterations,
+                            **kwargs):
+        label = os.path.basename(os.path.normpath(rdir))
+        bic_file = os.path.join(rdir, 'bic_list.npy')
+        niters = len(np.load(bic_file)) if os.path.exists(bic_file) else 0
+        calls.append((label, niters, max_em_iterations))
+        np.save(bic_file, all_bics[label][:max_em_iterations])
+    monkeypatch.setattr(expectmax, 'fit_many_comps', fake_fit_many_comps)
+
+    fit = make_fit({'race_em_iterations':2, 'max_em_iterations':10,
+                    'race_bic_margin':5., 'nsplit_workers':1,
+                    'use_box_background':False, 'init_comps':None,
+                    'comp_pool':FakeComponentPool()},
+                   FitClass=FakeEMFit)
+    fit.data_dict = None
+    fit.parent_pid = os.getpid()
+    labels = ['A', 'B', 'C']
+    run_dirs = []
+    for label in labels:
+        run_dir = str(tmp_path / label) + '/'
+        os.mkdir(run_dir)
+        run_dirs.append(run_dir)
+    fit.build_split_candidates = \
+        lambda prev_result, ncomps: (run_dirs, [[label] for label in labels])
+    fit.calc_score = lambda comps, memb_probs, use_box_background: {
+        'bic':np.min(all_bics[comps[0]]), 'lnlike':0., 'lnpost':0.,
+    }
+
+    all_results, all_scores = fit.race_split_candidates(None, 2)
+
+    assert calls == [
+        # B trails A by more than the margin, so is paused
+        ('A', 0, 2), ('B', 0, 2), ('C', 0, 2),
+        # A falls behind C, bringing B back within the margin
+        ('A', 2, 4), ('C', 2, 4),
+        # A converges, B resumes where it left off and takes the lead,
+        # and C is paused
+        ('A', 4, 6), ('B', 2, 4), ('C', 4, 6),
+        # B converges, ending the race
+        ('B', 4, 6),
+    ]
+    assert [result['comps'] for result in all_results[:2]] == [['A'], ['B']]
+    assert all_results[2] is None
+    assert [score['bic'] for score in all_scores] == [90., 60., np.inf]
+    assert np.nanargmin([score['bic'] for score in all_scores]) == 1
+
+    # Racing is left to NaiveFit, so the candidates of the helper it
+    # shares with SmartFit are all fitted to convergence
+    fit.fit_pars['race_splits'] = True
+    del calls[:]
+    all_results, all_scores = fit.run_split_candidates(None, 2)
+    assert calls == []
+    assert [result['comps'] for result in all_results] == \
+           [['A'], ['B'], ['C']]
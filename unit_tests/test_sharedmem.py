@@ -0,0 +1,53 @@
+"""
+Test sharing arrays between processes through shared memory
+"""
+import multiprocessing
+import numpy as np
+import pytest
+import sys
+
+sys.path.insert(0, '..')
+from chronostar import sharedmem
+
+pytestmark = pytest.mark.skipif(not sharedmem.shared_memory_avail,
+                                reason='Requires python 3.8+')
+
+
+def double_row(i, data_specs, results_specs):
+    shared_data = sharedmem.SharedArrays.attach(data_specs)
+    shared_results = sharedmem.SharedArrays.attach(results_specs)
+    shared_results['doubled'][i] = 2 * shared_data['means'][i]
+    shared_results['done'][i] = True
+    shared_data.close()
+    shared_results.close()
+
+
+def test_publishAndAttach():
+    """Check data published by one process are seen by another"""
+    means = np.random.rand(5, 6)
+
+    shared_data = sharedmem.SharedArrays()
+    shared_data.publish('means', means)
+    assert np.all(shared_data['means'] == means)
+
+    shared_results = sharedmem.SharedArrays()
+    shared_results.allocate('doubled', means.shape)
+    shared_results.allocate('done', (len(means),), dtype=bool)
+    assert not np.any(shared_results['done'])
+
+    jobs = [multiprocessing.Process(target=double_row,
+                                    args=(i, shared_data.specs,
+                                          shared_results.specs))
+            for i in range(0, len(means), 2)]
+    for job in jobs:
+        job.start()
+    for job in jobs:
+        job.join()
+
+    assert np.all(shared_results['done'] == [True, False, True, False, True])
+    assert np.allclose(shared_results['doubled'][::2], 2 * means[::2])
+    assert np.all(shared_results['doubled'][1::2] == 0.)
+
+    shared_data.close()
+    shared_results.close()
+    assert 'means' not in shared_data
@@ -589,6 +589,49 @@ def test_build_data_from_incomplete_table():
     assert len(star_pars['covs']) == np.sum(np.logical_not(nan_mask))
 
 
+
+def test_convertManyAstroToCart():
+    """
+    Check closed form conversion of many stars matches finite differencing
+    """
+    astr_data = tabletool.build_data_dict_from_table(
+            table=HIST_FILE_NAME, cartesian=False, historical=False)
+    astr_means = astr_data['means']
+    astr_covs = astr_data['covs']
+
+    cart_means, cart_covs = tabletool.convert_many_astro2cart(astr_means,
+                                                              astr_covs)
+
+    assert np.allclose(
+            cart_means,
+            coordinate.convert_many_astrometry2lsrxyzuvw(astr_means))
+    assert np.allclose(
+            cart_covs,
+            transformAstrCovsToCartesian(astr_covs, astr_means),
+            rtol=1e-4, atol=1e-6)
+
+
+def test_convertTableAstroToCartSkipsBadRows():
+    """
+    Check rows with missing astrometry are skipped without misaligning
+    the remaining rows
+    """
+    table = Table.read(CURR_FILE_NAME)[:10]
+    cart_colnames = np.hstack(tabletool.get_colnames(cartesian=True))
+    table.remove_columns([col for col in cart_colnames
+                          if col in table.colnames])
+    bad_ix = 3
+    table['parallax'][bad_ix] = np.nan
+    tabletool.convert_table_astro2cart(table)
+
+    assert np.isnan(table['X'][bad_ix])
+    for ix in [0, bad_ix + 1, len(table) - 1]:
+        astr_mean = [table[col][ix] for col in
+                     ['ra', 'dec', 'parallax', 'pmra', 'pmdec',
+                      'radial_velocity']]
+        cart_mean = coordinate.convert_astrometry2lsrxyzuvw(astr_mean)
+        assert np.allclose(cart_mean, [table[dim][ix] for dim in 'XYZUVW'])
+
 if __name__ == '__main__':
     test_transform_astrocart()
     test_convertAstrTableToCart()
@@ -23,6 +23,7 @@ convenience a brief summary of Galpy coordinates is provided:
 """
 
 import logging
+import pickle
 import numpy as np
 import pytest
 import sys
@@ -171,7 +172,6 @@ def test_rotatedLSR():
         # Should be initialised on opposite side of galaxy (X = 16kpc)
         assert np.allclose(16000., xyzuvws[0,0])
 
-@pytest.mark.skip(reason="Multi age tracing cancelled")
 def test_singleTime():
     """Test usage where we only provide the desired age, and not an array
 
@@ -467,6 +467,21 @@ def test_multi_traceback_and_forward():
         init_pos = torb.trace_cartesian_orbit(final_pos, -time)
         assert np.allclose(pos, init_pos, atol=1e-3)
 
+def test_batched_trace_cartesian_orbit():
+    """
+    Check that tracing many start points in one call matches tracing
+    each start point on its own
+    """
+    np.random.seed(0)
+    NPOSITIONS = 10
+    init_positions = np.random.rand(NPOSITIONS, 6) * 20 - 10
+    age = 25.
+    batch_final_pos = torb.trace_cartesian_orbit(init_positions, age)
+    assert batch_final_pos.shape == (NPOSITIONS, 6)
+    for pos, batch_pos in zip(init_positions, batch_final_pos):
+        assert np.allclose(torb.trace_cartesian_orbit(pos, age), batch_pos,
+                           rtol=1e-12, atol=1e-12)
+
 def test_interval_tracing():
     np.random.seed(0)
     start = np.random.rand(6) * 20 - 10
@@ -538,6 +553,200 @@ def test_multi_coordinate_epicyclic():
     assert np.allclose(start_seq_res, start_arr_res)
 
 
+def test_epicyclic_jacobian():
+    """
+    Check the analytic epicyclic Jacobian matches finite differences, and
+    that many start points traced together match individual tracing
+    """
+    from chronostar import transform
+    np.random.seed(0)
+    starts = np.random.rand(12, 6) * 100 - 50
+    for start, age in zip(starts, [0., 5., 30., -20., 200.]):
+        final_pos, analytic_jac = torb.propagate_epicyclic_orbit(start, age)
+        assert np.array_equal(final_pos,
+                              torb.trace_epicyclic_orbit(start, age))
+        # Wrapping hides the `propagate_with_jacobian` attribute, forcing
+        # finite differences
+        numeric_jac = transform.calc_jacobian(
+                lambda loc, times: torb.trace_epicyclic_orbit(loc, times),
+                start, args=(age,),
+        )
+        assert np.allclose(analytic_jac, numeric_jac, rtol=1e-6, atol=1e-8)
+        assert np.array_equal(
+                transform.calc_jacobian(torb.trace_epicyclic_orbit, start,
+                                        args=(age,)),
+                analytic_jac,
+        )
+
+    age = 10.
+    seq_res = np.array([torb.trace_epicyclic_orbit(start, age)
+                        for start in starts])
+    assert np.allclose(seq_res, torb.trace_epicyclic_orbit(starts, age))
+
+
+def test_propagate_many_epicyclic_orbits():
+    """
+    Check batched epicyclic traces, each to its own age, match tracing
+    each star separately
+    """
+    np.random.seed(0)
+    starts = np.random.rand(5, 6) * 100 - 50
+    ages = np.array([0., 5., 30., -20., 200.])
+    ends, jacs = torb.propagate_many_epicyclic_orbits(starts, ages)
+    for start, age, end, jac in zip(starts, ages, ends, jacs):
+        seq_end, seq_jac = torb.propagate_epicyclic_orbit(start, age)
+        assert np.allclose(end, seq_end)
+        assert np.allclose(jac, seq_jac)
+
+
+def test_propagate_many_cartesian_orbits():
+    """
+    Check batched galpy traces, each to its own age, match tracing each
+    star separately, with finite-difference Jacobians
+    """
+    from chronostar import transform
+    np.random.seed(0)
+    starts = np.random.rand(4, 6) * 100 - 50
+    ages = np.array([0., 5., 12., 5.])
+    assert torb.trace_cartesian_orbit.propagate_many_with_jacobians is \
+           torb.propagate_many_cartesian_orbits
+    ends, jacs = torb.propagate_many_cartesian_orbits(starts, ages)
+    assert ends.shape == (4, 6)
+    assert jacs.shape == (4, 6, 6)
+    for start, age, end, jac in zip(starts, ages, ends, jacs):
+        assert np.allclose(end, torb.trace_cartesian_orbit(start, age),
+                           atol=1e-3)
+        seq_jac = transform.calc_jacobian(torb.trace_cartesian_orbit,
+                                          start, args=(age,))
+        assert np.allclose(jac, seq_jac, rtol=1e-3, atol=1e-2)
+
+
+def test_multi_age_tracing():
+    """
+    Check tracing to many times in one call matches tracing to each time
+    separately, for each propagator
+    """
+    np.random.seed(0)
+    starts = np.random.rand(3, 6) * 100 - 50
+    times = np.array([0., 5., 30., -20., -3.])
+    for trace_func in [torb.trace_cartesian_orbit,
+                       torb.trace_epicyclic_orbit,
+                       torb.trace_variational_orbit]:
+        multi_res = trace_func(starts, times, single_age=False)
+        assert multi_res.shape == (3, len(times), 6)
+        assert np.allclose(multi_res[0],
+                           trace_func(starts[0], times, single_age=False))
+        for start, start_res in zip(starts, multi_res):
+            for time, time_res in zip(times, start_res):
+                assert np.allclose(time_res, trace_func(start, time),
+                                   atol=1e-6)
+
+def test_variational_orbit():
+    """
+    Check the orbit and Jacobian integrated together match galpy's orbit
+    and finite differences
+    """
+    from chronostar import transform
+    np.random.seed(0)
+    starts = np.random.rand(3, 6) * 100 - 50
+    for start, age in zip(starts, [0., 30., -200.]):
+        final_pos, var_jac = torb.propagate_variational_orbit(start, age)
+        assert np.allclose(final_pos,
+                           torb.trace_cartesian_orbit(start, age,
+                                                      method='odeint'),
+                           atol=1e-3)
+        numeric_jac = transform.calc_jacobian(
+                lambda loc, times: torb.trace_variational_orbit(loc, times),
+                start, args=(age,),
+        )
+        assert np.allclose(var_jac, numeric_jac, rtol=0.,
+                           atol=1e-6 * np.abs(var_jac).max())
+
+
+def test_orbit_emulator(tmp_path):
+    """
+    Check emulated traces and Jacobians match integration at and near the
+    anchors, and survive being stored and pickled
+    """
+    nodes = [[-20., 20.], [0.], [0.], [0.], [0.]]
+    ages = np.linspace(-20., 30., 26)
+    emu_file = str(tmp_path / 'orbit_emulator.npz')
+    emulator = torb.build_orbit_emulator(ages=ages, nodes=nodes,
+                                         filename=emu_file)
+    trace_func = torb.trace_orbit_emulator_builder(emu_file)
+
+    starts = np.array([[-20., 0., 0., 0., 0., 0.],
+                       [15., 3., -2., 0.5, -0.3, 0.2]])
+    for age in [0., 12.3, -17.]:
+        emu_ends, emu_jacs = trace_func.propagate_with_jacobian(starts, age)
+        assert np.allclose(emu_ends, trace_func(starts, age))
+        for start, emu_end, emu_jac in zip(starts, emu_ends, emu_jacs):
+            var_end, var_jac = torb.propagate_variational_orbit(start, age)
+            assert np.allclose(emu_end, var_end, atol=1e-2)
+            assert np.allclose(emu_jac, var_jac, rtol=0.,
+                               atol=1e-3 * np.abs(var_jac).max())
+
+    # Each star traced to its own age
+    many_ends, many_jacs = trace_func.propagate_many_with_jacobians(
+            starts, [12.3, -17.])
+    for start, age, end, jac in zip(starts, [12.3, -17.], many_ends,
+                                    many_jacs):
+        emu_end, emu_jac = trace_func.propagate_with_jacobian(start, age)
+        assert np.allclose(end, emu_end)
+        assert np.allclose(jac, emu_jac)
+
+    multi_res = trace_func(starts, [12.3, -17.], single_age=False)
+    assert np.allclose(multi_res[:,1], trace_func(starts, -17.))
+
+    with pytest.raises(UserWarning):
+        trace_func(starts[0], 40.)
+
+    # Emulators built from a file or from tables can be sent to workers
+    for func in [trace_func, torb.trace_orbit_emulator_builder(emulator)]:
+        unpickled_func = pickle.loads(pickle.dumps(func))
+        assert np.all(unpickled_func(starts, 12.3) == func(starts, 12.3))
+    assert len(pickle.dumps(trace_func)) < 1000
+
+    report = torb.validate_orbit_emulator(emu_file, nvalidate=5)
+    assert report['max_pos_err'] < 0.1
+    assert report['max_vel_err'] < 0.01
+
+
+def test_orbit_emulator_between_nodes():
+    """
+    Check emulated traces are accurate between anchors, for start points
+    away from every anchor in every dimension, on either side of the
+    plane and rotated about the Galactic axis
+    """
+    nodes = [[-150., 150.], [0., 60.], [-10., 10.], [-10., 10.], [0.]]
+    ages = np.linspace(0., 100., 51)
+    emulator = torb.build_orbit_emulator(ages=ages, nodes=nodes)
+
+    rand = np.random.RandomState(0)
+    curv_starts = np.zeros((6, 6))
+    curv_starts[:,[0,2,3,4]] = rand.uniform([-150., 0., -10., -10.],
+                                            [150., 60., 10., 10.],
+                                            size=(6, 4))
+    curv_starts[:,1] = rand.uniform(-300., 300., size=6)
+    curv_starts[::2,2] *= -1
+    # Midway between every anchor
+    curv_starts[0] = [0., 100., -30., 0., 0., 0.]
+    starts = torb.convert_curvilin2cart(curv_starts)
+
+    # Errors grow with age. Expanding about the nearest anchor instead
+    # gives errors of up to 13 pc and 0.8 km/s at 50 Myr, and 90 pc and
+    # 4 km/s at 100 Myr
+    for age, max_pos_err, max_vel_err in [(25., 0.1, 0.01),
+                                          (50., 1., 0.1),
+                                          (100., 15., 0.6)]:
+        emu_ends = torb.propagate_emulated_orbit(starts, age,
+                                                 emulator=emulator)[0]
+        errs = emu_ends - torb.trace_cartesian_orbit(starts, age,
+                                                     method='odeint')
+        assert np.all(np.linalg.norm(errs[:,:3], axis=1) < max_pos_err)
+        assert np.all(np.linalg.norm(errs[:,3:], axis=1) < max_vel_err)
+
+
 if __name__ == '__main__':
     test_rotatedLSR()
     test_multi_coordinate_epicyclic()
@@ -1,5 +1,6 @@
 from __future__ import print_function, division
 
+import multiprocessing
 import numpy as np
 import pytest
 import sys
@@ -59,6 +60,18 @@ def test_calcMembershipProbs():
     assert np.allclose([.25, .25, .5],
                        em.calc_membership_probs(np.log(star_ols)))
 
+    # many stars at once, with extreme log overlaps
+    many_lnols = np.log([[10, 10, 20], [10, 30, 1e-300], [1, 1, 1]])
+    many_lnols[1,2] = -np.inf
+    many_lnols[2] -= 1e5
+    expected = np.array([[.25, .25, .5], [.25, .75, 0.], [1/3., 1/3., 1/3.]])
+    assert np.allclose(expected, em.calc_membership_probs(many_lnols))
+
+    # in place
+    memb_probs = em.calc_membership_probs(many_lnols, inplace=True)
+    assert memb_probs is many_lnols
+    assert np.allclose(expected, many_lnols)
+
 
 def test_expectation():
     """
@@ -94,6 +107,248 @@ def test_expectation():
 
     assert np.allclose(true_memb_probs, fitted_memb_probs, atol=1e-10)
 
+
+def test_get_all_lnoverlaps_culled():
+    """
+    Checks that culling negligible overlaps skips some star-component
+    pairs, yet changes membership probabilities by less than the
+    requested tolerance
+    """
+    age = 1e-5
+    ass_pars1 = np.array([0, 0, 0, 0, 0, 0, 5., 2., age])
+    ass_pars2 = np.array([200., 0, 0, 20, 0, 0, 5., 2., age])
+    comps = [SphereComponent(ass_pars1), SphereComponent(ass_pars2)]
+    starcounts = [100, 100]
+    synth_data = SynthData(pars=[ass_pars1, ass_pars2],
+                           starcounts=starcounts)
+    synth_data.synthesise_everything()
+    tabletool.convert_table_astro2cart(synth_data.table)
+    data = tabletool.build_data_dict_from_table(synth_data.table)
+
+    # Bound must never be below the true overlap
+    ln_ubs = chronostar.likelihood.get_lnoverlap_upper_bounds(comps, data)
+    true_lnols = chronostar.likelihood.get_lnoverlaps_many_comps(comps, data)
+    assert np.all(ln_ubs >= true_lnols)
+
+    # A flat background, comparable to the density of a component
+    data['bg_lnols'] = np.ones(len(data['means'])) * -20.
+    old_memb_probs = np.ones((len(data['means']), 3)) / 3.
+
+    tol = 1e-6
+    exact_lnols = em.get_all_lnoverlaps(data, comps, old_memb_probs)
+    culled_lnols = em.get_all_lnoverlaps(data, comps, old_memb_probs,
+                                         overlap_cull_tol=tol)
+    assert np.sum(culled_lnols == em.CULLED_LNOL) > 0
+
+    exact_memb_probs = em.expectation(data, comps, old_memb_probs)
+    culled_memb_probs = em.expectation(data, comps, old_memb_probs,
+                                       overlap_cull_tol=tol)
+    assert np.allclose(exact_memb_probs, culled_memb_probs, rtol=0., atol=tol)
+
+
+def test_get_all_lnoverlaps_cached():
+    """
+    Checks that reusing cached overlaps, as done when iterating the
+    weights in `expectation`, matches calculating overlaps afresh, and that
+    the star-component overlaps are only calculated once
+    """
+    age = 1e-5
+    ass_pars1 = np.array([0, 0, 0, 0, 0, 0, 5., 2., age])
+    ass_pars2 = np.array([30., 0, 0, 5, 0, 0, 5., 2., age])
+    comps = [SphereComponent(ass_pars1), SphereComponent(ass_pars2)]
+    synth_data = SynthData(pars=[ass_pars1, ass_pars2],
+                           starcounts=[100, 50])
+    synth_data.synthesise_everything()
+    tabletool.convert_table_astro2cart(synth_data.table)
+    data = tabletool.build_data_dict_from_table(synth_data.table)
+    data['bg_lnols'] = np.ones(len(data['means'])) * -20.
+
+    old_memb_probs = np.ones((len(data['means']), 3)) / 3.
+    for overlap_cull_tol in [1e-6, None]:
+        overlap_cache = {}
+        memb_probs = old_memb_probs
+        for _ in range(3):
+            fresh_lnols = em.get_all_lnoverlaps(
+                    data, comps, memb_probs, overlap_cull_tol=overlap_cull_tol,
+            )
+            cached_lnols = em.get_all_lnoverlaps(
+                    data, comps, memb_probs, overlap_cull_tol=overlap_cull_tol,
+                    overlap_cache=overlap_cache,
+            )
+            assert np.allclose(fresh_lnols, cached_lnols)
+            memb_probs = em.calc_membership_probs(cached_lnols)
+
+    # Raw overlaps are only calculated on the first call, so tampering
+    # with the cache leaves only the weights
+    overlap_cache['raw_lnols'][:] = 0.
+    cached_lnols = em.get_all_lnoverlaps(data, comps, memb_probs,
+                                         overlap_cache=overlap_cache)
+    assert np.allclose(cached_lnols[:,:2], cached_lnols[0,:2])
+
+    # Component overlaps shared across calls, with and without culling
+    lnol_cache = chronostar.likelihood.OverlapCache()
+    for overlap_cull_tol in [None, 1e-6, None]:
+        shared_lnols = em.get_all_lnoverlaps(
+                data, comps, memb_probs, overlap_cull_tol=overlap_cull_tol,
+                lnol_cache=lnol_cache,
+        )
+        fresh_lnols = em.get_all_lnoverlaps(
+                data, comps, memb_probs, overlap_cull_tol=overlap_cull_tol,
+        )
+        # Cached columns are never culled
+        assert np.allclose(em.calc_membership_probs(shared_lnols),
+                           em.calc_membership_probs(fresh_lnols),
+                           rtol=0., atol=1e-6)
+    assert lnol_cache.misses == len(comps)
+    assert lnol_cache.hits == 2 * len(comps)
+
+
+
+def fake_maximise_one_comp(data, memb_probs, i, idir, all_init_pars=None,
+                           **kwargs):
+    """Stands in for a fit, recording which process did the work"""
+    import os
+    if i == 2:
+        raise ValueError('Deliberate failure')
+    best_comp = SphereComponent(emcee_pars=all_init_pars[i])
+    return best_comp, all_init_pars[i], float(os.getpid()), all_init_pars[i]
+
+
+@pytest.mark.skipif(not expectmax.sharedmem.shared_memory_avail or
+                    multiprocessing.get_start_method() != 'fork',
+                    reason='Workers must inherit the fake maximisation')
+def test_componentPool(monkeypatch):
+    """
+    Check a ComponentPool reuses its workers across M-steps, and skips
+    components whose fit fails
+    """
+    monkeypatch.setattr(expectmax, 'maximise_one_comp',
+                        fake_maximise_one_comp)
+    ncomps = 4
+    nstars = 20
+    data = {'means': np.random.rand(nstars, 6),
+            'covs': np.array(nstars * [np.eye(6)])}
+    memb_probs = np.random.rand(nstars, ncomps)
+    all_init_pars = [SphereComponent(
+            pars=[i, 0, 0, 0, 0, 0, 1., 1., 1.]).get_emcee_pars()
+                     for i in range(ncomps)]
+
+    comp_pool = expectmax.ComponentPool(2)
+    pids = set()
+    try:
+        for _ in range(3):
+            new_comps, _, all_lnprob, _, success_mask = \
+                expectmax.maximisation(data, ncomps, memb_probs, 10, '',
+                                       all_init_pars,
+                                       optimisation_method='Nelder-Mead',
+                                       comp_pool=comp_pool)
+            assert success_mask == [0, 1, 3]
+            for comp, i in zip(new_comps, success_mask):
+                assert np.allclose(comp.get_emcee_pars(), all_init_pars[i])
+            pids.update(all_lnprob)
+    finally:
+        comp_pool.shutdown()
+
+    assert len(pids) <= 2
+
+
+def fake_maximise_one_comp_without_pool(data, memb_probs, i, idir,
+                                        all_init_pars=None, pool=None,
+                                        **kwargs):
+    """Stands in for a fit, failing if handed the parent's pool"""
+    if pool is not None:
+        raise ValueError('Worker was handed the parent pool')
+    best_comp = SphereComponent(emcee_pars=all_init_pars[i])
+    return best_comp, all_init_pars[i], 0., all_init_pars[i]
+
+
+@pytest.mark.skipif(not expectmax.sharedmem.shared_memory_avail or
+                    multiprocessing.get_start_method() != 'fork',
+                    reason='Workers must inherit the fake maximisation')
+def test_maximisation_processes_without_pool(monkeypatch):
+    """
+    Check components maximised in their own processes (without a
+    ComponentPool) aren't handed the parent's emcee pool
+    """
+    monkeypatch.setattr(expectmax, 'maximise_one_comp',
+                        fake_maximise_one_comp_without_pool)
+    ncomps = 3
+    nstars = 20
+    data = {'means': np.random.rand(nstars, 6),
+            'covs': np.array(nstars * [np.eye(6)])}
+    memb_probs = np.random.rand(nstars, ncomps)
+    all_init_pars = [SphereComponent(
+            pars=[i, 0, 0, 0, 0, 0, 1., 1., 1.]).get_emcee_pars()
+                     for i in range(ncomps)]
+
+    _, _, _, _, success_mask = expectmax.maximisation(
+            data, ncomps, memb_probs, 10, '', all_init_pars,
+            pool='parent pool', optimisation_method='Nelder-Mead',
+            nprocess_ncomp=True,
+    )
+    assert success_mask == [0, 1, 2]
+
+
+def fake_maximisation(data, ncomps, memb_probs, burnin_steps, idir,
+                      all_init_pars, all_init_pos=None, given_init_pos=None,
+                      **kwargs):
+    """
+    Stands in for an emcee M-step. Iteration k fits a component 10k pc
+    from the origin, with a chain and final walkers particular to k, and
+    the walker positions each iteration starts from are recorded
+    """
+    k = int(idir.rstrip('/')[-2:])
+    given_init_pos[k] = all_init_pos
+    pars = SphereComponent(pars=[10.*k, 0, 0, 0, 0, 0, 5., 2., 1e-5]
+                           ).get_emcee_pars()
+    rand = np.random.RandomState(k)
+    chain = pars + 0.1 * rand.randn(4, 10, len(pars))
+    new_comps = [SphereComponent(emcee_pars=pars)]
+    return new_comps, [chain], None, [np.full((4, len(pars)), float(k))], [0]
+
+
+def test_fit_many_comps_resumes_from_checkpoints(tmp_path, monkeypatch):
+    """
+    An EM fit resumed from stored iterations carries on with the stored
+    walker positions, and keeps the med_and_spans of stored iterations
+    """
+    given_init_pos = {}
+    monkeypatch.setattr(
+            expectmax, 'maximisation',
+            lambda *args, **kwargs: fake_maximisation(
+                    *args, given_init_pos=given_init_pos, **kwargs)
+    )
+    np.random.seed(0)
+    nstars = 30
+    data = {'means': np.hstack((5 * np.random.randn(nstars, 3),
+                                2 * np.random.randn(nstars, 3))),
+            'covs': np.array(nstars * [np.eye(6)])}
+    init_comps = [SphereComponent(pars=[0, 0, 0, 0, 0, 0, 5., 2., 1e-5])]
+    rdir = str(tmp_path) + '/'
+
+    _, first_med_and_spans, _ = expectmax.fit_many_comps(
+            data, 1, rdir=rdir, init_comps=init_comps, max_em_iterations=2,
+            optimisation_method='emcee',
+    )
+    assert given_init_pos[0] == [None]
+    assert np.all(given_init_pos[1][0] == 0.)
+
+    # Iteration 0 fits the data best, so is picked again after resuming
+    comps, med_and_spans, _ = expectmax.fit_many_comps(
+            data, 1, rdir=rdir, init_comps=init_comps, max_em_iterations=3,
+            optimisation_method='emcee',
+    )
+    assert sorted(given_init_pos.keys()) == [0, 1, 2]
+    assert np.all(given_init_pos[2][0] == 1.)
+    assert np.allclose(comps[0].get_mean(), 0.)
+    assert np.allclose(med_and_spans, first_med_and_spans)
+    assert np.allclose(
+            np.load(rdir + 'bic_list.npy')[:2],
+            [float(np.load(rdir + 'iter{:02}/bic.npy'.format(i)))
+             for i in range(2)]
+    )
+
+
 '''
 @pytest.mark.skip
 def test_fit_many_comps_gradient_descent_with_multiprocessing():